@@ -0,0 +1,62 @@
+# Micro-benchmark of the code chunk pipeline in generate_answer: merging many
+# overlapping chunks (like those of SourceResult and FileResult) and rendering
+# them, for files of increasing length. Time should grow linearly.
+# Run from the repository root with `python -m benchmarks.code_chunks`.
+
+# Standard library
+import random
+
+# Local
+from redshift.agent.tools.generate_answer import CodeChunk, File, merge_chunks
+from benchmarks.timing import best_time, print_row
+
+
+NUM_FILES = 5
+FILE_LENGTHS = (1_000, 10_000, 100_000)
+CHUNKS_PER_1K_LINES = 20
+MAX_CHUNK_LINES = 80
+
+
+#########
+# HELPERS
+#########
+
+
+def make_chunks(num_lines: int, rng: random.Random) -> list[CodeChunk]:
+    chunks = []
+    for index in range(NUM_FILES):
+        lines = [f"    value_{i} = compute(value_{i - 1})\n" for i in range(num_lines)]
+        file = File(num_lines, f"module_{index}.py", lines)
+        for _ in range(num_lines * CHUNKS_PER_1K_LINES // 1000):
+            first = rng.randint(1, num_lines)
+            last = min(num_lines, first + rng.randint(0, MAX_CHUNK_LINES))
+            chunks.append(CodeChunk([(first, last)], file))
+
+    return chunks
+
+
+def render(chunks: list[CodeChunk]) -> int:
+    return sum(len(chunk.to_string()) for chunk in merge_chunks(chunks))
+
+
+######
+# MAIN
+######
+
+
+def main():
+    rng = random.Random(0)
+    for num_lines in FILE_LENGTHS:
+        chunks = make_chunks(num_lines, rng)
+        num_chars = render(chunks)
+        seconds = best_time(lambda: render(chunks))
+        print_row(
+            f"{NUM_FILES} files of {num_lines:,} lines",
+            seconds,
+            f"{len(chunks):,} chunks",
+            f"{num_chars:,} chars rendered",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Benchmark of the BM25 code search index behind the "semantic" tool: cold build
+# time, size of the on-disk cache, warm load time and query latency, for the
+# project at the given path. Run from the repository root with
+# `python -m benchmarks.search_index path/to/large/project`.
+
+# Standard library
+import os
+import sys
+import time
+import tempfile
+
+# Local
+from redshift.shared.search_index import SearchIndex
+from benchmarks.timing import best_time, print_row
+
+
+QUERIES = (
+    "retry backoff",
+    "parse config file",
+    "where is the http request sent",
+    "serialize to json",
+    "cache",
+)
+MAX_RESULTS = 5
+BYTES_PER_MB = 1024 * 1024
+
+
+#########
+# HELPERS
+#########
+
+
+def time_update(search_index: SearchIndex) -> float:
+    start_time = time.perf_counter()
+    search_index.update()
+    search_index.wait()
+    return time.perf_counter() - start_time
+
+
+######
+# MAIN
+######
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("usage: python -m benchmarks.search_index path/to/project")
+        sys.exit(2)
+
+    root = os.path.abspath(sys.argv[1])
+    with tempfile.TemporaryDirectory() as cache_home:
+        # Also the symbol cache, which the index reuses, so the build is cold
+        os.environ["XDG_CACHE_HOME"] = cache_home
+        cache_dir = os.path.join(cache_home, "search")
+
+        search_index = SearchIndex(root, cache_dir)
+        print_row(
+            "Cold build",
+            time_update(search_index),
+            f"{len(search_index._files):,} files",
+            f"{search_index._num_documents:,} documents",
+        )
+        cache_size = os.path.getsize(search_index.cache_path) / BYTES_PER_MB
+        print_row("Update, nothing changed", time_update(search_index))
+
+        search_index = SearchIndex(root, cache_dir)
+        print_row("Warm load", time_update(search_index), f"{cache_size:.1f} MB cache")
+
+        for query in QUERIES:
+            # The first search of a term builds its postings
+            first_time = best_time(
+                lambda: search_index.search(query, MAX_RESULTS), repeat=1
+            )
+            seconds = best_time(lambda: search_index.search(query, MAX_RESULTS))
+            print_row(f"Query '{query}'", seconds, f"first {first_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Micro-benchmark of the non-default serializer (serialize_val with
+# use_default=False) over nested configs, ORM-like objects and long lists.
+# Run from the repository root with `python -m benchmarks.serializers`.
+
+# Local
+from redshift.shared.serializers import serialize_val
+from benchmarks.timing import best_time, print_row
+
+
+NUM_ROWS = 1000
+LIST_DEPTH = 300
+CONFIG_DEPTH = 40
+LIST_LENGTH = 100_000
+
+
+#########
+# HELPERS
+#########
+
+
+class Row(object):
+    # Like an ORM model: slots for the columns, and a property that queries
+    __slots__ = ("id", "name", "email")
+
+    def __init__(self, id: int):
+        self.id = id
+        self.name = f"user-{id}"
+        self.email = f"user-{id}@example.com"
+
+    @property
+    def orders(self) -> list[int]:
+        return sorted(range(self.id % 100, 10_000, 7))  # Stands in for a query
+
+
+class Config(object):
+    def __init__(self, depth: int):
+        self.name = f"level-{depth}"
+        self.options = {"retries": depth, "verbose": depth % 2 == 0}
+        self.child = Config(depth - 1) if depth else None
+
+
+def make_nested_list(depth: int) -> list:
+    root = current = []
+    for _ in range(depth):
+        current.append([])
+        current = current[0]
+
+    return root
+
+
+######
+# MAIN
+######
+
+
+def main():
+    rows = [Row(i) for i in range(NUM_ROWS)]
+    cases = [
+        (f"{NUM_ROWS:,} ORM rows", rows, False),
+        (f"{NUM_ROWS:,} ORM rows, with properties", rows, True),
+        (f"{LIST_DEPTH}-deep nested list", make_nested_list(LIST_DEPTH), False),
+        (f"{CONFIG_DEPTH}-deep nested config", Config(CONFIG_DEPTH), False),
+        (f"{LIST_LENGTH:,}-element list", list(range(LIST_LENGTH)), False),
+    ]
+    for name, value, include_properties in cases:
+        seconds = best_time(
+            lambda: serialize_val(
+                value, use_default=False, include_properties=include_properties
+            )
+        )
+        print_row(name, seconds)
+
+
+if __name__ == "__main__":
+    main()
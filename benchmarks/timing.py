@@ -0,0 +1,17 @@
+# Standard library
+import time
+
+
+def best_time(fn: callable, repeat: int = 5) -> float:
+    # Fastest of `repeat` runs, in seconds, which is the least noisy estimate
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start_time)
+
+    return min(times)
+
+
+def print_row(name: str, seconds: float, *details: str):
+    print("  ".join([f"{name:<40} {seconds * 1000:>10.2f} ms", *details]))
@@ -5,14 +5,16 @@ import traceback
 # Local
 try:
     from redshift.config import Config
-    from redshift.pdb import RedshiftPdb
+    from redshift.pdb import RedshiftPdb, post_mortem, open_snapshot
 except ImportError:
     from .config import Config
-    from .pdb import RedshiftPdb
+    from .pdb import RedshiftPdb, post_mortem, open_snapshot
 
 
 _usage = """\
-usage: redshift [-c command] ... [-m module | pyfile] [arg] ...
+usage: redshift [options] [-c command] ... [--ask question ... [--output file]]
+                [-m module | pyfile] [arg] ...
+       redshift --snapshot file [--ask question ... [--output file]]
 
 Debug the Python program given by pyfile. Alternatively,
 an executable module or package to debug can be specified using
@@ -24,24 +26,82 @@ and in the current directory, if they exist.  Commands supplied with
 
 To let the script run until an exception occurs, use "-c continue".
 To let the script run up to a given line X in the debugged file, use
-"-c 'until X'"."""
+"-c 'until X'".
+
+With --ask, the program runs without stopping. If it raises an exception,
+each question is answered against the traceback, without a prompt, and the
+answers are written as JSON to --output (default: stderr, so they aren't
+mixed in with the program's output; "-" for stdout). The exit status is 1
+if the program raised an exception.
+
+With --snapshot, debug a snapshot saved by the `snapshot` command or by
+post_mortem(snapshot=...) instead of running a program. Only the saved
+stack can be inspected. --ask works the same way. Settings are read from
+the REDSHIFT_* environment variables.
+
+Options override the REDSHIFT_* environment variables of the same name:
+  --agent-model model       --response-model model    --max-iters n
+  --hide-external-frames    --no-prewarm              --no-stream
+  --no-prompt-caching       --prefetch                --eval-timeout seconds
+  --eval-max-memory mb      --telemetry               --telemetry-file file"""
+
+
+def run_headless(target, config: Config, commands: list[str], questions, output):
+    # Running the target clears the __main__ namespace (i.e. this module's), so
+    # everything used afterwards is bound locally
+    import sys
+    import traceback
+
+    answer_questions = post_mortem
+    pdb_ = RedshiftPdb(config=config, headless=True, readrc=False)
+    pdb_.rcLines.extend(commands + ["continue"])
+    try:
+        pdb_._run(target)
+    except SystemExit:
+        raise
+    except BaseException as e:
+        traceback.print_exc()
+        answer_questions(e, questions=questions, output=output, config=config)
+        sys.exit(1)
 
 
 def main():
     import pdb
     import getopt
 
-    opts, args = getopt.getopt(sys.argv[1:], "mhc:", ["help", "command="])
-
-    if not args:
-        print(_usage)
-        sys.exit(2)
+    config_options = Config.get_long_options()
+    opts, args = getopt.getopt(
+        sys.argv[1:],
+        "mhc:",
+        ["help", "command=", "ask=", "output=", "snapshot=", *config_options],
+    )
 
     if any(opt in ["-h", "--help"] for opt, optarg in opts):
         print(_usage)
         sys.exit()
 
     commands = [optarg for opt, optarg in opts if opt in ["-c", "--command"]]
+    questions = [optarg for opt, optarg in opts if opt == "--ask"]
+    output = next((optarg for opt, optarg in opts if opt == "--output"), None)
+    snapshot = next((optarg for opt, optarg in opts if opt == "--snapshot"), None)
+    config_args = [
+        f"{opt}={optarg}" if f"{opt[2:]}=" in config_options else opt
+        for opt, optarg in opts
+        if opt[2:] in config_options or f"{opt[2:]}=" in config_options
+    ]
+
+    if snapshot is not None:  # There's no program to run
+        open_snapshot(
+            snapshot,
+            questions=questions or None,
+            output=output,
+            config=Config.from_env(),
+        )
+        return
+
+    if not args:
+        print(_usage)
+        sys.exit(2)
 
     module_indicated = any(opt in ["-m"] for opt, optarg in opts)
     cls = pdb._ModuleTarget if module_indicated else pdb._ScriptTarget
@@ -51,7 +111,11 @@ def main():
 
     sys.argv[:] = args  # Hide "redshift" and redshift options from argument list
 
-    config = Config.from_args()
+    config = Config.from_args(config_args)
+    if questions:
+        run_headless(target, config, commands, questions, output)
+        return
+
     pdb_ = RedshiftPdb(config=config)
     pdb_.rcLines.extend(commands)
     while True:
@@ -2,19 +2,24 @@
 import time
 import threading
 import multiprocessing
+from typing import Generator
+from collections import namedtuple
 
 # Third party
 from rich.live import Live
 from rich.text import Text
-from litellm import completion
+from litellm import completion, acompletion
 from rich.console import Console
 from rich.markdown import Markdown
 from saplings.dtos import Message
-from saplings import COTAgent, Model
+from saplings import Model
+from saplings.model import clean_completion_params
 
 # Local
 try:
     from redshift.config import Config
+    from redshift.agent.tool_cache import ToolResultCache
+    from redshift.agent.parallel_agent import ParallelCOTAgent, TurnStats
     from redshift.agent.tools import (
         MoveFrameTool,
         PrintNamesTool,
@@ -23,9 +28,25 @@ try:
         PrintRetvalTool,
         ReadFileTool,
         ShowSourceTool,
+        FindDefinitionTool,
+        SearchFilesTool,
+        SearchCodeTool,
         GenerateAnswerTool,
     )
     from redshift.shared.truncator import Truncator
+    from redshift.shared.telemetry import (
+        Telemetry,
+        recording,
+        span,
+        traced,
+        write_jsonl,
+    )
+    from redshift.shared.prompt_cache import (
+        TokenUsage,
+        text_block,
+        add_cache_breakpoint,
+        supports_cache_control,
+    )
 except ImportError:
     from .tools import (
         MoveFrameTool,
@@ -35,10 +56,28 @@ except ImportError:
         PrintRetvalTool,
         ReadFileTool,
         ShowSourceTool,
+        FindDefinitionTool,
+        SearchFilesTool,
+        SearchCodeTool,
         GenerateAnswerTool,
     )
     from ..config import Config
+    from .tool_cache import ToolResultCache
+    from .parallel_agent import ParallelCOTAgent, TurnStats
     from ..shared.truncator import Truncator
+    from ..shared.telemetry import (
+        Telemetry,
+        recording,
+        span,
+        traced,
+        write_jsonl,
+    )
+    from ..shared.prompt_cache import (
+        TokenUsage,
+        text_block,
+        add_cache_breakpoint,
+        supports_cache_control,
+    )
 
 
 #########
@@ -46,7 +85,9 @@ except ImportError:
 #########
 
 
-ASK_SYSTEM_PROMPT = """You are an AI assistant that helps users debug Python code. \
+# Split so the instructions, which never change, can be cached separately from
+# the debugger state, which changes whenever the agent moves frames
+ASK_INSTRUCTIONS = """You are an AI assistant that helps users debug Python code. \
 You are activated when the user's program throws an exception or hits a breakpoint. \
 You will receive a query from the user about the state of their program at that breakpoint. \
 Your job is to choose the best action. Call tools to find information that will help answer the user's query. \
@@ -62,11 +103,13 @@ Follow these rules when calling tools:
 - If the query is a greeting, or neither a question nor an instruction, call functions.none.
 - If the output of a function is empty or an error message, try calling the function again with DIFFERENT arguments OR try calling a different function.
 - Call functions.none when you have enough information to answer the user's query.
+- If you need several pieces of information that don't depend on each other (e.g. the arguments, the return value, and a few expressions in the same frame), call all of those tools at once.
+- Tools called at once run in order of appearance after each functions.move, so put functions.move before the tools that should run in the new frame.
 </tool_calling>
 
---
+--"""
 
-Below is information about the state of your debugger:
+ASK_DEBUGGER_STATE = """Below is information about the state of your debugger:
 
 <debugger_state>
 This is the stack trace, with the most recent frame at the bottom:
@@ -96,6 +139,8 @@ This is your position in the file associated with the current frame:
 Use this information to understand the current frame you're in as you're calling tools \
 to operate the debugger."""
 
+ASK_SYSTEM_PROMPT = f"{ASK_INSTRUCTIONS}\n\n{ASK_DEBUGGER_STATE}"
+
 RUN_SYSTEM_PROMPT = """You are an AI assistant that runs inside the Python debugger, pdb. \
 You are activated when a breakpoint is hit. Your task is to generate code that will be executed at that breakpoint. \
 You will be given the file the breakpoint is defined in, as well as a prompt for what code to generate. \
@@ -125,15 +170,33 @@ And these are the local and global variables currently defined in the namespace:
 </variables>"""
 
 
+StreamStats = namedtuple("StreamStats", ["time_to_first_token", "total_time"])
+PromptStats = namedtuple("PromptStats", ["build_time", "is_cached"])
+
+
+def iter_content(chunks) -> Generator[str, None, None]:
+    # Text deltas of a streamed completion, skipping thinking and empty chunks
+    for chunk in chunks:
+        if not chunk.choices:
+            continue
+
+        content = chunk.choices[0].delta.content
+        if content:
+            yield content
+
+
 class Printer(object):
     RED = "\033[31m"
     GREY = "\033[37m"
     RESET = "\033[0m"
+    REFRESH_PER_SECOND = 8  # Of streamed responses
     MESSAGES = {
         "move": "Moving {arg} the call stack",
         "args": "Getting arguments",
         "retval": "Getting return value",
         "source": "Reading source code",
+        "definition": "Finding definition",
+        "grep": "Searching files",
         "expression": "Evaluating expression",
         "semantic": "Searching {arg}",
         "read": "Reading file",
@@ -148,6 +211,7 @@ class Printer(object):
         self._is_thinking = False
         self._thinking_thread = None
         self._thinking_start_time = None
+        self.stream_stats = None  # Latency of the last streamed response
 
     def _animate_thinking(self):
         self._is_thinking = multiprocessing.Value("b", True)
@@ -169,22 +233,121 @@ class Printer(object):
         self._thinking_thread.start()
 
     def _stop_thinking_animation(self):
+        if not self._is_thinking:
+            return
+
         self._is_thinking.value = False
         if self._thinking_thread and self._thinking_thread.is_alive():
             self._thinking_thread.join(timeout=1.0)
 
-    def _print_markdown(self, markdown: str):
-        console = Console()
-        markdown = Markdown(
+    def _render_markdown(self, markdown: str) -> Markdown:
+        return Markdown(
             markdown,
             code_theme="monokai",
             inline_code_lexer="python",
             inline_code_theme="monokai",
         )
+
+    def _print_markdown(self, markdown: str):
+        console = Console()
         console.print()
-        console.print(markdown)
+        console.print(self._render_markdown(markdown))
         console.print()
 
+    def _stream_markdown(
+        self, chunks, start_time: float, on_first_token=None, transient: bool = False
+    ) -> str:
+        # Renders the response incrementally as tokens arrive. Re-parsing the
+        # markdown costs as much as the response is long, so it's done at most
+        # once per refresh, not once per chunk.
+        console = Console()
+        response = ""
+        time_to_first_token = None
+        live = None
+        rendered_length = 0
+        last_render_time = 0.0
+        try:
+            for content in iter_content(chunks):
+                if live is None:
+                    time_to_first_token = time.time() - start_time
+                    if on_first_token:
+                        on_first_token()
+
+                    console.print()
+                    live = Live(
+                        console=console,
+                        refresh_per_second=self.REFRESH_PER_SECOND,
+                        transient=transient,
+                        vertical_overflow="visible",
+                    )
+                    live.start()
+
+                response += content
+                if time.monotonic() - last_render_time >= 1 / self.REFRESH_PER_SECOND:
+                    live.update(self._render_markdown(response))
+                    rendered_length = len(response)
+                    last_render_time = time.monotonic()
+        finally:
+            if live is not None:
+                if rendered_length < len(response):  # The last chunks
+                    live.update(self._render_markdown(response))
+                live.stop()
+                if not transient:
+                    console.print()
+
+        total_time = time.time() - start_time
+        if time_to_first_token is None:
+            time_to_first_token = total_time
+
+        self.stream_stats = StreamStats(time_to_first_token, total_time)
+        return response
+
+    def turns_output(self, turn_stats: list[TurnStats], round_trips_saved: int):
+        num_tool_calls = sum(stats.num_tool_calls for stats in turn_stats)
+        turn_times = ", ".join(
+            f"{stats.model_time + stats.tool_time:.2f}s" for stats in turn_stats
+        )
+        self.pdb.message(
+            f"{self.GREY}Agent: {len(turn_stats)} turns, {num_tool_calls} tool calls, "
+            f"{round_trips_saved} round-trips saved ({turn_times}){self.RESET}"
+        )
+
+    def prompts_output(self, prompt_stats: list[PromptStats]):
+        num_built = sum(not stats.is_cached for stats in prompt_stats)
+        build_times = ", ".join(
+            f"{stats.build_time * 1000:.1f}ms" for stats in prompt_stats
+        )
+        self.pdb.message(
+            f"{self.GREY}Prompts: {num_built} of {len(prompt_stats)} rebuilt "
+            f"({build_times}){self.RESET}"
+        )
+
+    def tool_cache_output(self, tool_cache: ToolResultCache):
+        num_calls = tool_cache.hits + tool_cache.misses
+        self.pdb.message(
+            f"{self.GREY}Tool cache: {tool_cache.hits} of {num_calls} tool calls "
+            f"answered from the cache{self.RESET}"
+        )
+
+    def usage_output(self, usage: TokenUsage):
+        self.pdb.message(f"{self.GREY}Prompt cache: {usage}{self.RESET}\n")
+
+    def telemetry_output(self, telemetry: Telemetry, usage: TokenUsage):
+        summary = telemetry.summarize()
+        total_time = summary.pop("ask").total_time
+        categories = ", ".join(
+            f"{category} {stats.total_time:.2f}s ({stats.count})"
+            for category, stats in sorted(
+                summary.items(), key=lambda item: -item[1].total_time
+            )
+        )
+        cost = f"${usage.cost:.4f}" if usage.cost is not None else "unknown cost"
+        self.pdb.message(
+            f"{self.GREY}Telemetry: {total_time:.2f}s total, {categories}; "
+            f"{usage.input_tokens:,} input and {usage.output_tokens:,} output "
+            f"tokens, {cost}{self.RESET}"
+        )
+
     def tool_call(self, tool_name: str, value: str | list[str] = "", arg: str = ""):
         message = self.MESSAGES[tool_name].format(arg=arg)
 
@@ -218,9 +381,152 @@ class Printer(object):
         self.pdb.message(f"{self.RED}└──{self.RESET} Thought for {time_taken} seconds")
         self._print_markdown(response)
 
+    def ask_output_stream(self, chunks, start_time: float) -> str:
+        def _on_first_token():
+            self._stop_thinking_animation()
+            time_taken = f"{time.time() - self._thinking_start_time:.2f}"
+            self.pdb.message(
+                f"{self.RED}└──{self.RESET} Thought for {time_taken} seconds"
+            )
+
+        response = self._stream_markdown(chunks, start_time, _on_first_token)
+        if not response:  # Nothing was streamed
+            _on_first_token()
+
+        return response
+
     def run_output(self, response: str):
         self._print_markdown(f"```python\n{response}\n```")
 
+    def run_output_stream(self, chunks, start_time: float) -> str:
+        # The raw response is only shown while streaming, and then replaced by the
+        # extracted code
+        return self._stream_markdown(chunks, start_time, transient=True)
+
+
+class HeadlessPrinter(Printer):
+    # Records tool calls instead of printing them, and never starts the thinking
+    # animation or a rich console, so the agent can run without a TTY
+    def __init__(self, pdb):
+        super().__init__(pdb)
+        self.tool_calls = []  # Of the current `ask`
+
+    def _animate_thinking(self):
+        pass
+
+    def _print_markdown(self, markdown: str):
+        pass
+
+    def _stream_markdown(
+        self, chunks, start_time: float, on_first_token=None, transient: bool = False
+    ) -> str:
+        response = "".join(iter_content(chunks))
+        total_time = time.time() - start_time
+        self.stream_stats = StreamStats(total_time, total_time)
+        return response
+
+    def tool_call(self, tool_name: str, value: str | list[str] = "", arg: str = ""):
+        if tool_name == "none":
+            self._thinking_start_time = time.time()
+            return
+
+        values = [value] if isinstance(value, str) else value
+        self.tool_calls.append(
+            {
+                "tool": tool_name,
+                "message": self.MESSAGES[tool_name].format(arg=arg),
+                "values": [value for value in values if value],
+            }
+        )
+        self.history.append(tool_name)
+
+    def ask_output(self, response: str):
+        pass
+
+    def ask_output_stream(self, chunks, start_time: float) -> str:
+        return self._stream_markdown(chunks, start_time)
+
+    def turns_output(self, turn_stats: list[TurnStats], round_trips_saved: int):
+        pass
+
+    def prompts_output(self, prompt_stats: list[PromptStats]):
+        pass
+
+    def tool_cache_output(self, tool_cache: ToolResultCache):
+        pass
+
+    def usage_output(self, usage: TokenUsage):
+        pass
+
+    def telemetry_output(self, telemetry: Telemetry, usage: TokenUsage):
+        pass
+
+
+class CachingModel(Model):
+    # Marks the end of each request as a cache breakpoint, so the next iteration
+    # of the agent reads the whole trajectory so far from the cache, and records
+    # token usage, which saplings discards, and telemetry
+    def __init__(self, model: str, usage: TokenUsage, cache_control: bool, **kwargs):
+        super().__init__(model, **kwargs)
+        self.usage = usage
+        self.cache_control = cache_control
+
+    @traced("tokenize")
+    def truncate_messages(self, *args, **kwargs) -> list[Message]:
+        return super().truncate_messages(*args, **kwargs)
+
+    async def run_async(
+        self,
+        messages: list[Message],
+        stream=False,
+        max_tokens=768,
+        temperature=0.7,
+        top_p=1,
+        frequency_penalty=0,
+        presence_penalty=0,
+        n=1,
+        tools=None,
+        tool_choice=None,
+        parallel_tool_calls=False,
+        response_format={"type": "text"},
+    ) -> any:
+        completion_params = clean_completion_params(
+            messages,
+            self.model,
+            stream,
+            max_tokens,
+            temperature,
+            top_p,
+            frequency_penalty,
+            presence_penalty,
+            n,
+            tools,
+            tool_choice,
+            parallel_tool_calls,
+            response_format,
+        )
+        if self.cache_control and len(completion_params["messages"]) > 1:
+            add_cache_breakpoint(completion_params["messages"][-1])
+
+        with span("agent", "model", model=self.model) as attributes:
+            response = await acompletion(**{**completion_params, **self.kwargs})
+
+        if not stream:
+            self.usage.add(getattr(response, "usage", None), self.model)
+            attributes.update(self.usage.last_call)
+            if n == 1:
+                return response.choices[0].message
+
+            return response.choices
+
+        return response
+
+
+def instrument_tool(tool):
+    tool.run = traced("tool", tool.name)(tool.run)
+    tool.format_output = traced("format", tool.name)(tool.format_output)
+    return tool
+
 
 def was_tool_called(messages: list[Message], tool_name: str) -> bool:
     for message in messages:
@@ -253,19 +559,30 @@ def parse_code(output: str) -> str:
 
 
 class Agent:
-    def __init__(self, pdb, config: Config):
+    def __init__(self, pdb, config: Config, headless: bool = False):
         self.pdb = pdb
         self.config = config
         self.truncator = Truncator(self.config.agent_model)
-        self.printer = Printer(pdb)
+        self.printer = HeadlessPrinter(pdb) if headless else Printer(pdb)
+        self.usage = TokenUsage()  # Of the last `ask`
+        self.prompt_stats = []  # Of the last `ask`, one per iteration
+        self.tool_cache = ToolResultCache(pdb, self.printer)
+        self.trajectory = []  # Of the last `ask`
+        self.turn_stats = []  # Of the last `ask`
+        self.round_trips_saved = 0  # Of the last `ask`
+        self.telemetry = Telemetry()  # Of the last `ask`
         self._history = []
 
-    def _update_system_prompt(self, *args, **kwargs):
+    def _uses_cache_control(self, model: str) -> bool:
+        return self.config.prompt_caching and supports_cache_control(model)
+
+    @traced("prompt", "ask_prompt")
+    def _build_system_prompt(self) -> str | list[dict]:
         curr_filename = self.pdb.curframe.f_code.co_filename
         curr_file_code = self.pdb.format_frame_line(self.pdb.curframe)
         stack_trace = self.pdb.format_stack_trace(self.config.agent_model)
 
-        return ASK_SYSTEM_PROMPT.format(
+        debugger_state = ASK_DEBUGGER_STATE.format(
             stack_trace=stack_trace,
             curr_frame=self.pdb.format_stack_entry(
                 self.pdb.stack[self.pdb.curindex], "\n-> "
@@ -273,12 +590,66 @@ class Agent:
             curr_file_path=curr_filename,
             curr_file_code=curr_file_code,
         )
+        if not self._uses_cache_control(self.config.agent_model):
+            return f"{ASK_INSTRUCTIONS}\n\n{debugger_state}"
+
+        # Tool definitions precede the system prompt, so they're cached too
+        return [
+            text_block(f"{ASK_INSTRUCTIONS}\n\n", cache=True),
+            text_block(debugger_state),
+        ]
+
+    def _update_system_prompt(self, *args, **kwargs):
+        # Called on every iteration, but the prompt only changes when the agent
+        # moves frames. The stack trace entries are reused even then.
+        start_time = time.perf_counter()
+        is_cached = True
+
+        def _build():
+            nonlocal is_cached
+            is_cached = False
+            return self._build_system_prompt()
+
+        lineno = self.pdb.curframe.f_lineno
+        key = ("ask_prompt", self.pdb.curindex, lineno, self.config)
+        prompt = self.pdb.cached(key, _build)
+
+        build_time = time.perf_counter() - start_time
+        self.prompt_stats.append(PromptStats(build_time, is_cached))
+        return prompt
 
     def reset(self):
         self._history = []
         self.printer.history = []
 
+    def _export_telemetry(self, prompt: str):
+        record = {
+            "time": time.time(),
+            "prompt": prompt,
+            "agent_model": self.config.agent_model,
+            "response_model": self.config.response_model,
+            "usage": self.usage.to_dict(),
+            **self.telemetry.to_dict(),
+        }
+        write_jsonl(record, self.config.telemetry_file)
+
     def ask(self, prompt: str) -> str:
+        self.usage.reset()
+        self.prompt_stats = []
+        self.tool_cache.reset_stats()
+        self.telemetry.reset()
+        with recording(self.telemetry), span("ask", "ask"):
+            output = self._ask(prompt)
+
+        if self.config.telemetry:  # Diagnostics, not part of the answer
+            self.printer.telemetry_output(self.telemetry, self.usage)
+            self._print_stats()
+        if self.config.telemetry_file:
+            self._export_telemetry(prompt)
+
+        return output
+
+    def _ask(self, prompt: str) -> str:
         tools = [
             MoveFrameTool(self.pdb, self.printer),
             PrintNamesTool(self.pdb, self.printer, self.truncator),
@@ -287,16 +658,27 @@ class Agent:
             PrintRetvalTool(self.pdb, self.printer, self.truncator),
             ReadFileTool(self.pdb, self.printer, self.truncator),
             ShowSourceTool(self.pdb, self.printer, self.truncator),
+            FindDefinitionTool(self.pdb, self.printer, self.truncator),
+            SearchFilesTool(self.pdb, self.printer, self.truncator),
+            SearchCodeTool(self.pdb, self.printer, self.truncator),
             GenerateAnswerTool(
                 self.pdb,
                 self.printer,
                 self.config.response_model,
                 prompt,
                 self._history,
+                stream=self.config.stream,
+                usage=self.usage,
+                cache_control=self._uses_cache_control(self.config.response_model),
             ),
         ]
-        model = Model(self.config.agent_model)
-        agent = COTAgent(
+        tools = [instrument_tool(tool) for tool in tools]
+        model = CachingModel(
+            self.config.agent_model,
+            self.usage,
+            cache_control=self._uses_cache_control(self.config.agent_model),
+        )
+        agent = ParallelCOTAgent(
             tools,
             model,
             ASK_SYSTEM_PROMPT,
@@ -304,20 +686,36 @@ class Agent:
             max_depth=self.config.max_iters,
             verbose=False,
             update_prompt=self._update_system_prompt,
+            result_cache=self.tool_cache,
         )
         messages = agent.run(prompt, self._history)
 
         output = messages[-1].raw_output
+        self.trajectory = messages
         if not was_tool_called(messages, "none"):
             messages = self._history + messages
             tool_call = agent.call_tool("none", messages)
             tool_result = agent.run_tool(tool_call, messages)
             output = tool_result.raw_output
+            self.trajectory = self.trajectory + [tool_call, tool_result]
 
+        self.turn_stats = agent.turn_stats
         self._history += [Message.user(prompt), Message.assistant(output)]
         self.printer.history = []
+        self.round_trips_saved = agent.round_trips_saved
+
         return output
 
+    def _print_stats(self):
+        if self.round_trips_saved:
+            self.printer.turns_output(self.turn_stats, self.round_trips_saved)
+        if self.prompt_stats:
+            self.printer.prompts_output(self.prompt_stats)
+        if self.tool_cache.hits:
+            self.printer.tool_cache_output(self.tool_cache)
+        if self.config.prompt_caching and self.usage.num_calls:
+            self.printer.usage_output(self.usage)
+
     def run(self, prompt: str) -> str:
         # TODO: This method shouldn't be part of this class since it's not agentic
 
@@ -360,12 +758,17 @@ class Agent:
             },
             {"role": "user", "content": adj_prompt},
         ]
+        start_time = time.time()
         response = completion(
             model=self.config.response_model,
             messages=messages,
             drop_params=True,
+            stream=self.config.stream,
         )
-        response = response.choices[0].message.content
+        if self.config.stream:
+            response = self.printer.run_output_stream(response, start_time)
+        else:
+            response = response.choices[0].message.content
         code = parse_code(response)
 
         # Execute code
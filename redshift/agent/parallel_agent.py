@@ -0,0 +1,119 @@
+# Standard library
+import time
+from collections import namedtuple
+
+# Third party
+from saplings import COTAgent
+from saplings.dtos import Message, Node
+
+# Local
+try:
+    from redshift.agent.tool_cache import ToolResultCache, REPEATED_RESULT
+except ImportError:
+    from .tool_cache import ToolResultCache, REPEATED_RESULT
+
+
+TurnStats = namedtuple("TurnStats", ["num_tool_calls", "model_time", "tool_time"])
+
+
+#########
+# HELPERS
+#########
+
+
+def is_read_only(tool) -> bool:
+    return getattr(tool, "is_read_only", False)
+
+
+def is_in_trajectory(output: any, trajectory: list[Message]) -> bool:
+    return any(message.raw_output is output for message in trajectory)
+
+
+######
+# MAIN
+######
+
+
+class ParallelCOTAgent(COTAgent):
+    # A COTAgent that executes every tool call in a model turn instead of only
+    # the first one, so gathering several facts costs one round-trip. The calls
+    # run one at a time, in order: the tools evaluate code in the debugged
+    # program, which can't safely run concurrently, and their `run` methods
+    # never await, so gathering them wouldn't overlap anything anyway.
+    def __init__(self, *args, result_cache: ToolResultCache = None, **kwargs):
+        super().__init__(*args, parallel_tool_calls=True, **kwargs)
+        self.result_cache = result_cache  # Only used for read-only tools
+        self.turn_stats = []
+
+    @property
+    def round_trips_saved(self) -> int:
+        return sum(max(stats.num_tool_calls - 1, 0) for stats in self.turn_stats)
+
+    async def _run_tool(
+        self, tool, tool_call, trajectory: list[Message]
+    ) -> tuple[any, bool]:
+        run = lambda: tool.run(**tool_call.arguments, trajectory=trajectory)
+        if self.result_cache is None or not is_read_only(tool):
+            return await run(), False
+
+        return await self.result_cache.run(tool, tool_call.arguments, run)
+
+    async def execute_tool_calls(
+        self, message: Message, trajectory: list[Message]
+    ) -> list[Message]:
+        tool_calls = sorted(
+            message.tool_calls,
+            key=lambda tool_call: self.get_tool_by_name(tool_call.name).is_terminal,
+        )  # Terminal tools run last, with every other result in their trajectory
+        tools = [self.get_tool_by_name(tool_call.name) for tool_call in tool_calls]
+
+        tool_responses = []
+        for tool, tool_call in zip(tools, tool_calls):
+            call_trajectory = trajectory + [message] + tool_responses
+            output, is_cached = await self._run_tool(tool, tool_call, call_trajectory)
+
+            # Formatted before the next call runs, since it may move the frame
+            if is_cached and is_in_trajectory(output, call_trajectory):
+                formatted_output = REPEATED_RESULT  # Saves resending it
+            else:
+                formatted_output = tool.format_output(output)
+
+            tool_response = Message.tool(
+                formatted_output, tool_call.id, raw_output=output
+            )
+            tool_response.parent_id = message.parent_id
+            tool_response.id = message.id
+            tool_responses.append(tool_response)
+
+        return tool_responses
+
+    async def expand(self, node: Node, messages: list[Message], run_eval=False):
+        if self.is_terminal_node(node):
+            yield []
+            return
+
+        trajectory = messages + node.get_trajectory()
+        self.update_prompts(trajectory)
+
+        start_time = time.time()
+        tool_call = (await self.generate_candidates(node, messages))[0]
+        model_time = time.time() - start_time
+
+        child = Node([tool_call], parent=node)
+        tool_call.id = child.id
+        tool_call.parent_id = node.id
+        yield tool_call
+
+        start_time = time.time()
+        tool_responses = []
+        if tool_call.tool_calls:
+            tool_responses = await self.execute_tool_calls(tool_call, trajectory)
+        tool_time = time.time() - start_time
+
+        for tool_response in tool_responses:
+            child.messages.append(tool_response)
+            yield tool_response
+
+        num_tool_calls = len(tool_call.tool_calls or [])
+        self.turn_stats.append(TurnStats(num_tool_calls, model_time, tool_time))
+        node.add_children([child])
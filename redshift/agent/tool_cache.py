@@ -0,0 +1,63 @@
+# Standard library
+import json
+
+
+# Arguments that don't change a tool's result
+IGNORED_ARGUMENTS = ("explanation",)
+
+REPEATED_RESULT = "This is the same as the output of your earlier call to this tool with these arguments, in this frame. Call a different tool, or call functions.none if you have enough information to answer."
+
+
+#########
+# HELPERS
+#########
+
+
+def get_cache_key(tool_name: str, frame_index: int, arguments: dict) -> tuple:
+    arguments = {
+        name: value
+        for name, value in arguments.items()
+        if name not in IGNORED_ARGUMENTS
+    }
+    arguments = json.dumps(arguments, sort_keys=True, default=str)
+    return (tool_name, frame_index, arguments)
+
+
+######
+# MAIN
+######
+
+
+class ToolResultCache(object):
+    # Results of read-only tools at the current breakpoint. Stored in the
+    # debugger's context cache, so they're dropped when the program steps or
+    # `execute_code` runs.
+    def __init__(self, pdb, printer):
+        self.pdb = pdb
+        self.printer = printer
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _get_results(self) -> dict:
+        return self.pdb.cached(("tool_results",), dict)
+
+    async def run(self, tool, arguments: dict, run: callable) -> tuple[any, bool]:
+        results = self._get_results()
+        key = get_cache_key(tool.name, self.pdb.curindex, arguments)
+        if key in results:
+            self.hits += 1
+            values = [
+                str(value)
+                for name, value in arguments.items()
+                if name not in IGNORED_ARGUMENTS
+            ]
+            self.printer.tool_call(tool.name, " ".join(values + ["(cached)"]))
+            return results[key], True
+
+        self.misses += 1
+        output = await run()
+        results[key] = output
+        return output, False
@@ -7,6 +7,12 @@ try:
     )
     from redshift.agent.tools.print_retval import PrintRetvalTool, RetvalResult
     from redshift.agent.tools.show_source import ShowSourceTool, SourceResult
+    from redshift.agent.tools.find_definition import (
+        FindDefinitionTool,
+        DefinitionResult,
+    )
+    from redshift.agent.tools.search_files import SearchFilesTool, SearchResult
+    from redshift.agent.tools.search_code import SearchCodeTool, CodeSearchResult
     from redshift.agent.tools.read_file import ReadFileTool, FileResult
     from redshift.agent.tools.generate_answer import GenerateAnswerTool
     from redshift.agent.tools.print_names import PrintNamesTool, NamesResult
@@ -16,12 +22,14 @@ except ImportError:
     from agent.tools.print_expression import PrintExpressionTool, ExpressionResult
     from agent.tools.print_retval import PrintRetvalTool, RetvalResult
     from agent.tools.show_source import ShowSourceTool, SourceResult
+    from agent.tools.find_definition import FindDefinitionTool, DefinitionResult
+    from agent.tools.search_files import SearchFilesTool, SearchResult
+    from agent.tools.search_code import SearchCodeTool, CodeSearchResult
     from agent.tools.read_file import ReadFileTool, FileResult
     from agent.tools.print_names import PrintNamesTool, NamesResult
     from agent.tools.generate_answer import GenerateAnswerTool
 
 # TODO: Add the following tools:
-# - Tool that greps across all files in the stack trace
 # - Tool that wraps the inspect module
 # - Tool that uses dir or pdir2
 # - Tool that uses pydoc to show documentation for any object
@@ -0,0 +1,114 @@
+# Standard library
+import linecache
+from collections import namedtuple
+
+# Third party
+from saplings.abstract import Tool
+
+# Local
+try:
+    from redshift.shared.symbol_index import get_symbol_index
+except ImportError:
+    from shared.symbol_index import get_symbol_index
+
+
+DefinitionResult = namedtuple(
+    "DefinitionResult",
+    ["name", "filename", "lineno", "lines", "other_symbols", "frame_index"],
+)
+
+INDEX_TIMEOUT = 5  # Seconds to wait for indexing before searching what's done
+MAX_OTHER_SYMBOLS = 10
+
+TOOL_DESCRIPTION = """Finds where a class, function, method, or module-level variable is defined, searching the files in the stack trace and the rest of the project. \
+Unlike functions.source, this works for names that aren't in scope in the current frame (e.g. a function that was never imported here, or a method of a class you've only seen by name). \
+Use a plain name (e.g. `parse`), or qualify it to narrow the search (e.g. `Parser.parse` or `mypkg.parser.Parser.parse`)."""
+
+
+class FindDefinitionTool(Tool):
+    def __init__(self, pdb, printer, truncator, max_tokens: int = 4096):
+        # Base attributes
+        self.name = "definition"
+        self.description = TOOL_DESCRIPTION
+        self.parameters = {
+            "type": "object",
+            "properties": {
+                "explanation": {
+                    "type": "string",
+                    "description": "Short, one-sentence explanation of why this tool is being used, and how it contributes to the goal.",
+                },
+                "name": {
+                    "type": "string",
+                    "description": "The name of the class, function, method, or variable, optionally qualified with its class or module.",
+                },
+            },
+            "required": ["explanation", "name"],
+            "additionalProperties": False,
+        }
+        self.is_terminal = False
+        self.is_read_only = True
+
+        # Additional attributes
+        self.pdb = pdb
+        self.printer = printer
+        self.truncator = truncator
+        self.max_tokens = max_tokens
+
+        self.pdb.index_symbols()  # Indexes while the agent decides what to call
+
+    def format_output(self, output: DefinitionResult | str, **kwargs) -> str:
+        if isinstance(output, str):  # Error
+            return output
+
+        code = self.pdb.format_lines(output.lines, output.lineno)
+        code = self.truncator.truncate_end(code, self.max_tokens, type="line")
+        output_str = f"Definition of `{output.name}`:\n\n"
+        output_str += f"<file>\n{output.filename}\n</file>\n"
+        output_str += f"<code>\n{code}\n</code>\n"
+
+        if output.other_symbols:
+            output_str += "\nOther definitions that match this name:\n\n"
+            for symbol in output.other_symbols:
+                output_str += f"{symbol.filename}:{symbol.lineno} ({symbol.kind} {symbol.name})\n"
+
+        return output_str
+
+    async def run(self, name: str, **kwargs) -> DefinitionResult | str:
+        self.printer.tool_call(self.name, name)
+
+        symbol_index = get_symbol_index()
+        is_complete = symbol_index.wait(INDEX_TIMEOUT)
+        stack_filenames = {frame.f_code.co_filename for frame, _ in self.pdb.stack}
+
+        # Exact matches first, then definitions over assignments, then the stack
+        symbols = sorted(
+            symbol_index.find(name),
+            key=lambda symbol: (
+                symbol.name != name,
+                symbol.kind == "variable",
+                symbol.filename not in stack_filenames,
+            ),
+        )
+        if not symbols:
+            error = f"Could not find a definition of `{name}` in the stack trace or the project."
+            if not is_complete:
+                error += " Some files haven't been indexed yet, so try again later."
+
+            return error
+
+        # The index reflects the file on disk, so the lines must too
+        symbol = symbols[0]
+        linecache.checkcache(symbol.filename)
+        lines = linecache.getlines(symbol.filename)
+        lines = lines[symbol.lineno - 1 : symbol.end_lineno]
+        if not lines:
+            return f"Could not read the source code of `{symbol.name}` in {symbol.filename}."
+
+        return DefinitionResult(
+            name=symbol.name,
+            filename=symbol.filename,
+            lineno=symbol.lineno,
+            lines=lines,
+            other_symbols=symbols[1 : MAX_OTHER_SYMBOLS + 1],
+            frame_index=self.pdb.curindex,
+        )
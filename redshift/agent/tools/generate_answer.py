@@ -1,4 +1,5 @@
 # Standard library
+import time
 import linecache
 from collections import defaultdict
 
@@ -11,16 +12,38 @@ from saplings.abstract import Tool
 # Local
 try:
     from redshift.shared.truncator import Truncator
+    from redshift.shared.telemetry import span, traced
+    from redshift.shared.prompt_cache import TokenUsage, text_block
+    from redshift.shared.token_budget import (
+        Allocation,
+        Section,
+        get_context_budget,
+        plan_budget,
+    )
     from redshift.agent.tools.read_file import FileResult
     from redshift.agent.tools.print_args import ArgsResult
     from redshift.agent.tools.show_source import SourceResult
+    from redshift.agent.tools.find_definition import DefinitionResult
+    from redshift.agent.tools.search_files import SearchResult
+    from redshift.agent.tools.search_code import CodeSearchResult
     from redshift.agent.tools.print_retval import RetvalResult
     from redshift.agent.tools.print_expression import ExpressionResult
 except ImportError:
     from shared.truncator import Truncator
+    from shared.telemetry import span, traced
+    from shared.prompt_cache import TokenUsage, text_block
+    from shared.token_budget import (
+        Allocation,
+        Section,
+        get_context_budget,
+        plan_budget,
+    )
     from agent.tools.read_file import FileResult
     from agent.tools.print_args import ArgsResult
     from agent.tools.show_source import SourceResult
+    from agent.tools.find_definition import DefinitionResult
+    from agent.tools.search_files import SearchResult
+    from agent.tools.search_code import CodeSearchResult
     from agent.tools.print_retval import RetvalResult
     from agent.tools.print_expression import ExpressionResult
 
@@ -41,42 +64,50 @@ class File(object):
 
 
 class CodeChunk(object):
-    def __init__(self, line_nums: list[int], file: File):
-        self.line_nums = line_nums  # 1-indexed
+    def __init__(self, intervals: list[tuple[int, int]], file: File):
+        self.intervals = intervals  # Sorted, disjoint (first, last) pairs, 1-indexed
         self.file = file
 
     def __hash__(self) -> int:
-        line_nums_str = ",".join(map(str, self.line_nums))
-        return hash(f"{self.file.filename}:{line_nums_str}")
+        return hash((self.file.filename, tuple(self.intervals)))
 
     def __repr__(self) -> str:
-        return f"CodeChunk(file={self.file.filename}, line_nums={self.line_nums})"
+        return f"CodeChunk(file={self.file.filename}, intervals={self.intervals})"
 
     def to_string(self, line_nums: bool = True, dots: bool = True) -> str:
-        output_str = ""
+        # Renders each interval by slicing the file's lines, with a "⋮..." in place
+        # of each run of lines that's left out
+        output_lines = []
+        prev_last = 0
+        for first, last in self.intervals:
+            if first > prev_last + 1 and dots:
+                output_lines.append("⋮...")
 
-        use_dots = not (1 in self.line_nums)
-        for line_num, line in enumerate(self.file.lines):
-            line_num = line_num + 1
-            if line_num not in self.line_nums:
-                if use_dots and dots:
-                    output_str += "⋮...\n"
-                    use_dots = False
+            for line_num in range(first, min(last, self.file.num_lines) + 1):
+                line = self.file.lines[line_num - 1].rstrip()
+                output_lines.append(f"{line_num} {line}" if line_nums else line)
 
-                continue
+            prev_last = max(prev_last, last)
 
-            output_str += (
-                f"{line_num} {line.rstrip()}\n" if line_nums else f"{line.rstrip()}\n"
-            )
-            use_dots = True
+        if prev_last < self.file.num_lines and dots:
+            output_lines.append("⋮...")
 
-        return output_str.strip("\n")
+        return "\n".join(output_lines).strip("\n")
 
 
 MAX_MERGE_DISTANCE = 15
 MAX_THINKING_TOKENS = 2048
+MAX_CONTEXT_TOKENS = 64000  # Even for models with larger windows
+RESERVED_TOKENS = 4096  # For the prompt templates, thinking and the response
+STACK_TRACE_FRACTION = 1 / 16  # Most of the budget the stack trace can use
+
+# Relative shares of the budget when the frames and files need more than it has
+FRAME_WEIGHT = 2
+CODE_WEIGHT = 1
 
-SYSTEM_PROMPT = """You are an AI assistant called 'redshift' that helps users debug Python code. \
+# The instructions and stack trace stay the same across follow-up questions, so
+# they're cached separately from the context gathered by the agent
+INSTRUCTIONS_PROMPT = """You are an AI assistant called 'redshift' that helps users debug Python code. \
 Your task is to answer the user's query about the state of their code at a breakpoint. \
 You will have context on the stack trace at the breakpoint, including important frames, variable values, and source code. \
 Use this context to answer the user's query.
@@ -96,7 +127,9 @@ Use this context to answer the user's query.
 
 --
 
-{important_frames}
+"""
+
+CONTEXT_PROMPT = """{important_frames}
 
 --
 
@@ -106,6 +139,8 @@ Use this context to answer the user's query.
 
 Use the stack trace, important frames, and additional code context to answer the user's query."""
 
+SYSTEM_PROMPT = INSTRUCTIONS_PROMPT + CONTEXT_PROMPT
+
 
 def get_tool_results(trajectory: list[Message]) -> list[any]:
     tool_results = []
@@ -122,7 +157,10 @@ def get_tool_results(trajectory: list[Message]) -> list[any]:
 
 
 def is_code_result(tool_result: any) -> bool:
-    return isinstance(tool_result, (SourceResult, FileResult))
+    return isinstance(
+        tool_result,
+        (SourceResult, DefinitionResult, FileResult, SearchResult, CodeSearchResult),
+    )
 
 
 def is_variable_result(tool_result: any) -> bool:
@@ -137,91 +175,57 @@ def group_chunks_by_file(chunks: list[CodeChunk]) -> dict[File, list[CodeChunk]]
     return chunks_by_file
 
 
-def get_contiguous_subchunks(line_nums: list[int], file: File) -> list[CodeChunk]:
-    if not line_nums:
-        return []
-
-    groups = []
-    curr_group = [line_nums[0]]
-    for line_num in line_nums[1:]:
-        if line_num == curr_group[-1] + 1:
-            curr_group.append(line_num)
+def merge_intervals(
+    intervals: list[tuple[int, int]], max_distance: int = 0, num_lines: int = None
+) -> list[tuple[int, int]]:
+    # Extends each interval by `max_distance` lines after it, so gaps of up to that
+    # many lines are filled in, and merges the ones that overlap or touch. One pass
+    # after sorting, so this is linear in the number of intervals, not lines.
+    merged = []
+    for first, last in sorted(intervals):
+        last += max_distance
+        if num_lines is not None:
+            last = max(first, min(last, num_lines))
+
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
         else:
-            groups.append(curr_group)
-            curr_group = [line_num]
+            merged.append((first, last))
 
-    if curr_group:
-        groups.append(curr_group)
+    return merged
 
-    chunks = [CodeChunk(group, file) for group in groups]
-    return chunks
 
-
-def merge_chunks(chunks: list[CodeChunk]) -> list[CodeChunk]:
+def merge_chunks(
+    chunks: list[CodeChunk], max_distance: int = MAX_MERGE_DISTANCE
+) -> list[CodeChunk]:
+    # Collapses the chunks into one per file, filling in short gaps between them
     chunks_by_file = group_chunks_by_file(chunks)
     merged_chunks = []
     for file, chunks in chunks_by_file.items():
-        all_line_nums = {ln for chunk in chunks for ln in chunk.line_nums}
-        all_line_nums = list(sorted(all_line_nums))
-        merged_chunks += get_contiguous_subchunks(all_line_nums, file)
+        intervals = [interval for chunk in chunks for interval in chunk.intervals]
+        intervals = merge_intervals(intervals, max_distance, file.num_lines)
+        merged_chunks.append(CodeChunk(intervals, file))
 
     return merged_chunks
 
 
-def normalize_chunks(chunks: list[CodeChunk]) -> list[CodeChunk]:
-    chunks_by_file = group_chunks_by_file(chunks)
-    norm_chunks = []
-    for file, chunks in chunks_by_file.items():
-        all_line_nums = {ln for chunk in chunks for ln in chunk.line_nums}
-        all_line_nums = list(sorted(all_line_nums))
-
-        norm_line_nums = []
-        for index in range(len(all_line_nums)):
-            curr_line_num = all_line_nums[index]
-            next_line_num = (
-                all_line_nums[index + 1] if index + 1 < len(all_line_nums) else None
-            )
-
-            norm_line_nums.append(curr_line_num)
-            for i in range(1, MAX_MERGE_DISTANCE + 1):
-                if not next_line_num:
-                    if curr_line_num + i > file.num_lines:
-                        break
-
-                if curr_line_num + i == next_line_num:
-                    break
-
-                norm_line_nums.append(curr_line_num + i)
-
-        norm_chunks.append(CodeChunk(norm_line_nums, file))
-
-    return norm_chunks
-
-
-def collapse_chunks(chunks: list[CodeChunk]) -> list[CodeChunk]:
-    chunks_by_file = group_chunks_by_file(chunks)
-    collapsed_chunks = []
-    for file, chunks in chunks_by_file.items():
-        line_nums = set()
-        for chunk in chunks:
-            line_nums.update(chunk.line_nums)
-
-        chunk = CodeChunk(
-            line_nums=list(sorted(line_nums)),
-            file=file,
-        )
-        collapsed_chunks.append(chunk)
-
-    return collapsed_chunks
-
-
 ######
 # MAIN
 ######
 
 
 class GenerateAnswerTool(Tool):
-    def __init__(self, pdb, printer, model: str, prompt: str, history: list[Message]):
+    def __init__(
+        self,
+        pdb,
+        printer,
+        model: str,
+        prompt: str,
+        history: list[Message],
+        stream: bool = False,
+        usage: TokenUsage = None,
+        cache_control: bool = False,
+    ):
         # Base attributes
         self.name = "none"
         self.description = (
@@ -242,6 +246,9 @@ class GenerateAnswerTool(Tool):
         self.prompt = prompt
         self.history = [m.to_openai_message() for m in history]
         self.truncator = Truncator(model)
+        self.stream = stream
+        self.usage = TokenUsage() if usage is None else usage
+        self.cache_control = cache_control
 
     def _get_visited_frames(self, tool_results: list[any]) -> list[int]:
         frame_indices = {self.pdb._original_curindex}  # Always include original frame
@@ -260,6 +267,33 @@ class GenerateAnswerTool(Tool):
         file_map = {}
         chunks = []
         for tool_result in tool_results:
+            if isinstance(tool_result, (SearchResult, CodeSearchResult)):
+                # Matches can be in any file, not just the stack's
+                for match in tool_result.matches:
+                    if match.filename not in file_map:
+                        lines = linecache.getlines(match.filename)
+                        file_map[match.filename] = File(
+                            num_lines=len(lines),
+                            filename=match.filename,
+                            lines=lines,
+                        )
+                    if not file_map[match.filename].lines:
+                        continue
+
+                    if isinstance(tool_result, SearchResult):
+                        first = match.lineno - len(match.before)
+                        last = match.lineno + len(match.after)
+                    else:
+                        first = match.lineno
+                        last = match.lineno + len(match.lines) - 1
+
+                    chunk = CodeChunk(
+                        intervals=[(first, last)], file=file_map[match.filename]
+                    )
+                    chunks.append(chunk)
+
+                continue
+
             filename = getattr(tool_result, "filename", None)
             frame_index = getattr(tool_result, "frame_index", None)
 
@@ -275,21 +309,22 @@ class GenerateAnswerTool(Tool):
                     lines=lines,
                 )
 
-            if isinstance(tool_result, SourceResult):
-                num_lines = len(tool_result.lines)
+            if isinstance(tool_result, (SourceResult, DefinitionResult)):
+                if not tool_result.lines:
+                    continue
+
+                last = tool_result.lineno + len(tool_result.lines) - 1
                 chunk = CodeChunk(
-                    line_nums=[i + tool_result.lineno for i in range(num_lines)],
+                    intervals=[(tool_result.lineno, last)],
                     file=file_map[tool_result.filename],
                 )
                 chunks.append(chunk)
             elif isinstance(tool_result, FileResult):
-                for chunk in tool_result.chunks:
-                    first, last = chunk
-                    chunk = CodeChunk(
-                        line_nums=list(range(first, last + 1)),
-                        file=file_map[tool_result.filename],
-                    )
-                    chunks.append(chunk)
+                chunk = CodeChunk(
+                    intervals=list(tool_result.chunks),
+                    file=file_map[tool_result.filename],
+                )
+                chunks.append(chunk)
 
         return chunks
 
@@ -360,40 +395,47 @@ class GenerateAnswerTool(Tool):
 
         return context_str
 
+    def _format_expressions(self, tool_results: list[any]) -> str:
+        expressions_str = ""
+        for result in tool_results:
+            if not isinstance(result, ExpressionResult) or result.error:
+                continue
+
+            expressions_str += f"{result.expression} = {result.value}\n"
+
+        return expressions_str
+
     def _format_expression_context(
         self, tool_results: list[any], max_tokens: int
     ) -> str:
-        expression_results = [
-            result for result in tool_results if isinstance(result, ExpressionResult)
-        ]
-
-        if not expression_results:
+        expressions_str = self._format_expressions(tool_results)
+        if not expressions_str or max_tokens <= 0:
             return ""
 
-        context_str = "These are the values of relevant variables and expressions in the frame:\n\n"
-        context_str += "<variables>\n"
-        expressions_str = ""
-        for expr_result in expression_results:
-            if expr_result.error:
-                continue
-
-            expressions_str += f"{expr_result.expression} = {expr_result.value}\n"
         expressions_str = self.truncator.truncate_middle(
             expressions_str, max_tokens, type="line"
         )
+        return self._wrap_expressions(expressions_str)
+
+    def _wrap_expressions(self, expressions_str: str) -> str:
+        context_str = "These are the values of relevant variables and expressions in the frame:\n\n"
+        context_str += "<variables>\n"
         expressions_str = expressions_str.rstrip("\n")
         context_str += f"{expressions_str}\n</variables>"
 
         return context_str
 
-    def _format_frame_context(
-        self, tool_results: list[any], frame_index: int, max_tokens: int = 4096
-    ) -> str:
-        tool_results = [
+    def _get_frame_results(self, tool_results: list[any], frame_index: int) -> list:
+        return [
             result
             for result in tool_results
             if result.frame_index == frame_index and is_variable_result(result)
         ]
+
+    def _format_frame_context(
+        self, tool_results: list[any], frame_index: int, max_tokens: int = 4096
+    ) -> str:
+        tool_results = self._get_frame_results(tool_results, frame_index)
         stack_entry = self._format_stack_entry(frame_index)
         file_context = self._format_file_context(frame_index)
         function_context = self._format_function_context(frame_index, tool_results)
@@ -412,17 +454,20 @@ class GenerateAnswerTool(Tool):
         return context_str
 
     def _format_important_frames(
-        self, tool_results: list[any], max_tokens: int = 40000
+        self,
+        tool_results: list[any],
+        visited_frames: list[int],
+        allocations: dict[str, Allocation],
     ) -> str:
-        visited_frames = self._get_visited_frames(tool_results)
         if not visited_frames:
             return ""
 
-        max_frame_tokens = max_tokens // len(visited_frames)
         context_str = "These are the most important frames in the stack trace:\n\n"
         context_str += "<important_frames>\n"
         context_str += "\n\n".join(
-            self._format_frame_context(tool_results, f_index, max_frame_tokens)
+            self._format_frame_context(
+                tool_results, f_index, allocations[f"frame:{f_index}"].tokens
+            )
             for f_index in visited_frames
         )
         context_str += "\n</important_frames>"
@@ -430,46 +475,115 @@ class GenerateAnswerTool(Tool):
         return context_str
 
     def _format_code_context(
-        self, tool_results: list[any], max_tokens: int = 20000
+        self, code: list[tuple[str, str]], allocations: dict[str, Allocation]
     ) -> str:
-        chunks = self._convert_to_chunks(tool_results)
-        chunks = merge_chunks(chunks)
-        chunks = normalize_chunks(chunks)
-        chunks = collapse_chunks(chunks)
+        files_str = ""
+        for filename, code_str in code:
+            max_tokens = allocations[f"code:{filename}"].tokens
+            if max_tokens <= 0:
+                continue
 
-        if not chunks:
-            return ""
+            code_str = self.truncator.truncate_end(code_str, max_tokens, type="line")
+            files_str += "<file>\n"
+            files_str += f"<path>\n{filename}\n</path>\n"
+            files_str += f"<code>\n{code_str}\n</code>\n"
+            files_str += "</file>\n\n"
 
-        max_chunk_tokens = max_tokens // len(chunks)
+        if not files_str:
+            return ""
 
         context_str = (
             "This is additional context on the codebase and imported packages:\n\n"
         )
         context_str += "<code_context>\n"
-        for chunk in chunks:
-            context_str += "<file>\n"
-            context_str += f"<path>\n{chunk.file.filename}\n</path>\n"
-            chunk_str = self.truncator.truncate_end(
-                chunk.to_string(), max_chunk_tokens, type="line"
-            )
-            context_str += f"<code>\n{chunk_str}\n</code>\n"
-            context_str += "</file>\n\n"
-        context_str = context_str.rstrip("\n")
+        context_str += files_str.rstrip("\n")
         context_str += "\n</code_context>"
 
         return context_str
 
-    def _build_system_prompt(self, trajectory: list[Message]) -> str:
+    def _count_history_tokens(self) -> int:
+        contents = [str(message.get("content") or "") for message in self.history]
+        return self.truncator.count_tokens("\n".join([*contents, self.prompt]))
+
+    def _plan_context(
+        self,
+        tool_results: list[any],
+        visited_frames: list[int],
+        code: list[tuple[str, str]],
+        budget: int,
+    ) -> dict[str, Allocation]:
+        # Measures each section once, then splits the budget between them, so
+        # frames and files that need little leave the rest to the ones that need
+        # more. Only the expressions of a frame are truncated; the rest of it is
+        # kept whole and comes off the top.
+        with span("answer_budget", "budget") as attributes:
+            sections = []
+            for frame_index in visited_frames:
+                frame_str = self._format_frame_context(tool_results, frame_index, 0)
+                budget -= self.truncator.count_tokens(frame_str)
+
+                frame_results = self._get_frame_results(tool_results, frame_index)
+                expressions_str = self._format_expressions(frame_results)
+                if expressions_str:
+                    # The header around the expressions, which is left out above
+                    header_str = "\n\n" + self._wrap_expressions("")
+                    budget -= self.truncator.count_tokens(header_str)
+
+                sections.append(
+                    Section(
+                        f"frame:{frame_index}",
+                        self.truncator.count_tokens(expressions_str),
+                        FRAME_WEIGHT,
+                    )
+                )
+
+            for filename, code_str in code:
+                sections.append(
+                    Section(
+                        f"code:{filename}",
+                        self.truncator.count_tokens(code_str),
+                        CODE_WEIGHT,
+                    )
+                )
+
+            allocations = plan_budget(sections, budget)
+            attributes["budget"] = budget
+            attributes["allocations"] = [
+                allocation._asdict() for allocation in allocations.values()
+            ]
+
+        return allocations
+
+    @traced("prompt", "answer_prompt")
+    def _build_system_prompt(self, trajectory: list[Message]) -> str | list[dict]:
         tool_results = get_tool_results(trajectory)
-        stack_trace = self._format_stack_trace()
-        important_frames = self._format_important_frames(tool_results)
-        code_context = self._format_code_context(tool_results)
+        budget = get_context_budget(self.model, MAX_CONTEXT_TOKENS, RESERVED_TOKENS)
+
+        # Sized by the model alone, so the cached instructions don't change as the
+        # history grows
+        stack_trace = self._format_stack_trace(int(budget * STACK_TRACE_FRACTION))
+        budget -= self.truncator.count_tokens(stack_trace)
+        budget -= self._count_history_tokens()
+
+        visited_frames = self._get_visited_frames(tool_results)
+        chunks = merge_chunks(self._convert_to_chunks(tool_results))
+        code = [(chunk.file.filename, chunk.to_string()) for chunk in chunks]
+        allocations = self._plan_context(tool_results, visited_frames, code, budget)
 
-        return SYSTEM_PROMPT.format(
-            stack_trace=stack_trace,
+        important_frames = self._format_important_frames(
+            tool_results, visited_frames, allocations
+        )
+        code_context = self._format_code_context(code, allocations)
+
+        instructions = INSTRUCTIONS_PROMPT.format(stack_trace=stack_trace)
+        context = CONTEXT_PROMPT.format(
             important_frames=important_frames,
             code_context=code_context,
         )
+        if not self.cache_control:
+            return instructions + context
+
+        return [text_block(instructions, cache=True), text_block(context)]
 
     async def run(self, **kwargs) -> str:
         self.printer.tool_call("none")
@@ -483,13 +597,24 @@ class GenerateAnswerTool(Tool):
             "content": self.prompt,
         }
         messages = [system_message] + self.history + [user_message]
-        response = completion(
-            model=self.model,
-            messages=messages,
-            thinking={"type": "enabled", "budget_tokens": MAX_THINKING_TOKENS},
-            drop_params=True,
-        )
-        response = response.choices[0].message.content
-        self.printer.ask_output(response)
+        start_time = time.time()
+        with span("answer", "model", model=self.model) as attributes:
+            response = completion(
+                model=self.model,
+                messages=messages,
+                thinking={"type": "enabled", "budget_tokens": MAX_THINKING_TOKENS},
+                drop_params=True,
+                stream=self.stream,
+                stream_options={"include_usage": True} if self.stream else None,
+            )
+            if self.stream:
+                chunks = self.usage.track_stream(response, self.model)
+                response = self.printer.ask_output_stream(chunks, start_time)
+            else:
+                self.usage.add(getattr(response, "usage", None), self.model)
+                response = response.choices[0].message.content
+                self.printer.ask_output(response)
+
+            attributes.update(self.usage.last_call)
 
         return response
@@ -44,6 +44,7 @@ class MoveFrameTool(Tool):
             "additionalProperties": False,
         }
         self.is_terminal = False
+        self.is_read_only = False  # Changes the frame other tools read from
         # TODO: Add a count parameter to move multiple frames at once
 
         # Additional attributes
@@ -1,5 +1,4 @@
 # Standard library
-import json
 from collections import namedtuple
 
 # Third party
@@ -8,9 +7,9 @@ from saplings.abstract import Tool
 
 # Local
 try:
-    from redshift.shared.serializers import serialize_call_args
+    from redshift.shared.serializers import CHARS_PER_TOKEN
 except ImportError:
-    from shared.serializers import serialize_call_args
+    from shared.serializers import CHARS_PER_TOKEN
 
 
 ArgsResult = namedtuple("ArgsResult", ["name_to_repr", "frame_index"])
@@ -35,6 +34,7 @@ class PrintArgsTool(Tool):
             "additionalProperties": False,
         }
         self.is_terminal = False
+        self.is_read_only = True
 
         # Additional attributes
         self.pdb = pdb
@@ -79,9 +79,6 @@ class PrintArgsTool(Tool):
         fn_name = self.pdb.curframe.f_code.co_name
         self.printer.tool_call(self.name, fn_name)
 
-        f_code = self.pdb.curframe.f_code
-        f_locals = self.pdb.curframe_locals
-        arg_reprs = serialize_call_args(f_code, f_locals)
-        arg_reprs = json.loads(arg_reprs)
+        arg_reprs = self.pdb.get_call_args(max_chars=self.max_tokens * CHARS_PER_TOKEN)
 
         return ArgsResult(name_to_repr=arg_reprs, frame_index=self.pdb.curindex)
@@ -7,9 +7,11 @@ from saplings.abstract import Tool
 
 # Local
 try:
-    from redshift.shared.serializers import serialize_val
+    from redshift.shared.bounded_eval import EvalLimitError
+    from redshift.shared.serializers import serialize_val, CHARS_PER_TOKEN
 except ImportError:
-    from shared.serializers import serialize_val
+    from shared.bounded_eval import EvalLimitError
+    from shared.serializers import serialize_val, CHARS_PER_TOKEN
 
 
 ExpressionResult = namedtuple(
@@ -40,6 +42,7 @@ class PrintExpressionTool(Tool):
             "additionalProperties": False,
         }
         self.is_terminal = False
+        self.is_read_only = True
 
         # Additional attributes
         self.pdb = pdb
@@ -70,16 +73,31 @@ class PrintExpressionTool(Tool):
             # TODO: This is unsafe and should be sandboxed, or the expression should
             # be sanitized
 
-            value = eval(
-                expression, self.pdb.curframe.f_globals, self.pdb.curframe_locals
+            # Bounded, since it may hang (e.g. exhausting an infinite generator)
+            value = self.pdb.run_bounded(
+                lambda: serialize_val(
+                    eval(
+                        expression,
+                        self.pdb.curframe.f_globals,
+                        self.pdb.curframe_locals,
+                    ),
+                    max_chars=self.max_tokens * CHARS_PER_TOKEN,
+                )
             )
-            value = serialize_val(value)
             return ExpressionResult(
                 expression=expression,
                 value=value,
                 frame_index=self.pdb.curindex,
                 error=False,
             )
+        except EvalLimitError as exc:
+            message = f"Stopped evaluating the expression: {exc}. Try a cheaper one (e.g. a slice or a single attribute) instead."
+            return ExpressionResult(
+                expression=expression,
+                value=message,
+                frame_index=self.pdb.curindex,
+                error=True,
+            )
         except Exception as exc:
             message = traceback.format_exception_only(exc)[-1].strip()
             message = f"Failed to retrieve value:\n\n{message}"
@@ -28,6 +28,7 @@ class PrintNamesTool(Tool):
             "additionalProperties": False,
         }
         self.is_terminal = False
+        self.is_read_only = True
 
         # Additional attributes
         self.pdb = pdb
@@ -7,9 +7,9 @@ from saplings.abstract import Tool
 
 # Local
 try:
-    from redshift.shared.serializers import serialize_val
+    from redshift.shared.serializers import serialize_val, CHARS_PER_TOKEN
 except ImportError:
-    from shared.serializers import serialize_val
+    from shared.serializers import serialize_val, CHARS_PER_TOKEN
 
 
 RetvalResult = namedtuple("RetvalResult", ["value", "frame_index"])
@@ -34,6 +34,7 @@ class PrintRetvalTool(Tool):
             "additionalProperties": False,
         }
         self.is_terminal = False
+        self.is_read_only = True
 
         # Additional attributes
         self.pdb = pdb
@@ -76,5 +77,8 @@ class PrintRetvalTool(Tool):
         if "__return__" not in self.pdb.curframe_locals:
             return RetvalResult(value=None, frame_index=self.pdb.curindex)
 
-        value = serialize_val(self.pdb.curframe_locals["__return__"])
+        value = serialize_val(
+            self.pdb.curframe_locals["__return__"],
+            max_chars=self.max_tokens * CHARS_PER_TOKEN,
+        )
         return RetvalResult(value=value, frame_index=self.pdb.curindex)
@@ -40,6 +40,7 @@ class ReadFileTool(Tool):
             "additionalProperties": False,
         }
         self.is_terminal = False
+        self.is_read_only = True
 
         # Additional attributes
         self.pdb = pdb
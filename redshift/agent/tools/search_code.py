@@ -0,0 +1,144 @@
+# Standard library
+import time
+import linecache
+from collections import namedtuple
+
+# Third party
+from saplings.abstract import Tool
+
+# Local
+try:
+    from redshift.shared.search_index import get_search_index
+except ImportError:
+    from shared.search_index import get_search_index
+
+
+CodeMatch = namedtuple(
+    "CodeMatch", ["filename", "name", "kind", "lineno", "lines", "terms"]
+)
+CodeSearchResult = namedtuple(
+    "CodeSearchResult", ["query", "matches", "is_complete", "frame_index"]
+)
+
+INDEX_TIMEOUT = 5  # Seconds to wait for indexing before searching what's done
+MAX_RESULTS = 5
+MAX_SNIPPET_LINES = 40
+STACK_BOOST = 1.25  # Code in the stack trace is more likely to be relevant
+
+TOOL_DESCRIPTION = """Searches the project's functions and classes by keywords, e.g. "where is the retry backoff computed" or "parse config file". \
+Matches words in names, code, comments and docstrings, so you don't need to know the exact identifier (unlike functions.grep or functions.definition). \
+Returns the best-matching definitions with their source code."""
+
+
+class SearchCodeTool(Tool):
+    def __init__(self, pdb, printer, truncator, max_tokens: int = 4096):
+        # Base attributes
+        self.name = "semantic"
+        self.description = TOOL_DESCRIPTION
+        self.parameters = {
+            "type": "object",
+            "properties": {
+                "explanation": {
+                    "type": "string",
+                    "description": "Short, one-sentence explanation of why this tool is being used, and how it contributes to the goal.",
+                },
+                "query": {
+                    "type": "string",
+                    "description": "What the code does or is about, in a few keywords.",
+                },
+            },
+            "required": ["explanation", "query"],
+            "additionalProperties": False,
+        }
+        self.is_terminal = False
+        self.is_read_only = True
+
+        # Additional attributes
+        self.pdb = pdb
+        self.printer = printer
+        self.truncator = truncator
+        self.max_tokens = max_tokens
+
+    def format_output(self, output: CodeSearchResult | str, **kwargs) -> str:
+        if isinstance(output, str):  # Error
+            return output
+
+        output_str = f"Code that best matches `{output.query}`"
+        if not output.is_complete:
+            output_str += " (the project is still being indexed, so some files weren't searched)"
+        output_str += ":\n\n"
+
+        for match in output.matches:
+            code = self.pdb.format_lines(match.lines, match.lineno)
+            output_str += f"<file>\n{match.filename}:{match.lineno}\n</file>\n"
+            if match.name:
+                output_str += f"{match.kind.capitalize()} `{match.name}`, "
+            output_str += f"matches: {', '.join(match.terms)}\n"
+            output_str += f"<code>\n{code}\n</code>\n\n"
+
+        output_str = output_str.rstrip()
+        return self.truncator.truncate_end(output_str, self.max_tokens, type="line")
+
+    async def run(self, query: str, **kwargs) -> CodeSearchResult | str:
+        self.printer.tool_call(self.name, query, arg="code")
+
+        roots = self.pdb.get_project_roots()
+        if not roots:
+            return "The files in the stack trace aren't in a project, so there's no code to search. Use functions.grep instead."
+
+        # Indexing a large project takes a while and runs in this process, so it
+        # only starts once the agent searches. Files that changed since are
+        # indexed again at the next breakpoint.
+        self.pdb.cached(("code_index",), self.pdb.index_code)
+
+        # All the projects share one timeout
+        deadline = time.monotonic() + INDEX_TIMEOUT
+        is_complete = True
+        hits = []
+        for root in roots:
+            search_index = get_search_index(root)
+            timeout = max(0, deadline - time.monotonic())
+            is_complete = search_index.wait(timeout) and is_complete
+            hits += search_index.search(query, MAX_RESULTS)
+
+        stack_filenames = {frame.f_code.co_filename for frame, _ in self.pdb.stack}
+        hits = sorted(
+            hits,
+            key=lambda hit: hit.score
+            * (STACK_BOOST if hit.document.filename in stack_filenames else 1),
+            reverse=True,
+        )
+
+        matches = []
+        for hit in hits[:MAX_RESULTS]:
+            document = hit.document
+            last = min(document.end_lineno, document.lineno + MAX_SNIPPET_LINES - 1)
+            linecache.checkcache(document.filename)  # The index reflects the disk
+            lines = linecache.getlines(document.filename)[document.lineno - 1 : last]
+            if not lines:
+                continue
+
+            matches.append(
+                CodeMatch(
+                    document.filename,
+                    document.name.replace(".<locals>", ""),
+                    document.kind,
+                    document.lineno,
+                    lines,
+                    hit.terms,
+                )
+            )
+
+        if not matches:
+            error = f"No code in the project matches `{query}`."
+            if not is_complete:
+                error += " Some files haven't been indexed yet, so try again later."
+
+            return error
+
+        return CodeSearchResult(
+            query=query,
+            matches=matches,
+            is_complete=is_complete,
+            frame_index=self.pdb.curindex,
+        )
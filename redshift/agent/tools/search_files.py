@@ -0,0 +1,167 @@
+# Standard library
+import re
+import os
+import time
+from collections import namedtuple
+
+# Third party
+from saplings.abstract import Tool
+
+# Local
+try:
+    from redshift.shared.grep import compile_query, grep
+    from redshift.shared.project_files import iter_files
+except ImportError:
+    from shared.grep import compile_query, grep
+    from shared.project_files import iter_files
+
+
+SearchResult = namedtuple(
+    "SearchResult", ["pattern", "matches", "num_files", "is_complete", "frame_index"]
+)
+# The files of a project listed so far, and the walk that lists the rest
+ProjectWalk = namedtuple("ProjectWalk", ["filenames", "files_iter"])
+
+MAX_RESULTS = 30
+CONTEXT_LINES = 2
+SEARCH_TIMEOUT = 5  # Seconds before returning the matches found so far
+WALK_TIMEOUT = 2  # Seconds of the search that listing the project's files can take
+
+TOOL_DESCRIPTION = """Searches the files in the stack trace and the rest of the project for lines that match a pattern, like grep. \
+Matches in the current file come first, then the other files in the stack trace, then the project. Each match includes the lines around it. \
+Use this to find where a value, error message, attribute, or config key is used or set. The search is case-insensitive unless the pattern has an uppercase letter."""
+
+
+def continue_walk(walk: ProjectWalk, deadline: float) -> bool:
+    # Lists more of the project's files until the deadline. True once they're all
+    # listed.
+    for filename in walk.files_iter:
+        walk.filenames.append(filename)
+        if time.monotonic() > deadline:
+            return False
+
+    return True
+
+
+class SearchFilesTool(Tool):
+    def __init__(self, pdb, printer, truncator, max_tokens: int = 4096):
+        # Base attributes
+        self.name = "grep"
+        self.description = TOOL_DESCRIPTION
+        self.parameters = {
+            "type": "object",
+            "properties": {
+                "explanation": {
+                    "type": "string",
+                    "description": "Short, one-sentence explanation of why this tool is being used, and how it contributes to the goal.",
+                },
+                "pattern": {
+                    "type": "string",
+                    "description": "The text to search for, e.g. `max_retries` or `Invalid token`.",
+                },
+                "is_regex": {
+                    "type": "boolean",
+                    "description": "Whether the pattern is a Python regular expression instead of plain text.",
+                },
+            },
+            "required": ["explanation", "pattern", "is_regex"],
+            "additionalProperties": False,
+        }
+        self.is_terminal = False
+        self.is_read_only = True
+
+        # Additional attributes
+        self.pdb = pdb
+        self.printer = printer
+        self.truncator = truncator
+        self.max_tokens = max_tokens
+
+    def _get_priorities(self) -> dict[str, int]:
+        # The current file first, then the rest of the stack
+        priorities = {}
+        for frame, _ in self.pdb.stack:
+            filename = frame.f_code.co_filename
+            if not filename.startswith("<"):  # E.g. <string>
+                priorities[os.path.abspath(filename)] = 1
+
+        curr_filename = self.pdb.curframe.f_code.co_filename
+        if not curr_filename.startswith("<"):
+            priorities[os.path.abspath(curr_filename)] = 2
+
+        return priorities
+
+    def _get_filenames(
+        self, priorities: dict[str, int], deadline: float
+    ) -> tuple[list[str], bool]:
+        # The files to search, and whether that's every file in the projects. The
+        # walk happens before the search so it can be stopped at the deadline, and
+        # picks up where it stopped the next time.
+        filenames = sorted(priorities, key=priorities.get, reverse=True)
+        seen = set(filenames)
+        is_complete = True
+        for root in self.pdb.get_project_roots():
+            walk = self.pdb.cached(
+                ("project_files", root), lambda: ProjectWalk([], iter_files(root))
+            )
+            if not continue_walk(walk, deadline):
+                is_complete = False
+            for filename in walk.filenames:
+                if filename not in seen:
+                    seen.add(filename)
+                    filenames.append(filename)
+
+        return filenames, is_complete
+
+    def format_output(self, output: SearchResult | str, **kwargs) -> str:
+        if isinstance(output, str):  # Error
+            return output
+
+        if not output.matches:
+            output_str = f"No lines match `{output.pattern}` (searched {output.num_files} files)."
+            if not output.is_complete:
+                output_str += " The search stopped early, so some files weren't searched."
+
+            return output_str
+
+        output_str = f"Lines that match `{output.pattern}` "
+        output_str += f"(searched {output.num_files} files"
+        output_str += "):\n\n" if output.is_complete else ", stopped early):\n\n"
+        for match in output.matches:
+            lines = match.before + [match.line] + match.after
+            code = self.pdb.format_lines(lines, match.lineno - len(match.before))
+            output_str += f"<file>\n{match.filename}:{match.lineno}\n</file>\n"
+            output_str += f"<code>\n{code}\n</code>\n\n"
+
+        output_str = output_str.rstrip()
+        return self.truncator.truncate_end(output_str, self.max_tokens, type="line")
+
+    async def run(
+        self, pattern: str, is_regex: bool = False, **kwargs
+    ) -> SearchResult | str:
+        self.printer.tool_call(self.name, pattern)
+
+        try:
+            query = compile_query(pattern, is_regex)
+        except re.error as error:
+            return f"Invalid regular expression `{pattern}`: {error}"
+
+        start_time = time.monotonic()
+        priorities = self._get_priorities()
+        filenames, is_walk_complete = self._get_filenames(
+            priorities, start_time + WALK_TIMEOUT
+        )
+        result = grep(
+            query,
+            filenames,
+            priorities,
+            max_results=MAX_RESULTS,
+            timeout=max(0, start_time + SEARCH_TIMEOUT - time.monotonic()),
+            context_lines=CONTEXT_LINES,
+        )
+        return SearchResult(
+            pattern=pattern,
+            matches=result.matches,
+            num_files=result.num_files,
+            is_complete=result.is_complete and is_walk_complete,
+            frame_index=self.pdb.curindex,
+        )
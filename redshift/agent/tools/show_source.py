@@ -1,11 +1,20 @@
 # Standard library
 import types
 import inspect
+import linecache
 from collections import namedtuple
 
 # Third party
 from saplings.abstract import Tool
 
+# Local
+try:
+    from redshift.shared.bounded_eval import EvalLimitError
+    from redshift.shared.symbol_index import get_symbol_index
+except ImportError:
+    from shared.bounded_eval import EvalLimitError
+    from shared.symbol_index import get_symbol_index
+
 
 SourceResult = namedtuple(
     "SourceResult", ["object", "filename", "lineno", "lines", "frame_index"]
@@ -35,6 +44,7 @@ class ShowSourceTool(Tool):
             "additionalProperties": False,
         }
         self.is_terminal = False
+        self.is_read_only = True
 
         # Additional attributes
         self.pdb = pdb
@@ -42,6 +52,30 @@ class ShowSourceTool(Tool):
         self.truncator = truncator
         self.max_tokens = max_tokens
 
+    def _get_indexed_source(
+        self, value: any, filename: str
+    ) -> tuple[list[str], int] | None:
+        # Reads the definition's lines straight from the symbol index, instead of
+        # inspect parsing the whole file again (which it does for every class)
+        value = inspect.unwrap(getattr(value, "__func__", value))
+        qualname = getattr(value, "__qualname__", None)
+        if not isinstance(qualname, str) or "<lambda>" in qualname:
+            return None
+
+        code = getattr(value, "__code__", None)
+        lineno = getattr(code, "co_firstlineno", None)
+        symbol_index = get_symbol_index()
+        line_range = symbol_index.get_range(filename, qualname, lineno)
+        if line_range is None:
+            symbol_index.update([filename])  # So it's there next time
+            return None
+
+        lineno, end_lineno = line_range
+        linecache.checkcache(filename)  # Like inspect, read what's on disk
+        lines = linecache.getlines(filename, self.pdb.curframe.f_globals)
+        lines = lines[lineno - 1 : end_lineno]
+        return (lines, lineno) if lines else None
+
     def format_output(self, output: SourceResult | str, **kwargs) -> str:
         stack_entry = self.pdb.format_stack_entry(
             self.pdb.stack[self.pdb.curindex], "\n-> "
@@ -66,8 +100,12 @@ class ShowSourceTool(Tool):
         # TODO: Try using pdir2 or pydoc as well
         value = None
         try:
-            value = eval(object, self.pdb.curframe.f_globals, self.pdb.curframe_locals)
-        except Exception as err:
+            value = self.pdb.run_bounded(
+                lambda: eval(
+                    object, self.pdb.curframe.f_globals, self.pdb.curframe_locals
+                )
+            )
+        except (Exception, EvalLimitError) as err:
             return f"Could not retrieve source code for `{object}`: {err}"
 
         if value is None:
@@ -80,7 +118,8 @@ class ShowSourceTool(Tool):
 
         try:
             filename = inspect.getfile(value)
-            lines, lineno = inspect.getsourcelines(value)
+            source = self._get_indexed_source(value, filename)
+            lines, lineno = source or inspect.getsourcelines(value)
             lineno = max(1, lineno)
 
             return SourceResult(
@@ -6,6 +6,14 @@ DEFAULT_AGENT_MODEL = "anthropic/claude-sonnet-4-20250514"
 DEFAULT_RESPONSE_MODEL = "anthropic/claude-sonnet-4-20250514"
 DEFAULT_MAX_ITERS = 25
 DEFAULT_HIDE_EXTERNAL_FRAMES = True
+DEFAULT_PREWARM = True
+DEFAULT_STREAM = True
+DEFAULT_PROMPT_CACHING = True
+DEFAULT_PREFETCH = False
+DEFAULT_EVAL_TIMEOUT = 5.0  # Seconds
+DEFAULT_EVAL_MAX_MEMORY = 512  # MB
+DEFAULT_TELEMETRY = False
+DEFAULT_TELEMETRY_FILE = None
 
 
 class Config:
@@ -15,14 +23,30 @@ class Config:
         response_model: str = DEFAULT_RESPONSE_MODEL,
         max_iters=DEFAULT_MAX_ITERS,
         hide_external_frames=DEFAULT_HIDE_EXTERNAL_FRAMES,
+        prewarm=DEFAULT_PREWARM,
+        stream=DEFAULT_STREAM,
+        prompt_caching=DEFAULT_PROMPT_CACHING,
+        prefetch=DEFAULT_PREFETCH,
+        eval_timeout=DEFAULT_EVAL_TIMEOUT,
+        eval_max_memory=DEFAULT_EVAL_MAX_MEMORY,
+        telemetry=DEFAULT_TELEMETRY,
+        telemetry_file=DEFAULT_TELEMETRY_FILE,
     ):
         self.agent_model = agent_model
         self.response_model = response_model
         self.max_iters = max_iters
         self.hide_external_frames = hide_external_frames
+        self.prewarm = prewarm
+        self.stream = stream
+        self.prompt_caching = prompt_caching
+        self.prefetch = prefetch
+        self.eval_timeout = eval_timeout
+        self.eval_max_memory = eval_max_memory
+        self.telemetry = telemetry
+        self.telemetry_file = telemetry_file
 
-    @classmethod
-    def from_args(cls):
+    @staticmethod
+    def get_parser() -> argparse.ArgumentParser:
         parser = argparse.ArgumentParser(
             description="An AI-powered debugger for Python."
         )
@@ -53,13 +77,94 @@ class Config:
             default=DEFAULT_HIDE_EXTERNAL_FRAMES,
             help="Hide frames from external modules in the debugger.",
         )
-        args = parser.parse_args()
+        parser.add_argument(
+            "--no-prewarm",
+            action="store_false",
+            dest="prewarm",
+            default=DEFAULT_PREWARM,
+            help="Don't load the agent in the background when a breakpoint is hit.",
+        )
+        parser.add_argument(
+            "--no-stream",
+            action="store_false",
+            dest="stream",
+            default=DEFAULT_STREAM,
+            help="Print responses once they're complete instead of streaming them.",
+        )
+        parser.add_argument(
+            "--no-prompt-caching",
+            action="store_false",
+            dest="prompt_caching",
+            default=DEFAULT_PROMPT_CACHING,
+            help="Don't mark prompts for provider-side caching.",
+        )
+        parser.add_argument(
+            "--prefetch",
+            action="store_true",
+            default=DEFAULT_PREFETCH,
+            help="Prepare the agent's context in the background at each breakpoint.",
+        )
+        parser.add_argument(
+            "--eval-timeout",
+            type=float,
+            required=False,
+            default=DEFAULT_EVAL_TIMEOUT,
+            help="Seconds the agent's expressions can run for (0 for no limit).",
+        )
+        parser.add_argument(
+            "--eval-max-memory",
+            type=int,
+            required=False,
+            default=DEFAULT_EVAL_MAX_MEMORY,
+            help="MB the agent's expressions can allocate (0 for no limit).",
+        )
+        parser.add_argument(
+            "--telemetry",
+            action="store_true",
+            default=DEFAULT_TELEMETRY,
+            help="Print where each answer spent its time, tokens and money.",
+        )
+        parser.add_argument(
+            "--telemetry-file",
+            type=str,
+            required=False,
+            default=DEFAULT_TELEMETRY_FILE,
+            help="Append the telemetry of each answer to this file, as JSON lines.",
+        )
+
+        return parser
+
+    @classmethod
+    def get_long_options(cls) -> list[str]:
+        # The options, in getopt's format (e.g. "eval-timeout=" if it takes a value)
+        long_options = []
+        for action in cls.get_parser()._actions:
+            for option in action.option_strings:
+                if option.startswith("--") and option != "--help":
+                    long_options.append(option[2:] + ("=" if action.nargs != 0 else ""))
+
+        return long_options
+
+    @classmethod
+    def from_args(cls, args: list[str] = None):
+        # Options override the environment variables, which override the defaults
+        parser = cls.get_parser()
+        parser.set_defaults(**vars(cls.from_env()))
+        args = parser.parse_args(args)
 
         return cls(
             agent_model=args.agent_model,
             response_model=args.response_model,
             max_iters=args.max_iters,
             hide_external_frames=args.hide_external_frames,
+            prewarm=args.prewarm,
+            stream=args.stream,
+            prompt_caching=args.prompt_caching,
+            prefetch=args.prefetch,
+            eval_timeout=args.eval_timeout,
+            eval_max_memory=args.eval_max_memory,
+            telemetry=args.telemetry,
+            telemetry_file=args.telemetry_file,
         )
 
     @classmethod
@@ -74,4 +179,33 @@ class Config:
             .strip()
             .lower()
             == "true",
+            prewarm=os.getenv("REDSHIFT_PREWARM", str(DEFAULT_PREWARM))
+            .strip()
+            .lower()
+            == "true",
+            stream=os.getenv("REDSHIFT_STREAM", str(DEFAULT_STREAM))
+            .strip()
+            .lower()
+            == "true",
+            prompt_caching=os.getenv(
+                "REDSHIFT_PROMPT_CACHING", str(DEFAULT_PROMPT_CACHING)
+            )
+            .strip()
+            .lower()
+            == "true",
+            prefetch=os.getenv("REDSHIFT_PREFETCH", str(DEFAULT_PREFETCH))
+            .strip()
+            .lower()
+            == "true",
+            eval_timeout=float(
+                os.getenv("REDSHIFT_EVAL_TIMEOUT", DEFAULT_EVAL_TIMEOUT)
+            ),
+            eval_max_memory=int(
+                os.getenv("REDSHIFT_EVAL_MAX_MEMORY", DEFAULT_EVAL_MAX_MEMORY)
+            ),
+            telemetry=os.getenv("REDSHIFT_TELEMETRY", str(DEFAULT_TELEMETRY))
+            .strip()
+            .lower()
+            == "true",
+            telemetry_file=os.getenv("REDSHIFT_TELEMETRY_FILE", DEFAULT_TELEMETRY_FILE),
         )
@@ -0,0 +1,101 @@
+# Standard library
+import sys
+import json
+import time
+import traceback
+
+
+#########
+# HELPERS
+#########
+
+
+def serialize_message(message) -> dict:
+    message_dict = {"role": message.role}
+    if message.content is not None:
+        message_dict["content"] = message.content
+    if message.tool_calls:
+        message_dict["tool_calls"] = [
+            {
+                "id": tool_call.id,
+                "name": tool_call.name,
+                "arguments": tool_call.arguments,
+            }
+            for tool_call in message.tool_calls
+        ]
+    if message.tool_call_id is not None:
+        message_dict["tool_call_id"] = message.tool_call_id
+
+    return message_dict
+
+
+def split_exception(t) -> tuple[BaseException | None, any]:
+    # post_mortem accepts either an exception or a traceback
+    if isinstance(t, BaseException):
+        return t, t.__traceback__
+
+    return None, t
+
+
+def format_exception(exception: BaseException | None, tb) -> str:
+    if exception is not None:
+        return "".join(traceback.format_exception(exception))
+
+    return "".join(traceback.format_tb(tb))
+
+
+def answer_question(debugger, question: str) -> dict:
+    start_time = time.time()
+    result = {"question": question, "answer": None, "error": None}
+    try:
+        result["answer"] = debugger.ask_question(question)
+
+        agent = debugger.agent
+        result["trajectory"] = [serialize_message(m) for m in agent.trajectory]
+        result["tool_calls"] = agent.printer.tool_calls
+        result["usage"] = agent.usage.to_dict()
+        result["telemetry"] = agent.telemetry.to_dict()
+        agent.printer.tool_calls = []
+    except Exception:
+        result["error"] = traceback.format_exc()
+
+    result["time"] = round(time.time() - start_time, 3)
+    return result
+
+
+######
+# MAIN
+######
+
+
+def build_report(
+    debugger, t, questions: list[str], exception: str | None = None
+) -> dict:
+    # Answers each question from scratch, without a prompt. `exception` overrides
+    # the one formatted from `t`, e.g. for a snapshot, which has no traceback.
+    exc, tb = split_exception(t)
+    if exception is None:
+        exception = format_exception(exc, tb)
+    report = {"exception": exception, "results": []}
+
+    debugger.setup(None, tb)
+    try:
+        for question in questions:
+            report["results"].append(answer_question(debugger, question))
+    finally:
+        debugger.forget()
+
+    return report
+
+
+def write_report(report: dict, output: str | None = None):
+    # To stderr by default, so it isn't mixed in with the program's own output.
+    # "-" writes it to stdout.
+    if output is None or output == "-":
+        stream = sys.stdout if output == "-" else sys.stderr
+        json.dump(report, stream, indent=2, default=str)
+        stream.write("\n")
+        return
+
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2, default=str)
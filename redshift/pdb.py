@@ -1,34 +1,142 @@
 # Standard library
 import pdb
 import sys
-import json
 import linecache
+import threading
 import traceback
 from typing import Generator
 
 # Local
 try:
-    from redshift.agent import Agent
     from redshift.config import Config
+    from redshift.headless import build_report, write_report, format_exception
+    from redshift.snapshot import (
+        take_snapshot,
+        take_post_mortem_snapshot,
+        get_default_snapshot_path,
+        write_snapshot,
+        load_snapshot,
+        restore_stack,
+        install_sources,
+    )
     from redshift.shared.truncator import Truncator
-    from redshift.shared.serializers import serialize_vars
+    from redshift.shared.context_cache import ContextCache
+    from redshift.shared.find_repeats import find_repeats
+    from redshift.shared.token_budget import water_fill
+    from redshift.shared.symbol_index import get_symbol_index, find_project_root
+    from redshift.shared.search_index import get_search_index
+    from redshift.shared.bounded_eval import run_bounded, BYTES_PER_MB, EvalLimitError
     from redshift.shared.is_internal_frame import is_internal_frame
+    from redshift.shared.serializers import (
+        serialize_vars_dict,
+        serialize_call_args_dict,
+        CHARS_PER_TOKEN,
+    )
 except ImportError:
-    from .agent import Agent
     from .config import Config
+    from .headless import build_report, write_report, format_exception
+    from .snapshot import (
+        take_snapshot,
+        take_post_mortem_snapshot,
+        get_default_snapshot_path,
+        write_snapshot,
+        load_snapshot,
+        restore_stack,
+        install_sources,
+    )
     from .shared.truncator import Truncator
-    from .shared.serializers import serialize_vars
+    from .shared.context_cache import ContextCache
+    from .shared.find_repeats import find_repeats
+    from .shared.token_budget import water_fill
+    from .shared.symbol_index import get_symbol_index, find_project_root
+    from .shared.search_index import get_search_index
+    from .shared.bounded_eval import run_bounded, BYTES_PER_MB, EvalLimitError
     from .shared.is_internal_frame import is_internal_frame
+    from .shared.serializers import (
+        serialize_vars_dict,
+        serialize_call_args_dict,
+        CHARS_PER_TOKEN,
+    )
+
+
+#########
+# HELPERS
+#########
+
+
+_prewarm_thread = None
+
+AGENT_COMMANDS = ("ask", "run", "fix")
+CANCEL_GRACE = 1  # Seconds past the eval timeout to wait for a prefetch task
+
+
+def format_hidden_frames(count: int) -> str:
+    plural = "s" if count > 1 else ""
+    return f"[... {count} hidden frame{plural} ...]\n"
+
+
+def wait_for_prewarm():
+    # Importing litellm from two threads at once can deadlock on its circular
+    # imports, so let the prewarm finish first
+    prewarm_thread = _prewarm_thread
+    if prewarm_thread is not None and prewarm_thread is not threading.current_thread():
+        prewarm_thread.join()
+
+
+def get_cancel_timeout(config: Config) -> float | None:
+    # How long cancelling the prefetch waits for its task in progress, which
+    # runs within the eval timeout (plus a watchdog poll)
+    if not config.eval_timeout:
+        return None
+
+    return config.eval_timeout + CANCEL_GRACE
+
+
+def load_agent_class():
+    # The agent pulls in litellm, saplings and rich, which take seconds to import,
+    # so it's only loaded once a redshift command needs it
+    wait_for_prewarm()
+
+    try:
+        from redshift.agent import Agent
+    except ImportError:
+        from .agent import Agent
+
+    return Agent
+
+
+def prewarm_agent():
+    global _prewarm_thread
+
+    def _import():
+        try:
+            load_agent_class()
+        except ImportError:
+            pass  # Surfaced when a command actually needs the agent
+
+    if _prewarm_thread is None:
+        _prewarm_thread = threading.Thread(target=_import, daemon=True)
+        _prewarm_thread.start()
+
+
+######
+# MAIN
+######
 
 
 class RedshiftPdb(pdb.Pdb):
     def __init__(self, *args, **kwargs):
         # Extract config before passing kwargs to parent
         config = kwargs.pop("config", None)
+        headless = kwargs.pop("headless", False)
         super().__init__(*args, **kwargs)
         self._prompt = "Redshift"
         self.redshift_config = Config.from_env() if config is None else config
-        self._agent = Agent(self, self.redshift_config)
+        self.headless = headless  # Nothing is printed by the agent
+        self._agent = None  # Loaded lazily, see `agent`
+        self._context_cache = ContextCache(  # Cleared when the program resumes
+            cancel_timeout=get_cancel_timeout(self.redshift_config)
+        )
         self._last_command = None  # Used to detect follow-ups
         # TODO: Capture command history; use as context for agent
         # TODO: Capture stdin; use as context for agent
@@ -36,6 +144,53 @@ class RedshiftPdb(pdb.Pdb):
 
     ## Helpers ##
 
+    @property
+    def agent(self):
+        if self._agent is None:
+            Agent = load_agent_class()
+            self._agent = Agent(self, self.redshift_config, headless=self.headless)
+
+        return self._agent
+
+    def _reset_agent(self):
+        if self._agent is not None:
+            self._agent.reset()
+
+    def _is_agent_command(self, line: str) -> bool:
+        cmd, _, _ = self.parseline(line)
+        return cmd in AGENT_COMMANDS
+
+    def _start_prefetch(self):
+        # Precomputes the context of the first agent request while the user is
+        # typing. Every command waits for it or cancels it first (see `onecmd`),
+        # which waits for the task in progress, so it only runs while the program
+        # is paused. The tasks run user code (e.g. reprs), so they're bounded like
+        # the agent's own evaluations, and cancelling waits at most that long.
+        if not self.redshift_config.prefetch or not self.curframe:
+            return
+
+        config = self.redshift_config
+        truncator = Truncator(config.agent_model)
+        tasks = [
+            lambda: self.format_frame_line(self.curframe),
+            lambda: self.format_stack_trace(config.agent_model),
+            lambda: self.format_stack_trace(config.response_model),
+            self.get_call_args,
+            lambda: truncator.count_tokens("\n".join(self.get_curr_file_lines())),
+            lambda: truncator.index_lines(self.get_curr_file_lines()),
+            self.index_symbols,
+        ]
+        self._context_cache.prefetch(
+            [lambda task=task: self._run_prefetch_task(task) for task in tasks],
+            before=wait_for_prewarm,
+        )
+
+    def _run_prefetch_task(self, task: callable):
+        try:
+            self.run_bounded(task)
+        except EvalLimitError:
+            pass  # Computed again if the agent asks for it
+
     def _build_query_prompt(self, arg: str) -> str:
         query = arg.strip()
         if self._last_command == "ask":  # Follow-up, context is already attached
@@ -114,62 +269,127 @@ class RedshiftPdb(pdb.Pdb):
             yield frame_lineno
 
     def format_variables(self, model: str, max_tokens: int = 4096) -> str:
-        locals_ = self.curframe_locals
-        locals_ = serialize_vars(locals_)
-        locals_ = json.loads(locals_)
+        # No single value can use more than the whole budget
+        max_chars = max_tokens * CHARS_PER_TOKEN
 
-        globals_ = self.curframe.f_globals
-        globals_ = serialize_vars(globals_)
-        globals_ = json.loads(globals_)
+        locals_ = serialize_vars_dict(self.curframe_locals, max_chars=max_chars)
+        globals_ = serialize_vars_dict(self.curframe.f_globals, max_chars=max_chars)
 
+        # Values that need less than an even share leave the rest to larger ones
         truncator = Truncator(model)
-        tokens_per_val = max_tokens // (len(locals_) + len(globals_))
-
+        items = [*globals_.items(), *locals_.items()]
+        needs = [truncator.count_tokens(value) for _, value in items]
+        allocations = water_fill(needs, max_tokens)
+
+        formatted_vars = []
+        for (key, value), need, num_tokens in zip(items, needs, allocations):
+            if need > num_tokens:
+                # Too small a share to keep anything besides the ellipsis
+                value = (
+                    truncator.truncate_middle(value, num_tokens)
+                    if num_tokens > 3
+                    else "..."
+                )
+
+            formatted_vars.append(f"{key} = {value}\n")
+
+        num_globals = len(globals_)
         formatted_str = "<globals>\n"
-        for key, value in globals_.items():
-            value = truncator.truncate_middle(value, tokens_per_val)
-            formatted_str += f"{key} = {value}\n"
+        formatted_str += "".join(formatted_vars[:num_globals])
         formatted_str += "</globals>\n"
         formatted_str += "<locals>\n"
-        for key, value in locals_.items():
-            value = truncator.truncate_middle(value, tokens_per_val)
-            formatted_str += f"{key} = {value}\n"
+        formatted_str += "".join(formatted_vars[num_globals:])
         formatted_str += "</locals>\n"
 
         return formatted_str
 
     def format_stack_trace(self, model: str, max_tokens: int = 4096) -> str:
-        stack_trace = ""
-        hidden_count = 0
+        return self.cached(
+            ("stack_trace", self.curindex, model, max_tokens),
+            lambda: self._format_stack_trace(model, max_tokens),
+        )
+
+    def _format_stack_entries(self) -> list[str | None]:
+        # Independent of the current frame, so moving doesn't re-render them
+        entries = []
         for frame_lineno in self.stack:
             frame, _ = frame_lineno
             is_hidden = (
                 self.redshift_config.hide_external_frames
                 and not is_internal_frame(frame)
             )
+            entries.append(
+                None if is_hidden else self.format_stack_entry(frame_lineno, "\n-> ")
+            )
+
+        return entries
+
+    def _find_collapsed_frames(
+        self, entries: list[str | None]
+    ) -> dict[int, tuple[int, str]]:
+        # Maps the first frame of each collapsed run of repeated frames (e.g. from
+        # a recursive call) to the index after the run and a line summarizing it.
+        # The first and last repeats are kept, as is the current frame.
+        keys = [
+            (frame.f_code.co_filename, frame.f_code.co_name)  # Also for snapshots
+            for frame, _ in self.stack
+        ]
+        keys[self.curindex] = None
+
+        collapsed = {}
+        for start, period, num_repeats in find_repeats(keys):
+            first = start + period
+            end = start + period * (num_repeats - 1)
+            if all(entry is None for entry in entries[start:first]):
+                continue  # Only hidden frames, which are collapsed anyway
+
+            cycle = " → ".join(
+                self.stack[index][0].f_code.co_name for index in range(start, first)
+            )
+            summary = f"[... frames {first + 1}–{end} repeat {cycle} × {num_repeats - 2} ...]"
+            collapsed[first] = (end, summary)
+
+        return collapsed
 
-            if is_hidden:
+    def _format_stack_trace(self, model: str, max_tokens: int) -> str:
+        entries = self.cached(("stack_entries",), self._format_stack_entries)
+        collapsed = self.cached(
+            ("collapsed_frames", self.curindex),
+            lambda: self._find_collapsed_frames(entries),
+        )
+
+        stack_trace = ""
+        hidden_count = 0
+        skip_until = 0
+        for index, (frame_lineno, entry) in enumerate(zip(self.stack, entries)):
+            frame, _ = frame_lineno
+            if index < skip_until:
+                continue
+            elif entry is None and index not in collapsed:
                 hidden_count += 1
                 continue
             elif hidden_count > 0:
-                plural = "s" if hidden_count > 1 else ""
-                stack_trace += f"[... {hidden_count} hidden frame{plural} ...]"
+                stack_trace += format_hidden_frames(hidden_count)
                 hidden_count = 0
 
+            if index in collapsed:
+                skip_until, summary = collapsed[index]
+                stack_trace += f"  {summary}\n"
+                continue
+
             if frame is self.curframe:
                 prefix = "> "
             else:
                 prefix = "  "
 
-            stack_entry = f"{prefix}{self.format_stack_entry(frame_lineno, '\n-> ')}\n"
+            stack_entry = f"{prefix}{entry}\n"
             if not stack_entry.strip():
                 continue
 
             stack_trace += stack_entry
 
         if hidden_count > 0:
-            plural = "s" if hidden_count > 1 else ""
-            stack_trace += f"[... {hidden_count} hidden frame{plural} ...]"
+            stack_trace += format_hidden_frames(hidden_count)
 
         stack_trace = stack_trace.rstrip()
 
@@ -184,6 +404,12 @@ class RedshiftPdb(pdb.Pdb):
         return stack_trace
 
     def format_frame_line(self, frame, window: int = 5) -> str:
+        return self.cached(
+            ("frame_line", frame, window),
+            lambda: self._format_frame_line(frame, window),
+        )
+
+    def _format_frame_line(self, frame, window: int) -> str:
         curr_filename = frame.f_code.co_filename
         curr_lineno = frame.f_lineno
         lines = linecache.getlines(curr_filename, frame.f_globals)
@@ -195,6 +421,62 @@ class RedshiftPdb(pdb.Pdb):
         snapshot = self.format_lines(lines[first - 1 : last], first, breaklist, frame)
         return snapshot
 
+    def cached(self, key: tuple, compute: callable) -> any:
+        # Memoizes values that only depend on the state of the paused program
+        return self._context_cache.get(key, compute)
+
+    def get_project_roots(self) -> list[str]:
+        # Roots of the projects that the stack's internal (not library) files are in
+        roots = set()
+        for frame, _ in self.stack:
+            filename = frame.f_code.co_filename
+            if filename.startswith("<") or not is_internal_frame(frame):
+                continue
+
+            roots.add(find_project_root(filename))
+
+        return sorted(roots - {None})
+
+    def index_symbols(self):
+        # Indexes the files in the stack, and the projects of the ones that aren't
+        # external, in the background. Only files that changed are parsed again.
+        filenames = set()
+        for frame, _ in self.stack:
+            filename = frame.f_code.co_filename
+            if not filename.startswith("<"):  # E.g. <string>
+                filenames.add(filename)
+
+        symbol_index = get_symbol_index()
+        symbol_index.update(list(filenames))
+        for root in self.get_project_roots():
+            symbol_index.update_project(root)
+
+    def index_code(self):
+        # Updates the search indexes of the stack's projects in the background.
+        # Only files that changed are tokenized again.
+        for root in self.get_project_roots():
+            get_search_index(root).update()
+
+    def run_bounded(self, fn: callable) -> any:
+        # Runs code on the agent's behalf (e.g. an expression it asked for) within
+        # the configured limits. Raises EvalLimitError if it exceeds them.
+        config = self.redshift_config
+        return run_bounded(
+            fn,
+            timeout=config.eval_timeout or None,
+            max_memory=config.eval_max_memory * BYTES_PER_MB or None,
+        )
+
+    def get_call_args(
+        self, max_chars: int = 4096 * CHARS_PER_TOKEN
+    ) -> dict[str, str]:
+        return self.cached(
+            ("call_args", self.curindex, max_chars),
+            lambda: serialize_call_args_dict(
+                self.curframe.f_code, self.curframe_locals, max_chars=max_chars
+            ),
+        )
+
     def format_exception(self) -> str:
         exception_type, exception_value, _ = sys.exc_info()
         stack_trace = traceback.extract_stack(self.curframe)
@@ -202,6 +484,7 @@ class RedshiftPdb(pdb.Pdb):
         return stack_trace
 
     def execute_code(self, code: str):
+        self._context_cache.clear()  # The code may change the program's state
         locals = self.curframe_locals
         globals = self.curframe.f_globals
 
@@ -242,20 +525,45 @@ class RedshiftPdb(pdb.Pdb):
     def prompt(self, value):
         self._prompt = value
 
+    def interaction(self, *args, **kwargs):
+        if self.redshift_config.prewarm:
+            prewarm_agent()  # Import while the user is typing
+
+        self._context_cache.clear()  # Stopped somewhere else
+        return super().interaction(*args, **kwargs)
+
+    def preloop(self):
+        super().preloop()
+        self._start_prefetch()  # The stack is only set up by now
+
+    def postloop(self):
+        self._context_cache.clear()
+        super().postloop()
+
     def default(self, line):
         # TODO: Wrong overload
         if not self._is_follow_up(line):
-            self._agent.reset()
+            self._reset_agent()
             self._last_command = None
 
         return super().default(line)
 
     def onecmd(self, line):
+        is_agent_command = self._is_agent_command(line)
+        if is_agent_command:
+            self._context_cache.wait()  # Let the prefetch finish
+        else:
+            self._context_cache.clear()  # Any other command may change the state
+
         if not self._is_follow_up(line):
-            self._agent.reset()
+            self._reset_agent()
             self._last_command = None
 
-        return super().onecmd(line)
+        stop = super().onecmd(line)
+        if not stop and not is_agent_command:
+            self._start_prefetch()
+
+        return stop
 
     ## New commands ##
 
@@ -274,10 +582,46 @@ class RedshiftPdb(pdb.Pdb):
 
         self._save_state()
         prompt = self._build_query_prompt(arg)
-        self._agent.ask(prompt)
+        self.agent.ask(prompt)
         self._last_command = "ask"
         self._restore_state()
 
+    def ask_question(self, question: str) -> str:
+        # Non-interactive counterpart of `ask`. Every question starts from scratch.
+        self._reset_agent()
+        self._last_command = None
+        self._save_state()
+        try:
+            prompt = self._build_query_prompt(question)
+            return self.agent.ask(prompt)
+        finally:
+            self._restore_state()
+
+    def do_snapshot(self, arg: str):
+        """snapshot [path]
+
+        Save the stack to a file: the source around each frame and the values
+        of its variables. Open it with `redshift --snapshot path` to keep
+        debugging after this program has exited.
+
+        Example: `snapshot crash.snapshot.gz`
+        """
+
+        if not self.curframe:
+            self.message("You can only use redshift if a frame is available")
+            return
+
+        exc = sys.exception()
+        exception = format_exception(exc, exc.__traceback__) if exc else None
+        path = arg.strip() or get_default_snapshot_path()
+        try:
+            write_snapshot(take_snapshot(self, exception), path)
+        except OSError as err:
+            self.error(f"Could not save the snapshot: {err}")
+            return
+
+        self.message(f"Saved snapshot to {path}")
+
     def do_run(self, arg: str):
         """run prompt
 
@@ -293,7 +637,7 @@ class RedshiftPdb(pdb.Pdb):
             return
 
         prompt = arg.strip()
-        self._agent.run(prompt)
+        self.agent.run(prompt)
         # TODO: Handle follow-ups
 
     def do_fix(self, arg: str):
@@ -316,7 +660,37 @@ class RedshiftPdb(pdb.Pdb):
         exception = self.format_exception()
         print(exception)
         # TODO: Get the stack trace and plug it in
-        self._agent.fix(prompt)
+        self.agent.fix(prompt)
+
+
+class SnapshotPdb(RedshiftPdb):
+    # Debugs a snapshot (see `snapshot.py`) instead of a live program. Only the
+    # captured stack can be inspected, and values are the reprs saved with it.
+    def __init__(self, snapshot: dict, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prompt = "Redshift snapshot"
+        self.snapshot = snapshot
+        self._snapshot_stack, self._snapshot_tb_lineno = restore_stack(snapshot)
+        install_sources(snapshot)
+
+    def setup(self, f, tb):
+        # The stack always comes from the snapshot
+        self.forget()
+        self.stack = list(self._snapshot_stack)
+        self.tb_lineno.update(self._snapshot_tb_lineno)
+        self.curindex = self.snapshot["curindex"]
+        self.curframe = self.stack[self.curindex][0]
+        self.curframe_locals = self.curframe.f_locals
+        self.set_convenience_variable(self.curframe, "_frame", self.curframe)
+        return self.execRcLines()
+
+    def do_longlist(self, arg: str):
+        self.error("Only the lines around each frame were saved, use `list` instead")
+
+    do_ll = do_longlist
+
+    def do_snapshot(self, arg: str):
+        self.error("This is already a snapshot")
 
 
 def run(statement, globals=None, locals=None):
@@ -343,7 +717,14 @@ def set_trace(*, header=None):
     redshift_pdb.set_trace(sys._getframe().f_back)
 
 
-def post_mortem(t=None):
+def post_mortem(
+    t=None,
+    *,
+    questions: list[str] = None,
+    output: str = None,
+    snapshot: str = None,
+    config: Config = None,
+):
     if t is None:
         exc = sys.exception()
         if exc is not None:
@@ -354,7 +735,24 @@ def post_mortem(t=None):
             "A valid traceback must be passed if no exception is being handled"
         )
 
-    redshift_pdb = RedshiftPdb()
+    if questions is not None or snapshot is not None:
+        exc = sys.exception()
+        if exc is not None and exc.__traceback__ is t:
+            t = exc  # Keeps the exception message for the report
+
+    if snapshot is not None:  # Save the stack, so the program can exit right away
+        redshift_pdb = RedshiftPdb(config=config, readrc=False)
+        redshift_pdb.reset()
+        write_snapshot(take_post_mortem_snapshot(redshift_pdb, t), snapshot)
+        return
+
+    if questions is not None:  # Headless: answer the questions, then exit
+        redshift_pdb = RedshiftPdb(config=config, headless=True, readrc=False)
+        redshift_pdb.reset()
+        write_report(build_report(redshift_pdb, t, questions), output)
+        return
+
+    redshift_pdb = RedshiftPdb(config=config)
     redshift_pdb.reset()
     redshift_pdb.interaction(None, t)
 
@@ -363,6 +761,31 @@ def pm():
     post_mortem(sys.last_exc)
 
 
+def open_snapshot(
+    path: str,
+    *,
+    questions: list[str] = None,
+    output: str = None,
+    config: Config = None,
+):
+    # Same as post_mortem, but for a snapshot saved earlier, possibly by a
+    # different process
+    snapshot = load_snapshot(path)
+
+    if questions is not None:
+        snapshot_pdb = SnapshotPdb(snapshot, config=config, headless=True, readrc=False)
+        snapshot_pdb.reset()
+        report = build_report(snapshot_pdb, None, questions, snapshot["exception"])
+        write_report(report, output)
+        return
+
+    snapshot_pdb = SnapshotPdb(snapshot, config=config)
+    snapshot_pdb.reset()
+    if snapshot["exception"]:
+        snapshot_pdb.message(snapshot["exception"].rstrip())
+    snapshot_pdb.interaction(None, None)
+
+
 # TODO: Test post-mortem / exception handling
 # TODO: Test async + multithreading
 # TODO: Include globals + locals in the `ask` prompt
@@ -0,0 +1,172 @@
+# Standard library
+import os
+import time
+import ctypes
+import threading
+import tracemalloc
+
+
+BYTES_PER_MB = 1024 * 1024
+POLL_INTERVAL = 0.01  # Seconds between the watchdog's checks
+
+# Threads running a memory-bounded call, once per call. The memory limit is
+# checked against the whole process, so redshift's own background threads (e.g.
+# indexing) pause between tasks while there are any, rather than have their
+# allocations charged to the call (see `wait_for_evaluations`).
+_evaluating_threads = []
+_evaluations_done = threading.Condition()
+
+
+class EvalLimitError(BaseException):
+    # Not an Exception, so the evaluated code can't swallow it with `except
+    # Exception` (same as KeyboardInterrupt)
+    pass
+
+
+class EvalTimeoutError(EvalLimitError):
+    pass
+
+
+class EvalMemoryError(EvalLimitError):
+    pass
+
+
+#########
+# HELPERS
+#########
+
+
+def get_rss() -> int | None:
+    # Resident memory of the process, read without slowing down allocations like
+    # tracemalloc does. Only available on Linux.
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_traced_memory() -> int:
+    return tracemalloc.get_traced_memory()[0]
+
+
+def set_async_exc(thread_id: int, exc_type: type | None):
+    # Raises `exc_type` in the thread the next time it runs Python bytecode, or
+    # clears a pending exception if it's None
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id),
+        ctypes.py_object(exc_type) if exc_type is not None else None,
+    )
+
+
+def wait_for_evaluations():
+    # Called by background threads between tasks. Only the allocations of a task
+    # already in progress, and of threads that redshift doesn't own (e.g. the
+    # program's), can still count towards an evaluation's memory.
+    thread_id = threading.get_ident()
+    with _evaluations_done:
+        _evaluations_done.wait_for(
+            lambda: all(ident == thread_id for ident in _evaluating_threads)
+        )
+
+
+class Watchdog(object):
+    # Interrupts a thread once it exceeds a time or memory budget. Unlike a trace
+    # function, this doesn't slow down the watched code. Like one, it can't
+    # interrupt a single long-running C call (e.g. a blocking socket read).
+    def __init__(
+        self, timeout: float | None, max_memory: int | None, get_memory: callable
+    ):
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.get_memory = get_memory
+        self.thread_id = threading.get_ident()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._fired = False
+
+    def _get_exceeded_limit(self, deadline: float, baseline: int) -> type | None:
+        if self.timeout is not None and time.perf_counter() > deadline:
+            return EvalTimeoutError
+        if self.max_memory is not None:
+            if self.get_memory() - baseline > self.max_memory:
+                return EvalMemoryError
+
+        return None
+
+    def _watch(self, deadline: float, baseline: int):
+        while not self._done.wait(POLL_INTERVAL):
+            exc_type = self._get_exceeded_limit(deadline, baseline)
+            if exc_type is None:
+                continue
+
+            with self._lock:
+                if not self._done.is_set():
+                    set_async_exc(self.thread_id, exc_type)
+                    self._fired = True
+
+            return
+
+    def start(self):
+        deadline = time.perf_counter() + (self.timeout or 0)
+        baseline = self.get_memory() if self.max_memory else 0
+        threading.Thread(
+            target=self._watch, args=(deadline, baseline), daemon=True
+        ).start()
+
+    def stop(self):
+        with self._lock:
+            self._done.set()
+            if self._fired:  # Not raised yet if the call just returned
+                set_async_exc(self.thread_id, None)
+
+    def format_error(self, exc: EvalLimitError) -> EvalLimitError:
+        if isinstance(exc, EvalTimeoutError):
+            return EvalTimeoutError(f"Timed out after {self.timeout:g}s")
+
+        return EvalMemoryError(
+            f"Allocated more than {self.max_memory / BYTES_PER_MB:g} MB"
+        )
+
+
+######
+# MAIN
+######
+
+
+def run_bounded(
+    fn: callable, timeout: float | None = None, max_memory: int | None = None
+) -> any:
+    # Calls `fn` in this thread, raising EvalLimitError if it runs longer than
+    # `timeout` seconds or allocates more than `max_memory` bytes
+    if timeout is None and max_memory is None:
+        return fn()
+
+    get_memory = get_rss
+    started_tracemalloc = False
+    if max_memory is not None and get_rss() is None:
+        get_memory = get_traced_memory
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+
+    watchdog = Watchdog(timeout, max_memory, get_memory)
+    if max_memory is not None:
+        with _evaluations_done:
+            _evaluating_threads.append(watchdog.thread_id)
+
+    try:
+        watchdog.start()
+        try:
+            return fn()
+        finally:
+            watchdog.stop()
+    except EvalLimitError as exc:
+        raise watchdog.format_error(exc) from None
+    finally:
+        if started_tracemalloc:
+            tracemalloc.stop()
+        if max_memory is not None:
+            with _evaluations_done:
+                _evaluating_threads.remove(watchdog.thread_id)
+                _evaluations_done.notify_all()
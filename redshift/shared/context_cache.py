@@ -0,0 +1,90 @@
+# Standard library
+import threading
+
+
+MISSING = object()
+
+
+class PrefetchCancelled(Exception):
+    pass
+
+
+class ContextCache(object):
+    # Caches context computed while the program is paused, e.g. the formatted
+    # stack trace, and can compute it ahead of time in a background thread. Must be
+    # cleared whenever the program's state may have changed.
+    def __init__(self, cancel_timeout: float = None):
+        self.cancel_timeout = cancel_timeout  # Seconds to wait for a prefetch task
+        self._results = {}
+        self._thread = None
+        self._cancelled = threading.Event()
+        self._idle = threading.Event()  # Set while no prefetch task is running
+        self._idle.set()
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Of the prefetch threads
+
+    def prefetch(self, tasks: list[callable], before: callable = None):
+        # Tasks fill the cache by calling whatever `get`s the values
+        self.cancel()
+        results = self._results
+        cancelled = self._cancelled = threading.Event()
+        idle = self._idle = threading.Event()
+        idle.set()
+
+        def _run():
+            # Fills the results of the state it started in, so a prefetch that's
+            # abandoned can't write values computed before the state changed
+            self._local.results = results
+            self._local.cancelled = cancelled
+            if before:
+                before()  # Doesn't read the program's state, so isn't waited for
+
+            for task in tasks:
+                with self._lock:
+                    if cancelled.is_set():
+                        return
+
+                    idle.clear()
+
+                try:
+                    task()
+                except Exception:
+                    pass  # Surfaced if the value is computed on demand
+                finally:
+                    idle.set()
+
+        self._thread = threading.Thread(target=_run, daemon=True)
+        self._thread.start()
+
+    def wait(self):
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def cancel(self) -> bool:
+        # Stops the prefetch after the task in progress, and waits for that task
+        # to finish, since it reads the program's state. A task that runs past
+        # `cancel_timeout` is abandoned, and starts no other computation. True if
+        # nothing is left running.
+        with self._lock:
+            self._cancelled.set()
+            idle = self._idle
+
+        self._thread = None
+        return idle.wait(self.cancel_timeout)
+
+    def clear(self):
+        self.cancel()
+        self._results = {}  # Not cleared in place, since a prefetch may still fill it
+
+    def get(self, key: tuple, compute: callable) -> any:
+        results = getattr(self._local, "results", self._results)
+        value = results.get(key, MISSING)
+        if value is MISSING:
+            cancelled = getattr(self._local, "cancelled", None)
+            if cancelled is not None and cancelled.is_set():
+                raise PrefetchCancelled()
+
+            value = results[key] = compute()
+
+        return value
@@ -0,0 +1,40 @@
+MAX_PERIOD = 8  # Longest cycle of calls that's detected, e.g. f -> g -> h -> f
+MIN_REPEATS = 4
+
+
+######
+# MAIN
+######
+
+
+def find_repeats(
+    keys: list, max_period: int = MAX_PERIOD, min_repeats: int = MIN_REPEATS
+) -> list[tuple[int, int, int]]:
+    # Finds runs where a cycle of keys repeats back to back, e.g. the frames of a
+    # recursive call. Returns (start, period, num_repeats) for each run, in order.
+    # Each position is compared against at most `max_period` others per period
+    # before the scan moves past it, so this is linear in len(keys).
+    repeats = []
+    start = 0
+    while start < len(keys):
+        best = None  # (num_repeats, period)
+        for period in range(1, max_period + 1):
+            end = start
+            while end + period < len(keys) and keys[end] == keys[end + period]:
+                end += 1
+
+            num_repeats = (end - start) // period + 1
+            if num_repeats < min_repeats:
+                continue
+            if best is None or num_repeats * period > best[0] * best[1]:
+                best = (num_repeats, period)
+
+        if best is None:
+            start += 1
+            continue
+
+        num_repeats, period = best
+        repeats.append((start, period, num_repeats))
+        start += num_repeats * period
+
+    return repeats
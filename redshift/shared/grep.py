@@ -0,0 +1,224 @@
+# Standard library
+import os
+import re
+import mmap
+import time
+import threading
+from collections import namedtuple
+
+
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+MAX_FILE_SIZE = 2 * 1024 * 1024  # Bigger files are almost never source code
+MMAP_THRESHOLD = 256 * 1024  # Smaller files are faster to read than to map
+MAX_MATCHES_PER_FILE = 20
+BINARY_CHECK_SIZE = 8192  # Files with a NUL byte in this prefix are skipped
+BATCH_SIZE = 64  # Files per task, so workers don't contend for every file
+DEFINITION_PREFIXES = ("def ", "async def ", "class ")
+
+# `literal` is the query's bytes (lowercased if `ignore_case`) if it isn't a regex
+Query = namedtuple("Query", ["pattern", "literal", "ignore_case"])
+GrepMatch = namedtuple(
+    "GrepMatch", ["filename", "lineno", "line", "before", "after", "priority"]
+)
+GrepResult = namedtuple("GrepResult", ["matches", "num_files", "is_complete"])
+
+
+#########
+# HELPERS
+#########
+
+
+def has_match(source: bytes | mmap.mmap, query: Query) -> bool:
+    # Finding a literal is several times faster than a case-insensitive regex.
+    # Both only fold ASCII letters, so they agree.
+    if query.literal is None:
+        return query.pattern.search(source) is not None
+    if not query.ignore_case:
+        return source.find(query.literal) != -1
+    if isinstance(source, bytes):
+        return query.literal in source.lower()
+
+    return query.pattern.search(source) is not None
+
+
+def read_source(filename: str, query: Query) -> bytes | None:
+    # The file's contents if it may have a match. Big files are mapped rather
+    # than read, so the ones without a match are scanned without being copied.
+    with open(filename, "rb", buffering=0) as file:
+        size = os.fstat(file.fileno()).st_size
+        if not size or size > MAX_FILE_SIZE:
+            return None
+
+        if size < MMAP_THRESHOLD:
+            source = file.read()
+            if source.find(b"\0", 0, BINARY_CHECK_SIZE) != -1:
+                return None
+
+            return source if has_match(source, query) else None
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if buffer.find(b"\0", 0, BINARY_CHECK_SIZE) != -1:
+                return None
+
+            return buffer[:] if has_match(buffer, query) else None
+
+
+def search_file(
+    filename: str, query: Query, context_lines: int
+) -> list[tuple[int, str, list[str], list[str]]]:
+    # (lineno, line, lines before, lines after) of each line that matches
+    try:
+        source = read_source(filename, query)
+    except (OSError, ValueError):
+        return []
+
+    if source is None:
+        return []
+
+    pattern = query.pattern
+    linenos = []
+    lineno, counted = 1, 0
+    match = pattern.search(source)
+    while match and len(linenos) < MAX_MATCHES_PER_FILE:
+        start = source.rfind(b"\n", 0, match.start()) + 1
+        lineno += source.count(b"\n", counted, start)
+        counted = start
+        linenos.append(lineno)
+
+        end = source.find(b"\n", match.end())
+        if end == -1:
+            break
+        match = pattern.search(source, end + 1)
+
+    lines = source.decode("utf-8", "replace").split("\n")
+    lines = [line.rstrip("\r") for line in lines]
+    hits = []
+    for lineno in linenos:
+        before = lines[max(0, lineno - 1 - context_lines) : lineno - 1]
+        after = lines[lineno : lineno + context_lines]
+        hits.append((lineno, lines[lineno - 1], before, after))
+
+    return hits
+
+
+def is_definition(line: str) -> bool:
+    return line.lstrip().startswith(DEFINITION_PREFIXES)
+
+
+######
+# MAIN
+######
+
+
+def compile_query(query: str, is_regex: bool = False) -> Query:
+    # Case-insensitive unless the query has an uppercase letter, like ripgrep's
+    # smart case. Raises re.error for an invalid regex.
+    ignore_case = not any(char.isupper() for char in query)
+    source = query.encode("utf-8")
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    pattern = re.compile(source if is_regex else re.escape(source), flags)
+    if is_regex:
+        return Query(pattern, None, ignore_case)
+
+    return Query(pattern, source.lower() if ignore_case else source, ignore_case)
+
+
+def grep(
+    query: Query,
+    filenames,
+    priorities: dict[str, int] = None,
+    max_results: int = 50,
+    timeout: float = None,
+    context_lines: int = 2,
+    max_workers: int = MAX_WORKERS,
+) -> GrepResult:
+    # Searches `filenames` (any iterable, consumed lazily) in a pool of daemon
+    # threads, until every file is searched, `max_results` lines match, or the
+    # timeout passes. Files are searched in order, so the ones that matter most
+    # should come first. Matches are ranked by the priority of their file, then
+    # definitions before uses.
+    priorities = priorities or {}
+    deadline = None if timeout is None else time.monotonic() + timeout
+    filenames = iter(filenames)
+    matches = []
+    state = {"num_files": 0, "is_exhausted": False, "is_stopped": False}
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def _next_batch() -> list[str]:
+        with lock:
+            if done.is_set() or state["is_exhausted"]:
+                return []
+
+            batch = []
+            for filename in filenames:
+                batch.append(filename)
+                if len(batch) >= BATCH_SIZE:
+                    break
+            else:
+                state["is_exhausted"] = True
+
+            return batch
+
+    def _work():
+        try:
+            while not done.is_set():
+                batch = _next_batch()
+                if not batch:
+                    return
+
+                for filename in batch:
+                    if done.is_set():
+                        return
+                    if deadline is not None and time.monotonic() > deadline:
+                        with lock:
+                            state["is_stopped"] = True
+                            done.set()
+                        return
+
+                    hits = search_file(filename, query, context_lines)
+                    with lock:
+                        state["num_files"] += 1
+                        for lineno, line, before, after in hits:
+                            priority = priorities.get(filename, 0)
+                            matches.append(
+                                GrepMatch(
+                                    filename, lineno, line, before, after, priority
+                                )
+                            )
+                        if len(matches) >= max_results:
+                            done.set()
+        except Exception:  # E.g. the walk failed; returns what was found so far
+            with lock:
+                state["is_stopped"] = True
+                done.set()
+
+    threads = [
+        threading.Thread(target=_work, name="redshift-grep", daemon=True)
+        for _ in range(max(1, max_workers))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        # A regex can't be interrupted, so a slow one is left to finish on its own
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        thread.join(remaining)
+
+    with lock:
+        is_complete = (
+            state["is_exhausted"]
+            and not state["is_stopped"]
+            and not any(thread.is_alive() for thread in threads)
+            and len(matches) < max_results
+        )
+        done.set()
+        ranked = sorted(
+            matches,
+            key=lambda match: (
+                -match.priority,
+                not is_definition(match.line),
+                match.filename,
+                match.lineno,
+            ),
+        )
+        return GrepResult(ranked[:max_results], state["num_files"], is_complete)
@@ -4,6 +4,9 @@ import sys
 import site
 import sysconfig
 from pathlib import Path
+from types import FrameType
+from bisect import bisect_right
+from functools import lru_cache
 
 
 #########
@@ -11,58 +14,71 @@ from pathlib import Path
 #########
 
 
-def is_system_file(filename: str) -> bool:
+def build_prefix_table(prefixes: list[str]) -> tuple[str, ...]:
+    # Drop prefixes covered by a shorter one. In the remaining sorted table, the
+    # only entry that can be a prefix of a filename is the last one <= filename.
+    table = []
+    for prefix in sorted(set(prefixes)):
+        if table and prefix.startswith(table[-1]):
+            continue
+
+        table.append(prefix)
+
+    return tuple(table)
+
+
+def has_prefix(table: tuple[str, ...], filename: str) -> bool:
+    index = bisect_right(table, filename)
+    return index > 0 and filename.startswith(table[index - 1])
+
+
+@lru_cache(maxsize=None)
+def get_system_prefixes() -> tuple[str, ...]:
     # Resolve symlinks
     real_sys_prefix = os.path.realpath(sys.prefix)
     real_python_path = os.path.realpath(sys.executable)
     real_stdlib_path = os.path.join(os.path.dirname(real_python_path), "..", "lib")
 
     # Should cover most cases
+    prefixes = []
     for sys_path in sysconfig.get_paths().values():
-        real_sys_path = os.path.realpath(sys_path)
-        if filename.startswith(sys_path) or filename.startswith(real_sys_path):
-            return True
+        prefixes += [sys_path, os.path.realpath(sys_path)]
 
-    # Fallback: Python internal files (e.g. <frozen> or <string>)
-    if Path(filename).name.startswith("<") or filename.startswith("<"):
-        return True
+    # Fallbacks: Python stdlib files and executable
+    prefixes += [sys.prefix, real_sys_prefix, real_stdlib_path]
+    prefixes += [sys.executable, real_python_path]
 
-    # Fallback: Python stdlib files
-    if (
-        filename.startswith(sys.prefix)
-        or filename.startswith(real_sys_prefix)
-        or filename.startswith(real_stdlib_path)
-    ):
-        return True
+    return build_prefix_table([prefix for prefix in prefixes if prefix])
 
-    # Fallback: Python executable
-    if filename.startswith(sys.executable) or filename.startswith(real_python_path):
-        return True
 
-    return False
+@lru_cache(maxsize=None)
+def get_nonlocal_prefixes() -> tuple[str, ...]:
+    return build_prefix_table([path for path in site.getsitepackages() if path])
 
 
-def is_nonlocal_file(filename: str) -> bool:
-    for packages_dir in site.getsitepackages():
-        if filename.startswith(packages_dir):
-            return True
+def is_system_file(filename: str) -> bool:
+    if has_prefix(get_system_prefixes(), filename):
+        return True
 
-    return False
+    # Fallback: Python internal files (e.g. <frozen> or <string>)
+    if Path(filename).name.startswith("<") or filename.startswith("<"):
+        return True
 
+    return False
 
-######
-# MAIN
-######
 
+def is_nonlocal_file(filename: str) -> bool:
+    return has_prefix(get_nonlocal_prefixes(), filename)
 
-def is_internal_frame(frame) -> bool:
-    filename = frame.f_code.co_filename
-    real_filename = os.path.realpath(filename)  # Resolve symlinks
 
+@lru_cache(maxsize=None)
+def is_internal_file(filename: str) -> bool:
     # Skip Cython files
     if filename.endswith(".pyx"):
         return False
 
+    real_filename = os.path.realpath(filename)  # Resolve symlinks
+
     # Skip Python system files
     if is_system_file(filename) or is_system_file(real_filename):
         return False
@@ -72,3 +88,29 @@ def is_internal_frame(frame) -> bool:
         return False
 
     return True
+
+
+######
+# MAIN
+######
+
+
+def is_internal_frame(frame) -> bool:
+    # Cached by filename rather than by code object: filenames are interned
+    # strings with a cached hash, whereas hashing a code object hashes its body
+    if isinstance(frame, FrameType):
+        return is_internal_file(frame.f_code.co_filename)
+
+    # Frames restored from a snapshot were classified on the machine they came from
+    return frame.f_is_internal
+
+
+def cache_info():
+    return is_internal_file.cache_info()
+
+
+def cache_clear():
+    # Call this if sys.prefix or the site-packages directories change
+    is_internal_file.cache_clear()
+    get_system_prefixes.cache_clear()
+    get_nonlocal_prefixes.cache_clear()
@@ -0,0 +1,189 @@
+# Standard library
+import os
+import re
+from collections import namedtuple
+
+
+MAX_FILES = 100_000
+IGNORED_DIRS = (
+    "__pycache__",
+    "node_modules",
+    "site-packages",
+    "venv",
+    "env",
+    "build",
+    "dist",
+)
+
+# Rules of one .gitignore, relative to `dirname`. Each rule is (regex, negate,
+# dir_only).
+IgnoreRules = namedtuple("IgnoreRules", ["dirname", "rules"])
+
+
+#########
+# HELPERS
+#########
+
+
+def translate_glob(pattern: str) -> str:
+    # Regex for a .gitignore glob, where * and ? don't match across directories
+    # and ** does
+    regex = ""
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            regex += "(?:.*/)?"
+            index += 3
+            continue
+        if pattern.startswith("**", index):
+            regex += ".*"
+            index += 2
+            continue
+
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", index + 2)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                chars = pattern[index + 1 : end].replace("\\", "\\\\")
+                if chars.startswith("!"):
+                    chars = "^" + chars[1:]
+                regex += f"[{chars}]"
+                index = end
+        elif char == "\\" and index + 1 < len(pattern):
+            index += 1
+            regex += re.escape(pattern[index])
+        else:
+            regex += re.escape(char)
+
+        index += 1
+
+    return regex
+
+
+def parse_gitignore(text: str) -> list[tuple[re.Pattern, bool, bool]]:
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+
+        # Patterns with a slash are relative to the .gitignore, others match the
+        # name at any depth
+        if "/" in line:
+            regex = translate_glob(line.lstrip("/"))
+        else:
+            regex = "(?:.*/)?" + translate_glob(line)
+
+        try:
+            rules.append((re.compile(regex, re.DOTALL), negate, dir_only))
+        except re.error:
+            continue
+
+    return rules
+
+
+def read_gitignore(dirname: str) -> IgnoreRules | None:
+    try:
+        with open(os.path.join(dirname, ".gitignore"), encoding="utf-8") as file:
+            rules = parse_gitignore(file.read())
+    except (OSError, ValueError):
+        return None
+
+    return IgnoreRules(dirname, rules) if rules else None
+
+
+def is_ignored(path: str, is_dir: bool, ignore_rules: list[IgnoreRules]) -> bool:
+    # Like git, the last rule that matches wins, and deeper .gitignores come last
+    ignored = False
+    for dirname, rules in ignore_rules:
+        relpath = path[len(dirname) + 1 :].replace(os.sep, "/")
+        for regex, negate, dir_only in rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(relpath):
+                ignored = not negate
+
+    return ignored
+
+
+def get_ignore_rules(root: str) -> list[IgnoreRules]:
+    # The .gitignores that apply to `root`: its own, and those of the directories
+    # above it up to the root of its repository
+    ignore_rules = []
+    dirname = root
+    while True:
+        rules = read_gitignore(dirname)
+        if rules:
+            ignore_rules.insert(0, rules)
+        if os.path.exists(os.path.join(dirname, ".git")):
+            return ignore_rules
+
+        parent = os.path.dirname(dirname)
+        if parent == dirname:  # Not in a repository, so only its own applies
+            return [rules for rules in ignore_rules if rules.dirname == root]
+
+        dirname = parent
+
+
+######
+# MAIN
+######
+
+
+def iter_files(root: str, max_files: int = MAX_FILES):
+    # Every file under `root` that isn't hidden or ignored by a .gitignore
+    ignore_rules = get_ignore_rules(root)
+    num_files = 0
+    stack = [(root, ignore_rules)]
+    while stack:
+        dirname, ignore_rules = stack.pop()
+        try:
+            entries = sorted(os.scandir(dirname), key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        rules = read_gitignore(dirname) if dirname != root else None
+        if rules:
+            ignore_rules = ignore_rules + [rules]
+
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if not is_dir and not entry.is_file(follow_symlinks=False):
+                    continue  # E.g. a symlink or a socket
+            except OSError:
+                continue
+
+            if is_dir and entry.name in IGNORED_DIRS:
+                continue
+            if ignore_rules and is_ignored(entry.path, is_dir, ignore_rules):
+                continue
+
+            if is_dir:
+                subdirs.append((entry.path, ignore_rules))
+                continue
+
+            yield entry.path
+            num_files += 1
+            if num_files >= max_files:
+                return
+
+        stack.extend(reversed(subdirs))
@@ -0,0 +1,158 @@
+# Standard library
+import threading
+from functools import lru_cache
+
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+#########
+# HELPERS
+#########
+
+
+def get_usage_field(usage: any, name: str) -> any:
+    # Usage is reported as an object or, for some providers, a dict
+    if isinstance(usage, dict):
+        return usage.get(name) or 0
+
+    return getattr(usage, name, None) or 0
+
+
+######
+# MAIN
+######
+
+
+@lru_cache(maxsize=None)
+def supports_cache_control(model: str) -> bool:
+    # Other providers (e.g. OpenAI) cache prompt prefixes automatically and don't
+    # accept explicit breakpoints
+    from litellm.utils import supports_prompt_caching  # Deferred; slow to import
+
+    if "claude" not in model.lower():
+        return False
+
+    try:
+        return supports_prompt_caching(model)
+    except Exception:  # Unknown model
+        return False
+
+
+def text_block(text: str, cache: bool = False) -> dict:
+    block = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = CACHE_CONTROL
+
+    return block
+
+
+def add_cache_breakpoint(message: dict) -> dict:
+    # Marks the end of the message as the end of a cacheable prefix. litellm
+    # applies message-level cache_control to string content and tool calls.
+    content = message.get("content")
+    if isinstance(content, list) and content:
+        last_block = {**content[-1], "cache_control": CACHE_CONTROL}
+        message["content"] = content[:-1] + [last_block]
+    else:
+        message["cache_control"] = CACHE_CONTROL
+
+    return message
+
+
+class TokenUsage(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.num_calls = 0
+        self.input_tokens = 0  # Includes cache reads
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_creation_tokens = 0
+        self.models = {}  # Model -> token counts, used to price the calls
+        self.last_call = {}  # Token counts of the last call
+
+    def add(self, usage: any, model: str = None):
+        if not usage:
+            return
+
+        prompt_tokens = get_usage_field(usage, "prompt_tokens")
+        details = get_usage_field(usage, "prompt_tokens_details")
+        cache_read_tokens = get_usage_field(usage, "cache_read_input_tokens")
+        if not cache_read_tokens and details:
+            cache_read_tokens = get_usage_field(details, "cached_tokens")
+
+        counts = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": get_usage_field(usage, "completion_tokens"),
+            "cache_read_tokens": cache_read_tokens,
+            "cache_creation_tokens": get_usage_field(
+                usage, "cache_creation_input_tokens"
+            ),
+        }
+        with self._lock:
+            self.num_calls += 1
+            self.input_tokens += counts["input_tokens"]
+            self.output_tokens += counts["output_tokens"]
+            self.cache_read_tokens += counts["cache_read_tokens"]
+            self.cache_creation_tokens += counts["cache_creation_tokens"]
+
+            model_counts = self.models.setdefault(model, dict.fromkeys(counts, 0))
+            for name, count in counts.items():
+                model_counts[name] += count
+            self.last_call = counts
+
+    def track_stream(self, chunks, model: str = None):
+        # Streamed responses only report usage on their last chunk
+        for chunk in chunks:
+            self.add(getattr(chunk, "usage", None), model)
+            yield chunk
+
+    @property
+    def cost(self) -> float | None:
+        # In USD, or None if a model's price is unknown
+        from litellm import cost_per_token  # Deferred; slow to import
+
+        total_cost = 0.0
+        for model, counts in self.models.items():
+            try:
+                prompt_cost, completion_cost = cost_per_token(
+                    model=model,
+                    prompt_tokens=counts["input_tokens"],
+                    completion_tokens=counts["output_tokens"],
+                    cache_read_input_tokens=counts["cache_read_tokens"],
+                    cache_creation_input_tokens=counts["cache_creation_tokens"],
+                )
+            except Exception:  # Unknown model, or no model was given
+                return None
+
+            total_cost += prompt_cost + completion_cost
+
+        return total_cost
+
+    def to_dict(self) -> dict:
+        return {
+            "num_calls": self.num_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens,
+            "cost": self.cost,
+        }
+
+    @property
+    def cache_hit_rate(self) -> float:
+        if not self.input_tokens:
+            return 0.0
+
+        return self.cache_read_tokens / self.input_tokens
+
+    def __str__(self) -> str:
+        return (
+            f"{self.cache_read_tokens:,} of {self.input_tokens:,} input tokens read "
+            f"from cache ({self.cache_hit_rate:.0%}), "
+            f"{self.cache_creation_tokens:,} written, "
+            f"{self.num_calls} call{'s' if self.num_calls != 1 else ''}"
+        )
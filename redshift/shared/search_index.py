@@ -0,0 +1,379 @@
+# Standard library
+import os
+import re
+import json
+import math
+import heapq
+import threading
+from functools import lru_cache
+from collections import Counter, namedtuple
+
+# Local
+try:
+    from redshift.shared.project_files import iter_files
+    from redshift.shared.bounded_eval import wait_for_evaluations
+    from redshift.shared.symbol_index import (
+        get_cache_dir,
+        get_cache_path,
+        load_symbols,
+    )
+except ImportError:
+    from shared.project_files import iter_files
+    from shared.bounded_eval import wait_for_evaluations
+    from shared.symbol_index import get_cache_dir, get_cache_path, load_symbols
+
+
+INDEX_VERSION = 1
+MAX_INDEX_FILES = 20_000
+NAME_WEIGHT = 2  # Extra times a definition's name is counted, on top of its code
+K1 = 1.2  # BM25's term frequency saturation
+B = 0.75  # BM25's document length normalization
+MAX_DEAD_SHARE = 0.25  # Of document ids, before they're renumbered
+STOP_WORDS = frozenset(
+    [
+        *("a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does"),
+        *("for", "from", "get", "how", "if", "in", "is", "it", "not", "of", "on"),
+        *("or", "that", "the", "this", "to", "was", "what", "when", "where"),
+        *("which", "who", "why", "with", "self", "cls", "def", "class", "return"),
+        *("import", "none", "true", "false"),
+    ]
+)
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+SUBWORD_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+SUFFIXES = (("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", ""), ("e", ""))
+
+# `kind` is "function", "class", or "module" (the code outside of any definition)
+Document = namedtuple(
+    "Document", ["filename", "name", "kind", "lineno", "end_lineno"]
+)
+SearchHit = namedtuple("SearchHit", ["document", "score", "terms"])
+# `docs` is [name, kind, lineno, end_lineno, term frequencies] for each document
+FileEntry = namedtuple("FileEntry", ["mtime_ns", "size", "docs", "doc_ids"])
+
+
+#########
+# HELPERS
+#########
+
+
+def stem(word: str) -> str:
+    # Crude, but maps e.g. "retries", "retrying" and "retried" to the same term
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == "s" and word.endswith("ss"):
+                continue
+
+            return word[: -len(suffix)] + replacement
+
+    return word
+
+
+@lru_cache(maxsize=65536)
+def split_identifier(identifier: str) -> tuple[str, ...]:
+    # E.g. "getRetryBackoff" and "get_retry_backoff" are both ("retry", "backoff").
+    # Names with more than one word are kept whole too, so exact names rank
+    # higher. Cached, since most identifiers in a project repeat.
+    words = [
+        word.lower()
+        for word in SUBWORD_PATTERN.findall(identifier)
+        if not word.isdigit()
+    ]
+    terms = [stem(word) for word in words if len(word) > 1 and word not in STOP_WORDS]
+    if len(words) > 1:
+        terms.append(identifier.lower())
+
+    return tuple(terms)
+
+
+def tokenize(text: str) -> list[str]:
+    terms = []
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        terms.extend(split_identifier(identifier))
+
+    return terms
+
+
+def get_documents(
+    source: bytes, symbols: list[tuple[str, str, int, int]]
+) -> list[tuple[str, str, int, int, str]]:
+    # (name, kind, lineno, end_lineno, text) of each function and class, and of
+    # the module's other code. A class's text stops at its first method, since
+    # each method is a document of its own.
+    lines = source.decode("utf-8", "replace").splitlines()
+    symbols = [symbol for symbol in symbols if symbol[1] != "variable"]
+    documents = []
+    is_module_line = [True] * len(lines)
+    for qualname, kind, lineno, end_lineno in symbols:
+        text_end_lineno = end_lineno
+        if kind == "class":
+            prefix = f"{qualname}."
+            for other_qualname, _, other_lineno, _ in symbols:
+                if other_qualname.startswith(prefix) and other_lineno > lineno:
+                    text_end_lineno = min(text_end_lineno, other_lineno - 1)
+
+        if "." not in qualname:  # Top-level
+            num_lines = end_lineno - lineno + 1
+            is_module_line[lineno - 1 : end_lineno] = [False] * num_lines
+
+        text = "\n".join(lines[lineno - 1 : text_end_lineno])
+        documents.append((qualname, kind, lineno, end_lineno, text))
+
+    # Also the whole file, if it couldn't be parsed
+    module_text = "\n".join(
+        line for line, is_module in zip(lines, is_module_line) if is_module
+    )
+    documents.append(("", "module", 1, len(lines), module_text))
+
+    return documents
+
+
+def index_source(source: bytes, symbols: list[tuple[str, str, int, int]]) -> list:
+    docs = []
+    for name, kind, lineno, end_lineno, text in get_documents(source, symbols):
+        terms = Counter(tokenize(text))
+        for term in tokenize(name.replace(".<locals>", "")) * NAME_WEIGHT:
+            terms[term] += 1
+
+        if terms:
+            docs.append([name, kind, lineno, end_lineno, dict(terms)])
+
+    return docs
+
+
+def iter_source_files(root: str, max_files: int = MAX_INDEX_FILES):
+    num_files = 0
+    for filename in iter_files(root):
+        if not filename.endswith(".py"):
+            continue
+
+        yield filename
+        num_files += 1
+        if num_files >= max_files:
+            return
+
+
+######
+# MAIN
+######
+
+
+class SearchIndex(object):
+    # BM25 index of the functions and classes in a project's Python files, for
+    # finding code by what it does rather than by its exact name. The term
+    # frequencies of each file's documents are cached on disk, in one file per
+    # project, so later sessions only tokenize the files that changed. Postings
+    # are built on demand, per query term, since building all of them takes
+    # longer than loading the cache.
+    def __init__(self, root: str, cache_dir: str = None):
+        self.root = root
+        self.cache_dir = get_cache_dir("search") if cache_dir is None else cache_dir
+        self.cache_path = get_cache_path(self.cache_dir, root)
+        self._files = {}  # filename -> FileEntry
+        self._documents = []  # Document, or None once its file changes
+        self._terms = []  # Term frequencies of each document
+        self._lengths = []  # Number of terms in each document
+        self._postings = {}  # term -> [(doc_id, frequency)], for the terms queried
+        self._num_documents = 0
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _replace(self, filename: str, file_entry: FileEntry | None):
+        with self._lock:
+            self._postings.clear()
+            old_entry = self._files.pop(filename, None)
+            if old_entry is not None:
+                for doc_id in old_entry.doc_ids:
+                    self._documents[doc_id] = self._terms[doc_id] = None
+                    self._num_documents -= 1
+                    self._total_length -= self._lengths[doc_id]
+
+            num_dead = len(self._documents) - self._num_documents
+            if num_dead > MAX_DEAD_SHARE * len(self._documents):
+                self._compact()
+
+            if file_entry is None:
+                return
+
+            for name, kind, lineno, end_lineno, terms in file_entry.docs:
+                length = sum(terms.values())
+                file_entry.doc_ids.append(len(self._documents))
+                self._documents.append(
+                    Document(filename, name, kind, lineno, end_lineno)
+                )
+                self._terms.append(terms)
+                self._lengths.append(length)
+                self._num_documents += 1
+                self._total_length += length
+
+            self._files[filename] = file_entry
+
+    def _compact(self):
+        # Must hold the lock. Renumbers the documents without the ones whose files
+        # changed, which postings would otherwise have to skip over forever.
+        documents, terms, lengths = [], [], []
+        for file_entry in self._files.values():
+            doc_ids = []
+            for doc_id in file_entry.doc_ids:
+                doc_ids.append(len(documents))
+                documents.append(self._documents[doc_id])
+                terms.append(self._terms[doc_id])
+                lengths.append(self._lengths[doc_id])
+
+            file_entry.doc_ids[:] = doc_ids
+
+        self._documents, self._terms, self._lengths = documents, terms, lengths
+        self._postings.clear()
+
+    def _get_postings(self, term: str) -> list[tuple[int, int]]:
+        # Must hold the lock
+        postings = self._postings.get(term)
+        if postings is None:
+            postings = self._postings[term] = [
+                (doc_id, terms[term])
+                for doc_id, terms in enumerate(self._terms)
+                if terms and term in terms
+            ]
+
+        return postings
+
+    def _read_cache(self) -> dict:
+        try:
+            with open(self.cache_path, encoding="utf-8") as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+        if cache.get("version") != INDEX_VERSION or cache.get("root") != self.root:
+            return {}
+
+        return cache["files"]
+
+    def _write_cache(self):
+        with self._lock:
+            files = {
+                filename: [entry.mtime_ns, entry.size, entry.docs]
+                for filename, entry in self._files.items()
+            }
+
+        cache = {"version": INDEX_VERSION, "root": self.root, "files": files}
+        tmp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                # json.dump encodes in Python, dumps in C
+                file.write(json.dumps(cache, separators=(",", ":")))
+            os.replace(tmp_path, self.cache_path)  # Atomic, so never partly read
+        except OSError:
+            pass  # E.g. a read-only home directory; the index still works in memory
+
+    def _index_file(self, filename: str, mtime_ns: int, size: int) -> list:
+        # Symbols come from the symbol index's cache, so files are parsed once
+        symbols = load_symbols(get_cache_dir(), filename, mtime_ns, size)
+        try:
+            with open(filename, "rb") as file:
+                return index_source(file.read(), symbols)
+        except OSError:
+            return []
+
+    def _update(self):
+        wait_for_evaluations()
+        cache = {} if self._files else self._read_cache()
+        is_changed = False
+        filenames = set()
+        for filename in iter_source_files(self.root):
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+
+            filenames.add(filename)
+            key = [stat.st_mtime_ns, stat.st_size]
+            file_entry = self._files.get(filename)
+            if file_entry is not None and list(file_entry[:2]) == key:
+                continue
+
+            cache_entry = cache.get(filename)
+            if cache_entry is not None and cache_entry[:2] == key:
+                docs = cache_entry[2]
+            else:
+                wait_for_evaluations()
+                docs = self._index_file(filename, *key)
+                is_changed = True
+
+            self._replace(filename, FileEntry(*key, docs, []))
+
+        for filename in set(self._files) - filenames:  # Deleted
+            self._replace(filename, None)
+            is_changed = True
+
+        if is_changed or cache.keys() - filenames:
+            wait_for_evaluations()
+            self._write_cache()
+
+    def update(self):
+        # Brings the index up to date in the background, unless it already is
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._update, name="redshift-search", daemon=True
+            )
+            self._thread.start()
+
+    def wait(self, timeout: float = None) -> bool:
+        # True if the index is up to date
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+        return thread is None or not thread.is_alive()
+
+    def search(self, query: str, max_results: int = 10) -> list[SearchHit]:
+        # Ranks the documents by BM25. While the index is being updated, only
+        # searches the files that are done.
+        terms = set(tokenize(query))
+        scores = {}
+        with self._lock:
+            if not self._num_documents:
+                return []
+
+            avg_length = self._total_length / self._num_documents
+            for term in terms:
+                postings = self._get_postings(term)
+                if not postings:
+                    continue
+
+                num_matches = len(postings)
+                idf = math.log(
+                    1 + (self._num_documents - num_matches + 0.5) / (num_matches + 0.5)
+                )
+                for doc_id, frequency in postings:
+                    norm = K1 * (1 - B + B * self._lengths[doc_id] / avg_length)
+                    score = idf * frequency * (K1 + 1) / (frequency + norm)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + score
+
+            top = heapq.nlargest(max_results, scores.items(), key=lambda item: item[1])
+            return [
+                SearchHit(
+                    self._documents[doc_id],
+                    score,
+                    sorted(terms & self._terms[doc_id].keys()),
+                )
+                for doc_id, score in top
+            ]
+
+
+# Shared across debugger instances, since each breakpoint creates its own
+_search_indexes = {}  # Project root -> SearchIndex
+_search_indexes_lock = threading.Lock()
+
+
+def get_search_index(root: str) -> SearchIndex:
+    with _search_indexes_lock:
+        if root not in _search_indexes:
+            _search_indexes[root] = SearchIndex(root)
+
+        return _search_indexes[root]
@@ -1,14 +1,53 @@
 # Some methods adapted from: https://github.com/gaogaotiantian/objprint
 
 # Standard library
-import re
+import sys
 import json
 import inspect
+import functools
+import reprlib
+import builtins
 import itertools
+import warnings
 import traceback
 import collections
-from types import FunctionType, ModuleType
-from typing import Any, Dict, Generator, List, Set, Tuple, Union
+from types import (
+    FunctionType,
+    ModuleType,
+    BuiltinFunctionType,
+    MethodDescriptorType,
+    WrapperDescriptorType,
+    ClassMethodDescriptorType,
+    MemberDescriptorType,
+    GetSetDescriptorType,
+)
+from typing import Any, Dict, Generator, List, Optional, Set, Tuple, Union
+
+# Local
+try:
+    from redshift.shared.telemetry import traced
+except ImportError:
+    from .telemetry import traced
+
+CHARS_PER_TOKEN = 4  # Rough estimate, used to convert token budgets to characters
+MAX_REPR_DEPTH = 6
+CHEAP_REPR_FACTOR = 4  # Objects reachable per budgeted char before repr() is avoided
+MISSING = object()
+MAX_SUMMARY_SAMPLE = 1_000_000  # Elements used to compute stats for large arrays
+MAX_SUMMARY_ITEMS = 100
+MAX_SUMMARY_COLUMNS = 20
+NUM_SUMMARY_EDGE_ITEMS = 3
+CHEAP_DESCRIPTOR_TYPES = (
+    FunctionType,
+    BuiltinFunctionType,
+    MethodDescriptorType,
+    WrapperDescriptorType,
+    ClassMethodDescriptorType,
+    MemberDescriptorType,
+    GetSetDescriptorType,
+    classmethod,
+    staticmethod,
+)
 
 
 #########
@@ -16,31 +55,36 @@ from typing import Any, Dict, Generator, List, Set, Tuple, Union
 #########
 
 
-def filter_builtins(locals_dict: Dict[str, Any]) -> Dict[str, Any]:
+@functools.lru_cache(maxsize=None)
+def get_default_builtins() -> Dict[str, Any]:
     default_locals = {}
     exec("", default_locals)  # Create an empty scope
-    default_builtins = default_locals["__builtins__"]
+    return default_locals["__builtins__"]
+
+
+def filter_builtins(
+    locals_dict: Dict[str, Any],
+) -> Generator[Tuple[str, Any], None, None]:
+    # The items of `locals_dict`, where __builtins__ only holds the builtins that
+    # were added or replaced, or is skipped if there are none. Doesn't copy the
+    # dict, which for a module's globals can be big.
+    for name, value in locals_dict.items():
+        if name != "__builtins__":
+            yield name, value
+            continue
 
-    if "__builtins__" in locals_dict:
-        curr_builtins = locals_dict["__builtins__"]
-        curr_builtins = (
-            curr_builtins if isinstance(curr_builtins, dict) else vars(curr_builtins)
-        )
+        default_builtins = get_default_builtins()
+        curr_builtins = value if isinstance(value, dict) else vars(value)
+        if curr_builtins is default_builtins:  # Usually the same dict
+            continue
 
-        locals_dict["__builtins__"] = {
+        custom_builtins = {
             k: v
             for k, v in curr_builtins.items()
-            if k not in default_builtins or default_builtins[k] is not v
+            if default_builtins.get(k, MISSING) is not v
         }
-        if not locals_dict["__builtins__"]:
-            del locals_dict["__builtins__"]
-
-    # TODO: Might need to do string comparison instead of object comparision (is not)
-    return {
-        k: v
-        for k, v in locals_dict.items()
-        if k not in default_locals or default_locals[k] is not v
-    }
+        if custom_builtins:
+            yield name, custom_builtins
 
 
 def get_call_args(f_code, f_locals) -> dict[str, object]:
@@ -127,7 +171,46 @@ def get_packed_str(
     return f"{header}{elements}{footer}"
 
 
-def get_custom_object_str(obj: Any, visited: Set[int], level: int) -> str:
+@functools.lru_cache(maxsize=1024)
+def get_computed_attrs(cls: type) -> dict[str, bool]:
+    # Properties and other custom descriptors run arbitrary (possibly expensive)
+    # code when accessed. Functions, slots, and C-level attributes don't. Maps
+    # each such attribute to whether it's a data descriptor (i.e. whether it
+    # takes precedence over the instance __dict__).
+    computed_attrs, seen = {}, set()
+    for klass in cls.__mro__:
+        for attr, static_val in vars(klass).items():
+            if attr in seen:
+                continue
+
+            seen.add(attr)
+            if isinstance(static_val, CHEAP_DESCRIPTOR_TYPES):
+                continue
+
+            val_type = type(static_val)
+            if hasattr(val_type, "__get__"):
+                computed_attrs[attr] = hasattr(val_type, "__set__") or hasattr(
+                    val_type, "__delete__"
+                )
+
+    return computed_attrs
+
+
+def is_computed_attr(obj: Any, attr: str) -> bool:
+    computed_attrs = get_computed_attrs(type(obj))
+    if attr not in computed_attrs:
+        return False
+
+    if computed_attrs[attr]:  # Data descriptor
+        return True
+
+    # E.g. a functools.cached_property that's already been computed
+    return attr not in getattr(obj, "__dict__", {})
+
+
+def get_custom_object_str(
+    obj: Any, visited: Set[int], level: int, include_properties: bool = False
+) -> str:
     # If it has __str__ or __repr__ overloaded, honor that
     if (
         obj.__class__.__str__ is not object.__str__
@@ -139,26 +222,30 @@ def get_custom_object_str(obj: Any, visited: Set[int], level: int) -> str:
         return "\n".join(lines)
 
     def _get_method_line(attr: str) -> str:
-        return f"def {attr}{inspect.signature(getattr(obj, attr))}"
+        return f"def {attr}{inspect.signature(methods[attr])}"
 
     def _get_line(key: str) -> str:
-        val = serialize_object(getattr(obj, key), visited, level + 1)
+        val = serialize_object(attrs[key], visited, level + 1, include_properties)
         return f".{key} = {val}"
 
-    attrs, methods = [], []
+    attrs, methods = {}, {}
     for attr in dir(obj):
-        if not re.fullmatch(r"(?!_).*", attr):
+        if attr.startswith("_"):
             continue
 
         try:
+            if not include_properties:
+                if is_computed_attr(obj, attr):
+                    continue
+
             attr_val = getattr(obj, attr)
-        except AttributeError:
+        except Exception:
             continue
 
         if inspect.ismethod(attr_val) or inspect.isbuiltin(attr_val):
-            methods.append(attr)
+            methods[attr] = attr_val
         else:
-            attrs.append(attr)
+            attrs[attr] = attr_val
 
     elements = itertools.chain(
         (_get_method_line(attr) for attr in sorted(methods)),
@@ -168,7 +255,9 @@ def get_custom_object_str(obj: Any, visited: Set[int], level: int) -> str:
     return get_packed_str(obj, elements, level)
 
 
-def serialize_object(obj: object, visited: set[int], level: int) -> str:
+def serialize_object(
+    obj: object, visited: set[int], level: int, include_properties: bool = False
+) -> str:
     # Handle built-in types
     if isinstance(obj, str):
         return f"'{obj}'"
@@ -181,32 +270,51 @@ def serialize_object(obj: object, visited: set[int], level: int) -> str:
 
     # TODO: Handle other built-in types
 
-    # Prevent recursion
+    # Prevent recursion. `visited` holds the objects on the path from the root to
+    # this one, and is shared across the whole traversal (pushed and popped).
     if id(obj) in visited:
         return get_ellipsis_str(obj)
 
-    visited = visited.copy()
     visited.add(id(obj))
+    try:
+        # Handle container types
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            elements = (
+                f"{serialize_object(el, visited, level + 1, include_properties)}"
+                for el in obj
+            )
+            return get_packed_str(obj, elements, level)
+        elif isinstance(obj, (dict, collections.abc.Mapping)):
+            items = [(key, val) for key, val in obj.items()]
+            try:
+                items = sorted(items)
+            except TypeError:
+                pass
+
+            elements = (
+                f"{serialize_object(key, visited, level + 1, include_properties)}: {serialize_object(val, visited, level + 1, include_properties)}"
+                for key, val in items
+            )
+            return get_packed_str(obj, elements, level)
+
+        # Handle all other objects
+        summary = summarize_val(obj)
+        if summary is not None:
+            return summary
+
+        return get_custom_object_str(obj, visited, level, include_properties)
+    finally:
+        visited.discard(id(obj))
+
+
+def get_instance_dict(obj: object) -> dict:
+    # Without calling a custom __getattr__ or __dict__ property
+    try:
+        instance_dict = object.__getattribute__(obj, "__dict__")
+    except (AttributeError, TypeError):
+        return {}
 
-    # Handle container types
-    if isinstance(obj, (list, tuple, set, frozenset)):
-        elements = (f"{serialize_object(el, visited, level + 1)}" for el in obj)
-        return get_packed_str(obj, elements, level)
-    elif isinstance(obj, (dict, collections.abc.Mapping)):
-        items = [(key, val) for key, val in obj.items()]
-        try:
-            items = sorted(items)
-        except TypeError:
-            pass
-
-        elements = (
-            f"{serialize_object(key, visited, level + 1)}: {serialize_object(val, visited, level + 1)}"
-            for key, val in items
-        )
-        return get_packed_str(obj, elements, level)
-
-    # Handle all other objects
-    return get_custom_object_str(obj, visited, level)
+    return instance_dict if isinstance(instance_dict, dict) else {}
 
 
 def default_serialize_object(obj: object) -> str:
@@ -217,27 +325,482 @@ def default_serialize_object(obj: object) -> str:
         return f"*** repr() failed: {formatted_exc} ***"
 
 
+def format_bytes(num_bytes: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024:
+            break
+
+        num_bytes /= 1024
+    else:
+        unit = "TB"
+
+    return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+
+
+def format_number(value: Any) -> str:
+    try:
+        value = float(value)
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+
+        return f"{value:.6g}"
+    except (TypeError, ValueError, OverflowError):
+        return str(value)
+
+
+def format_stats(
+    num_nan: int, min_: Any, max_: Any, mean: Any, sample_size: Optional[int] = None
+) -> str:
+    stats = []
+    if num_nan is not None:
+        stats.append(f"nan={num_nan}")
+    stats += [
+        f"min={format_number(min_)}",
+        f"max={format_number(max_)}",
+        f"mean={format_number(mean)}",
+    ]
+
+    stats_str = " ".join(stats)
+    if sample_size is not None:
+        stats_str += f" (estimated from {sample_size} sampled elements)"
+
+    return stats_str
+
+
+def get_sample_step(size: int, max_size: int = MAX_SUMMARY_SAMPLE) -> int:
+    return max(1, -(-size // max_size))  # Ceiling division
+
+
+def summarize_ndarray(arr: Any) -> str:
+    np = sys.modules["numpy"]
+
+    lines = [
+        f"<ndarray shape={arr.shape} dtype={arr.dtype} memory={format_bytes(arr.nbytes)}>"
+    ]
+
+    is_float = np.issubdtype(arr.dtype, np.floating)
+    is_numeric = is_float or np.issubdtype(arr.dtype, np.integer)
+    if arr.size and (is_numeric or arr.dtype == np.bool_):
+        step = get_sample_step(arr.size)
+        sample = arr.flat[::step] if step > 1 else arr  # Copies only the sample
+
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            if is_float:
+                stats = (
+                    int(np.isnan(sample).sum()),
+                    np.nanmin(sample),
+                    np.nanmax(sample),
+                    np.nanmean(sample),
+                )
+            else:
+                stats = (None, sample.min(), sample.max(), sample.mean())
+
+        sample_size = sample.size if step > 1 else None
+        lines.append(format_stats(*stats, sample_size=sample_size))
+
+    lines.append(
+        np.array2string(
+            arr, threshold=MAX_SUMMARY_ITEMS, edgeitems=NUM_SUMMARY_EDGE_ITEMS
+        )
+    )
+    return "\n".join(lines)
+
+
+def get_series_stats(series: Any) -> str:
+    pd = sys.modules["pandas"]
+
+    step = get_sample_step(len(series))
+    sample = series.iloc[::step]
+    sample_size = len(sample) if step > 1 else None
+
+    num_nan = int(sample.isna().sum())
+    dtype = series.dtype
+    if not len(sample) or not pd.api.types.is_numeric_dtype(dtype):
+        return f"nan={num_nan}"
+    if pd.api.types.is_bool_dtype(dtype):
+        return f"nan={num_nan}"
+
+    return format_stats(num_nan, sample.min(), sample.max(), sample.mean(), sample_size)
+
+
+def summarize_series(series: Any) -> str:
+    memory = format_bytes(series.memory_usage(index=True, deep=False))
+    lines = [
+        f"<Series name={series.name!r} shape={series.shape} dtype={series.dtype} memory={memory}>",
+        get_series_stats(series),
+    ]
+
+    edge = NUM_SUMMARY_EDGE_ITEMS
+    if len(series) > 2 * edge:
+        lines += [
+            series.iloc[:edge].to_string(),
+            "...",
+            series.iloc[-edge:].to_string(),
+        ]
+    else:
+        lines.append(series.to_string())
+
+    return "\n".join(lines)
+
+
+def summarize_dataframe(df: Any) -> str:
+    num_rows, num_cols = df.shape
+    memory = format_bytes(df.memory_usage(index=True, deep=False).sum())
+    lines = [f"<DataFrame shape={df.shape} memory={memory}>", "columns:"]
+
+    for index in range(min(num_cols, MAX_SUMMARY_COLUMNS)):
+        column = df.iloc[:, index]
+        lines.append(f"  {column.name} ({column.dtype}): {get_series_stats(column)}")
+    if num_cols > MAX_SUMMARY_COLUMNS:
+        lines.append(f"  ... {num_cols - MAX_SUMMARY_COLUMNS} more columns")
+
+    edge = NUM_SUMMARY_EDGE_ITEMS
+    to_string_kwargs = {"max_cols": MAX_SUMMARY_COLUMNS, "max_colwidth": 50}
+    if num_rows > 2 * edge:
+        lines += [
+            df.iloc[:edge].to_string(**to_string_kwargs),
+            "...",
+            df.iloc[-edge:].to_string(**to_string_kwargs),
+        ]
+    else:
+        lines.append(df.to_string(**to_string_kwargs))
+
+    return "\n".join(lines)
+
+
+def summarize_tensor(tensor: Any) -> str:
+    tensor = tensor.detach()
+    memory = tensor.element_size() * tensor.nelement()
+    lines = [
+        f"<Tensor shape={tuple(tensor.shape)} dtype={tensor.dtype} device={tensor.device} memory={format_bytes(memory)}>"
+    ]
+
+    if tensor.layout != sys.modules["torch"].strided or tensor.device.type == "meta":
+        return lines[0]  # Sparse or without data
+
+    flat = tensor.reshape(-1)
+    is_float = tensor.is_floating_point()
+    if flat.numel() and not tensor.is_complex():
+        step = get_sample_step(flat.numel())
+        sample = flat[::step]
+
+        if is_float:
+            is_nan = sample.isnan()
+            num_nan = int(is_nan.sum().item())
+            sample = sample[~is_nan]
+        else:
+            num_nan = None
+
+        if sample.numel():
+            stats = (
+                num_nan,
+                sample.min().item(),
+                sample.max().item(),
+                sample.double().mean().item(),
+            )
+            sample_size = flat[::step].numel() if step > 1 else None
+            lines.append(format_stats(*stats, sample_size=sample_size))
+
+    edge = NUM_SUMMARY_EDGE_ITEMS
+    if flat.numel() > 2 * edge:
+        head = ", ".join(format_number(v) for v in flat[:edge].tolist())
+        tail = ", ".join(format_number(v) for v in flat[-edge:].tolist())
+        lines.append(f"[{head}, ..., {tail}] (flattened)")
+    else:
+        lines.append(str(flat.tolist()))
+
+    return "\n".join(lines)
+
+
+def register_summarizer(module_name: str, type_name: str, summarizer):
+    # The summarizer is only used if `module_name` has already been imported by the
+    # program, so registering it never imports the library
+    SUMMARIZERS.append((module_name, type_name, summarizer))
+
+
+def get_summarizer(value: object):
+    for module_name, type_name, summarizer in SUMMARIZERS:
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+
+        cls = getattr(module, type_name, None)
+        if isinstance(cls, type) and isinstance(value, cls):
+            return summarizer
+
+    return None
+
+
+def summarize_val(value: object) -> Optional[str]:
+    summarizer = get_summarizer(value)
+    if summarizer is None:
+        return None
+
+    try:
+        return summarizer(value)
+    except Exception:
+        return None  # Fall back to repr()
+
+
+class BudgetedRepr(reprlib.Repr):
+    # Stops producing output once the character budget is spent, so serialization
+    # cost is proportional to the budget rather than to the size of the object
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+        self.maxlevel = MAX_REPR_DEPTH
+
+        max_items = max(1, max_chars // 3)  # Shortest element is "x, "
+        self.maxtuple = self.maxlist = self.maxarray = max_items
+        self.maxdict = self.maxset = self.maxfrozenset = self.maxdeque = max_items
+
+        self._remaining = max_chars
+
+    def repr(self, x: object) -> str:
+        self._remaining = self.max_chars
+        return self.repr1(x, self.maxlevel)
+
+    def repr1(self, x: object, level: int) -> str:
+        if self._remaining <= 0:
+            return self.fillvalue
+
+        # Leaf values can use whatever's left of the budget
+        remaining = self._remaining
+        self.maxstring = self.maxlong = self.maxother = max(remaining, 8)
+
+        s = self._repr_subclass(x, level)
+        if s is None:
+            s = super().repr1(x, level)
+        if self._remaining == remaining:  # Containers charge for their elements
+            self._remaining -= len(s)
+
+        return s
+
+    def _repr_subclass(self, x: object, level: int) -> str | None:
+        # reprlib picks a handler by type name, so e.g. OrderedDict, Counter and
+        # subclasses of list would otherwise be repr()'d in full
+        typename = type(x).__name__
+        if hasattr(self, f"repr_{typename.replace(' ', '_')}"):
+            return None
+
+        # E.g. numpy.str_ and StrEnum, which are sliced like any other string
+        if isinstance(x, str):
+            return self.repr_str(x, level)
+        elif isinstance(x, (bytes, bytearray)):
+            return self.repr_bytes(x, level)
+        elif isinstance(x, tuple) and hasattr(x, "_fields"):  # namedtuple
+            return self._repr_fields(typename, zip(x._fields, x), len(x), level)
+        elif isinstance(x, collections.abc.Mapping):
+            s = self.repr_dict(x, level)
+        elif isinstance(x, collections.abc.Set):
+            s = self._repr_iterable(x, level, "{", "}", self.maxset)
+        elif isinstance(x, collections.abc.Sequence):
+            s = self._repr_iterable(x, level, "[", "]", self.maxlist)
+        else:
+            return None
+
+        return f"{typename}({s})"
+
+    def _repr_fields(self, typename: str, fields, num_fields: int, level: int) -> str:
+        # E.g. Point(x=1, y=2), for namedtuples and objects' attributes
+        if level <= 0 and num_fields:
+            return f"{typename}({self.fillvalue})"
+
+        pieces = []
+        for name, value in itertools.islice(fields, self.maxdict):
+            if self._remaining <= 0:
+                break
+
+            pieces.append(f"{name}={self.repr1(value, level - 1)}")
+            self._remaining -= len(name) + 3  # Separators
+
+        if len(pieces) < num_fields:
+            pieces.append(self.fillvalue)
+
+        return f"{typename}({', '.join(pieces)})"
+
+    def _is_cheap_to_repr(self, x: object) -> bool:
+        # Whether the objects reachable from `x` (through containers and instance
+        # attributes) are few enough that repr() costs about as much as the
+        # budget. Stops counting past that, so the check itself is bounded.
+        limit = max(self.max_chars, 1) * CHEAP_REPR_FACTOR
+        count = 0
+        seen = set()
+        stack = [x]
+        while stack and count <= limit:
+            obj = stack.pop()
+            if id(obj) in seen:
+                continue
+
+            seen.add(id(obj))
+            count += 1
+            try:
+                if isinstance(obj, (str, bytes, bytearray)):
+                    count += len(obj)
+                elif isinstance(obj, collections.abc.Mapping):
+                    count += len(obj)
+                    for key, val in itertools.islice(obj.items(), limit):
+                        stack += [key, val]
+                elif isinstance(obj, collections.abc.Collection):
+                    count += len(obj)
+                    stack.extend(itertools.islice(obj, limit))
+                else:
+                    attributes = get_instance_dict(obj).values()
+                    stack.extend(itertools.islice(attributes, limit))
+            except Exception:
+                return False  # E.g. a broken __len__; don't risk its repr either
+
+        return count <= limit
+
+    def _repr_iterable(self, x, level, left, right, maxiter, trail=""):
+        n = len(x)
+        if level <= 0 and n:
+            return f"{left}{self.fillvalue}{right}"
+
+        pieces = []
+        for element in itertools.islice(x, maxiter):
+            if self._remaining <= 0:
+                break
+
+            pieces.append(self.repr1(element, level - 1))
+            self._remaining -= 2  # Separator
+
+        if len(pieces) < n:
+            pieces.append(self.fillvalue)
+        if n == 1 and trail:
+            right = trail + right
+
+        return f"{left}{', '.join(pieces)}{right}"
+
+    def repr_set(self, x, level):
+        # Unlike reprlib, don't sort (it's O(n log n) in the size of the set)
+        if not x:
+            return "set()"
+
+        return self._repr_iterable(x, level, "{", "}", self.maxset)
+
+    def repr_frozenset(self, x, level):
+        if not x:
+            return "frozenset()"
+
+        return self._repr_iterable(x, level, "frozenset({", "})", self.maxfrozenset)
+
+    def repr_dict(self, x, level):
+        n = len(x)
+        if n == 0:
+            return "{}"
+        if level <= 0:
+            return f"{{{self.fillvalue}}}"
+
+        pieces = []
+        for key, val in itertools.islice(x.items(), self.maxdict):
+            if self._remaining <= 0:
+                break
+
+            key_repr = self.repr1(key, level - 1)
+            val_repr = self.repr1(val, level - 1)
+            pieces.append(f"{key_repr}: {val_repr}")
+            self._remaining -= 4  # Separators
+
+        if len(pieces) < n:
+            pieces.append(self.fillvalue)
+
+        return f"{{{', '.join(pieces)}}}"
+
+    def repr_int(self, x, level):
+        num_digits = int(x.bit_length() * 0.30103) + 1  # log10(2)
+        if num_digits > self.maxlong:
+            return f"<int with ~{num_digits} digits>"
+
+        return builtins.repr(x)
+
+    # Slice before calling repr(), same as for strings
+    repr_bytes = repr_bytearray = reprlib.Repr.repr_str
+
+    def repr_instance(self, x, level):
+        s = summarize_val(x)
+        if s is None and not self._is_cheap_to_repr(x):
+            # Its attributes instead, which are budgeted like a container's
+            attributes = get_instance_dict(x)
+            return self._repr_fields(
+                type(x).__name__, iter(attributes.items()), len(attributes), level
+            )
+        elif s is None:
+            s = default_serialize_object(x)
+
+        if len(s) > self.maxother:
+            i = max(0, (self.maxother - 3) // 2)
+            j = max(0, self.maxother - 3 - i)
+            s = s[:i] + self.fillvalue + s[len(s) - j :]
+
+        return s
+
+
+SUMMARIZERS = []  # (module name, type name, summarizer)
+register_summarizer("numpy", "ndarray", summarize_ndarray)
+register_summarizer("pandas", "DataFrame", summarize_dataframe)
+register_summarizer("pandas", "Series", summarize_series)
+register_summarizer("torch", "Tensor", summarize_tensor)
+
+
 ######
 # MAIN
 ######
 
 
-def serialize_val(value: object, use_default: bool = True) -> str:
+@traced("serialize")
+def serialize_val(
+    value: object,
+    use_default: bool = True,
+    max_chars: Optional[int] = None,
+    include_properties: bool = False,
+) -> str:
+    summary = summarize_val(value)
+    if summary is not None:
+        return summary
+
     if use_default:
+        if max_chars is not None:
+            return BudgetedRepr(max_chars).repr(value)
+
         return default_serialize_object(value)
 
-    return serialize_object(value, visited=set(), level=0)
+    return serialize_object(
+        value, visited=set(), level=0, include_properties=include_properties
+    )
 
 
-def serialize_vars(vars_dict: dict[str, object], use_default: bool = True) -> str:
-    vars_dict = filter_builtins(vars_dict)
-    serialized_dict = {
-        var_name: serialize_val(var_val, use_default)
-        for var_name, var_val in vars_dict.items()
+@traced("serialize")
+def serialize_vars_dict(
+    vars_dict: dict[str, object],
+    use_default: bool = True,
+    max_chars: Optional[int] = None,
+) -> dict[str, str]:
+    return {
+        var_name: serialize_val(var_val, use_default, max_chars)
+        for var_name, var_val in filter_builtins(vars_dict)
     }
-    return json.dumps(serialized_dict)
 
 
-def serialize_call_args(f_code, f_locals, use_default: bool = True) -> str:
+def serialize_call_args_dict(
+    f_code, f_locals, use_default: bool = True, max_chars: Optional[int] = None
+) -> dict[str, str]:
     call_args = get_call_args(f_code, f_locals)
-    return serialize_vars(call_args, use_default)
+    return serialize_vars_dict(call_args, use_default, max_chars)
+
+
+def serialize_vars(
+    vars_dict: dict[str, object],
+    use_default: bool = True,
+    max_chars: Optional[int] = None,
+) -> str:
+    return json.dumps(serialize_vars_dict(vars_dict, use_default, max_chars))
+
+
+def serialize_call_args(
+    f_code, f_locals, use_default: bool = True, max_chars: Optional[int] = None
+) -> str:
+    call_args = serialize_call_args_dict(f_code, f_locals, use_default, max_chars)
+    return json.dumps(call_args)
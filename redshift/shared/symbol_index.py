@@ -0,0 +1,396 @@
+# Standard library
+import os
+import ast
+import sys
+import json
+import queue
+import hashlib
+import warnings
+import threading
+from collections import namedtuple
+
+# Local
+try:
+    from redshift.shared.project_files import iter_files
+    from redshift.shared.bounded_eval import wait_for_evaluations
+except ImportError:
+    from shared.project_files import iter_files
+    from shared.bounded_eval import wait_for_evaluations
+
+
+INDEX_VERSION = 1
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+MAX_PROJECT_FILES = 5000
+ROOT_MARKERS = ("pyproject.toml", "setup.py", "setup.cfg", ".git")
+
+# `qualname` is the same as the object's __qualname__, e.g. "f.<locals>.g".
+# `name` is what it's looked up by, e.g. "pkg.module.f.g".
+Symbol = namedtuple(
+    "Symbol", ["name", "qualname", "kind", "filename", "lineno", "end_lineno"]
+)
+FileIndex = namedtuple("FileIndex", ["mtime_ns", "size", "symbols"])
+
+# Warning filters are global, so only one thread can change them at a time
+_warnings_lock = threading.Lock()
+
+
+#########
+# HELPERS
+#########
+
+
+def get_cache_dir(name: str = "symbols") -> str:
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "redshift", name)
+
+
+def get_cache_path(cache_dir: str, filename: str) -> str:
+    digest = hashlib.blake2b(filename.encode("utf-8", "surrogatepass"), digest_size=16)
+    return os.path.join(cache_dir, f"{digest.hexdigest()}.json")
+
+
+def get_module_name(filename: str) -> str:
+    # E.g. "pkg.module" for pkg/module.py, relative to the sys.path entry that
+    # contains it (which also works for namespace packages). Otherwise, walks up
+    # the directories that have an __init__.py.
+    filename = os.path.abspath(filename)
+    root = None
+    for entry in list(sys.path):
+        entry = os.path.abspath(entry or os.curdir)
+        if filename.startswith(entry + os.sep) and len(entry) > len(root or ""):
+            root = entry
+
+    if root is not None:
+        parts = os.path.splitext(os.path.relpath(filename, root))[0].split(os.sep)
+    else:
+        dirname, basename = os.path.split(filename)
+        parts = [os.path.splitext(basename)[0]]
+        while os.path.isfile(os.path.join(dirname, "__init__.py")):
+            dirname, package = os.path.split(dirname)
+            parts.insert(0, package)
+
+    if parts[-1] == "__init__":
+        parts.pop()
+
+    return ".".join(parts)
+
+
+def find_project_root(filename: str) -> str | None:
+    dirname = os.path.dirname(os.path.abspath(filename))
+    while True:
+        if any(os.path.exists(os.path.join(dirname, m)) for m in ROOT_MARKERS):
+            return dirname
+
+        parent = os.path.dirname(dirname)
+        if parent == dirname:
+            return None
+
+        dirname = parent
+
+
+def iter_project_files(root: str, max_files: int = MAX_PROJECT_FILES):
+    # The project's Python files, skipping the ones its .gitignores exclude
+    num_files = 0
+    for filename in iter_files(root):
+        if not filename.endswith(".py"):
+            continue
+
+        yield filename
+        num_files += 1
+        if num_files >= max_files:
+            return
+
+
+def get_start_lineno(node: ast.AST) -> int:
+    # Same as inspect.getsourcelines, which starts at the first decorator
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno, *(decorator.lineno for decorator in decorators)])
+
+
+def get_end_lineno(node: ast.AST, lines: list[bytes]) -> int:
+    # Also like inspect, includes the comments indented under the last statement
+    end_lineno = node.end_lineno
+    for lineno in range(node.end_lineno + 1, len(lines) + 1):
+        line = lines[lineno - 1]
+        stripped = line.lstrip()
+        if not stripped:
+            continue
+        indent = len(line) - len(stripped)
+        if not stripped.startswith(b"#") or indent <= node.col_offset:
+            break
+
+        end_lineno = lineno
+
+    return end_lineno
+
+
+def parse(source: bytes) -> ast.Module:
+    # Without printing warnings about the file, e.g. invalid escape sequences
+    with _warnings_lock, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return ast.parse(source)
+
+
+def parse_symbols(source: bytes) -> list[tuple[str, str, int, int]]:
+    # (qualname, kind, lineno, end_lineno) of every class and function, and of
+    # the variables assigned at module or class level
+    lines = source.splitlines()
+    symbols = []
+
+    def _add_definition(node: ast.AST, qualname: str, kind: str):
+        start_lineno = get_start_lineno(node)
+        symbols.append((qualname, kind, start_lineno, get_end_lineno(node, lines)))
+
+    def _visit(body: list[ast.stmt], prefix: str, in_function: bool):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualname = prefix + node.name
+                _add_definition(node, qualname, "function")
+                _visit(node.body, f"{qualname}.<locals>.", True)
+            elif isinstance(node, ast.ClassDef):
+                qualname = prefix + node.name
+                _add_definition(node, qualname, "class")
+                _visit(node.body, f"{qualname}.", in_function)
+            elif in_function:
+                continue
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = getattr(node, "targets", [getattr(node, "target", None)])
+                for target in targets:
+                    if not isinstance(target, ast.Name):
+                        continue
+
+                    qualname = prefix + target.id
+                    symbols.append(
+                        (qualname, "variable", node.lineno, node.end_lineno)
+                    )
+            elif isinstance(node, (ast.If, ast.Try)):
+                # E.g. definitions under `if TYPE_CHECKING:` or `try: import ...`
+                _visit(node.body, prefix, in_function)
+                _visit(node.orelse, prefix, in_function)
+                for handler in getattr(node, "handlers", []):
+                    _visit(handler.body, prefix, in_function)
+
+    _visit(parse(source).body, "", False)
+    return symbols
+
+
+def read_cache_entry(path: str, mtime_ns: int, size: int) -> list | None:
+    try:
+        with open(path, encoding="utf-8") as file:
+            entry = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if entry.get("version") != INDEX_VERSION:
+        return None
+    if entry.get("mtime_ns") != mtime_ns or entry.get("size") != size:
+        return None
+
+    return entry["symbols"]
+
+
+def write_cache_entry(path: str, filename: str, mtime_ns: int, size: int, symbols):
+    entry = {
+        "version": INDEX_VERSION,
+        "filename": filename,
+        "mtime_ns": mtime_ns,
+        "size": size,
+        "symbols": symbols,
+    }
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(entry, file, separators=(",", ":"))
+        os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+    except OSError:
+        pass  # E.g. a read-only home directory; the index still works in memory
+
+
+def load_symbols(cache_dir: str, filename: str, mtime_ns: int, size: int) -> list:
+    # parse_symbols, or its cached result if the file hasn't changed
+    cache_path = get_cache_path(cache_dir, filename)
+    symbols = read_cache_entry(cache_path, mtime_ns, size)
+    if symbols is not None:
+        return symbols
+
+    try:
+        with open(filename, "rb") as file:
+            symbols = parse_symbols(file.read())
+    except (OSError, SyntaxError, ValueError, RecursionError):
+        symbols = []  # Cached too, so it isn't parsed again until it changes
+
+    write_cache_entry(cache_path, filename, mtime_ns, size, symbols)
+    return symbols
+
+
+def get_lookup_name(module_name: str, qualname: str) -> str:
+    name = qualname.replace(".<locals>", "")
+    return f"{module_name}.{name}" if module_name else name
+
+
+######
+# MAIN
+######
+
+
+class SymbolIndex(object):
+    # Maps qualified names to where they're defined. Files are parsed once and
+    # cached on disk by path, mtime and size, so later sessions only parse the
+    # files that changed. Indexing runs in a pool of daemon threads, so it never
+    # holds up the program's exit.
+    def __init__(self, cache_dir: str = None, max_workers: int = MAX_WORKERS):
+        self.cache_dir = get_cache_dir() if cache_dir is None else cache_dir
+        self.max_workers = max_workers
+        self._files = {}  # filename -> FileIndex
+        self._by_name = {}  # Last part of the name -> symbols
+        self._pending = set()  # Filenames, and ("project", root) for each walk
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)  # Notified as tasks finish
+        self._tasks = queue.SimpleQueue()
+        self._num_workers = 0
+
+    def _work(self):
+        while True:
+            key, fn, args = self._tasks.get()
+            wait_for_evaluations()
+            try:
+                fn(*args)
+            except Exception:
+                pass  # Tried again the next time it's scheduled
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                    self._done.notify_all()
+
+    def _submit(self, key: any, fn: callable, *args):
+        # Must hold the lock
+        self._pending.add(key)
+        self._tasks.put((key, fn, args))
+        if self._num_workers < self.max_workers:
+            self._num_workers += 1
+            threading.Thread(
+                target=self._work, name="redshift-index", daemon=True
+            ).start()
+
+    def _index_file(self, filename: str, mtime_ns: int, size: int):
+        module_name = get_module_name(filename)
+        symbols = []
+        for qualname, kind, lineno, end_lineno in load_symbols(
+            self.cache_dir, filename, mtime_ns, size
+        ):
+            name = get_lookup_name(module_name, qualname)
+            symbols.append(Symbol(name, qualname, kind, filename, lineno, end_lineno))
+
+        self._replace(filename, FileIndex(mtime_ns, size, symbols))
+
+    def _replace(self, filename: str, file_index: FileIndex | None):
+        with self._lock:
+            old_index = self._files.pop(filename, None)
+            if old_index is not None:
+                for symbol in old_index.symbols:
+                    key = symbol.name.rsplit(".", 1)[-1]
+                    self._by_name[key].remove(symbol)
+
+            if file_index is None:
+                return
+
+            self._files[filename] = file_index
+            for symbol in file_index.symbols:
+                key = symbol.name.rsplit(".", 1)[-1]
+                self._by_name.setdefault(key, []).append(symbol)
+
+    def update(self, filenames: list[str]):
+        # Schedules the files that are new or changed since they were indexed
+        for filename in filenames:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                self._replace(filename, None)  # Deleted
+                continue
+
+            with self._lock:
+                file_index = self._files.get(filename)
+                if file_index is not None and file_index[:2] == (
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                ):
+                    continue
+                if filename in self._pending:
+                    continue
+
+                self._submit(
+                    filename,
+                    self._index_file,
+                    filename,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                )
+
+    def _walk_project(self, root: str):
+        self.update(list(iter_project_files(root)))
+
+    def update_project(self, root: str):
+        # Walking the project takes a while too, so it's done in the background
+        key = ("project", root)
+        with self._lock:
+            if key not in self._pending:
+                self._submit(key, self._walk_project, root)
+
+    def wait(self, timeout: float = None) -> bool:
+        # True if everything that's been scheduled has been indexed, including
+        # the files that walking a project schedules
+        with self._lock:
+            return self._done.wait_for(lambda: not self._pending, timeout)
+
+    def find(self, name: str) -> list[Symbol]:
+        # Symbols whose name is `name` or ends with it, e.g. "Bar.baz" matches
+        # "pkg.module.Bar.baz"
+        name = name.strip().replace(".<locals>", "")
+        key = name.rsplit(".", 1)[-1]
+        with self._lock:
+            candidates = list(self._by_name.get(key, []))
+
+        suffix = f".{name}"
+        return [
+            symbol
+            for symbol in candidates
+            if symbol.name == name or symbol.name.endswith(suffix)
+        ]
+
+    def get_range(
+        self, filename: str, qualname: str, lineno: int = None
+    ) -> tuple[int, int] | None:
+        # Lines of the definition with this __qualname__ (and first line, to tell
+        # apart redefinitions), if the file hasn't changed since it was indexed
+        with self._lock:
+            file_index = self._files.get(filename)
+
+        if file_index is None:
+            return None
+
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+
+        if file_index[:2] != (stat.st_mtime_ns, stat.st_size):
+            return None
+
+        for symbol in file_index.symbols:
+            if symbol.qualname != qualname or symbol.kind == "variable":
+                continue
+            if lineno is not None and symbol.lineno != lineno:
+                continue
+
+            return symbol.lineno, symbol.end_lineno
+
+        return None
+
+
+# Shared across debugger instances, since each breakpoint creates its own
+_symbol_index = SymbolIndex()
+
+
+def get_symbol_index() -> SymbolIndex:
+    return _symbol_index
@@ -0,0 +1,132 @@
+# Standard library
+import json
+import time
+import inspect
+import threading
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import namedtuple
+
+
+Span = namedtuple("Span", ["name", "category", "start", "duration", "attributes"])
+CategoryStats = namedtuple("CategoryStats", ["count", "total_time"])
+
+_recorder = None  # Telemetry of the `ask` in progress, if any
+_open_categories = ContextVar("open_categories", default=())
+
+
+#########
+# HELPERS
+#########
+
+
+class Telemetry(object):
+    # Spans recorded during one `ask`. Spans nested in a span of the same
+    # category (e.g. a truncation that counts tokens) aren't recorded, so the
+    # time of a category is never counted twice. Different categories can nest,
+    # e.g. a tool's time includes the serialization it does.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.spans = []
+        self._start_time = time.perf_counter()
+
+    def add(self, name: str, category: str, start: float, attributes: dict):
+        end = time.perf_counter()
+        span = Span(
+            name, category, start - self._start_time, end - start, attributes
+        )
+        with self._lock:
+            self.spans.append(span)
+
+    def summarize(self) -> dict[str, CategoryStats]:
+        summary = {}
+        for span in self.spans:
+            count, total_time = summary.get(span.category, (0, 0.0))
+            summary[span.category] = CategoryStats(
+                count + 1, total_time + span.duration
+            )
+
+        return summary
+
+    def to_dict(self) -> dict:
+        return {
+            "categories": {
+                category: stats._asdict()
+                for category, stats in self.summarize().items()
+            },
+            "spans": [span._asdict() for span in self.spans],
+        }
+
+
+######
+# MAIN
+######
+
+
+@contextmanager
+def recording(telemetry: Telemetry):
+    # Records the spans of every thread into `telemetry`
+    global _recorder
+
+    prev_recorder, _recorder = _recorder, telemetry
+    try:
+        yield telemetry
+    finally:
+        _recorder = prev_recorder
+
+
+@contextmanager
+def span(name: str, category: str, **attributes):
+    # Yields the span's attributes, so the caller can add results (e.g. tokens).
+    # Costs one global lookup when nothing is recording.
+    recorder = _recorder
+    open_categories = _open_categories.get()
+    if recorder is None or category in open_categories:
+        yield attributes
+        return
+
+    token = _open_categories.set(open_categories + (category,))
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        _open_categories.reset(token)
+        recorder.add(name, category, start, attributes)
+
+
+def traced(category: str, name: str = None):
+    def decorator(fn: callable) -> callable:
+        span_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _recorder is None:
+                    return await fn(*args, **kwargs)
+
+                with span(span_name, category):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return fn(*args, **kwargs)
+
+            with span(span_name, category):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def write_jsonl(record: dict, path: str):
+    with open(path, "a") as file:
+        file.write(json.dumps(record, default=str) + "\n")
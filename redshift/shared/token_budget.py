@@ -0,0 +1,80 @@
+# Standard library
+from functools import lru_cache
+from collections import namedtuple
+
+
+Section = namedtuple("Section", ["name", "need", "weight"])
+Allocation = namedtuple("Allocation", ["name", "need", "tokens"])
+
+
+#########
+# HELPERS
+#########
+
+
+@lru_cache(maxsize=None)
+def get_max_input_tokens(model: str) -> int | None:
+    import litellm  # Deferred; litellm takes seconds to import
+
+    # Otherwise LiteLLM prints its list of providers for unknown models
+    suppress_debug_info, litellm.suppress_debug_info = litellm.suppress_debug_info, True
+    try:
+        return litellm.get_model_info(model).get("max_input_tokens")
+    except Exception:  # Not in LiteLLM's model list
+        return None
+    finally:
+        litellm.suppress_debug_info = suppress_debug_info
+
+
+######
+# MAIN
+######
+
+
+def water_fill(
+    needs: list[int], budget: int, weights: list[float] = None
+) -> list[int]:
+    # Splits `budget` so each item gets a share proportional to its weight, but no
+    # more than it needs. What an item doesn't use is split among the others.
+    # Items are visited by need per unit of weight, so once one can't be fully
+    # served, none of the rest can either and they all get their share.
+    weights = weights or [1.0] * len(needs)
+    allocations = [0] * len(needs)
+    remaining_budget = max(0, budget)
+    remaining_weight = sum(weights)
+
+    order = sorted(range(len(needs)), key=lambda index: needs[index] / weights[index])
+    for position, index in enumerate(order):
+        if needs[index] * remaining_weight > remaining_budget * weights[index]:
+            for index in order[position:]:
+                share = remaining_budget * weights[index] / remaining_weight
+                allocations[index] = int(share)
+            break
+
+        allocations[index] = needs[index]
+        remaining_budget -= needs[index]
+        remaining_weight -= weights[index]
+
+    return allocations
+
+
+def get_context_budget(model: str, max_tokens: int, reserved_tokens: int = 0) -> int:
+    # Tokens a prompt's context can use: `max_tokens`, or less if the model's
+    # window can't fit that plus the tokens reserved for the rest of the request
+    max_input_tokens = get_max_input_tokens(model)
+    if max_input_tokens:
+        max_tokens = min(max_tokens, max_input_tokens - reserved_tokens)
+
+    return max(0, max_tokens)
+
+
+def plan_budget(sections: list[Section], budget: int) -> dict[str, Allocation]:
+    tokens = water_fill(
+        [section.need for section in sections],
+        budget,
+        [section.weight for section in sections],
+    )
+    return {
+        section.name: Allocation(section.name, section.need, num_tokens)
+        for section, num_tokens in zip(sections, tokens)
+    }
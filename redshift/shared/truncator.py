@@ -1,44 +1,206 @@
 # Standard library
-from typing import Literal
+import hashlib
+import threading
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Literal, Union
+from collections import OrderedDict, namedtuple
 
-# Third party
-from litellm import encode, decode
+# Local
+try:
+    from redshift.shared.telemetry import traced
+except ImportError:
+    from .telemetry import traced
+
+
+MAX_CACHE_SIZE = 256
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "encodes", "size"])
+
+
+#########
+# HELPERS
+#########
+
+
+class TokenIndex(object):
+    def __init__(self, counts: list[int]):
+        self.counts = counts  # Token count per line
+        self.prefix = [0, *accumulate(counts)]  # prefix[i] = sum(counts[:i])
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def sum(self, start: int, end: int) -> int:
+        # 0-indexed, exclusive
+        return self.prefix[end] - self.prefix[start]
+
+    def fit(self, max_tokens: int) -> int:
+        # Number of leading lines whose tokens sum to at most max_tokens (none if
+        # the budget is negative)
+        return max(0, bisect_right(self.prefix, max_tokens) - 1)
+
+
+class TokenCache(object):
+    def __init__(self, max_size: int = MAX_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.encodes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: tuple) -> any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def _put(self, key: tuple, value: any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _encode(self, model: str, text: str) -> list[int]:
+        from litellm import encode  # Deferred; litellm takes seconds to import
+
+        self.encodes += 1
+        return encode(model=model, text=text)
+
+    def tokens(self, model: str, text: str) -> list[int]:
+        key = (model, "text", hash_text(text))
+        tokens = self._get(key)
+        if tokens is None:
+            tokens = self._encode(model, text)
+            self._put(key, tokens)
+
+        return tokens
+
+    def index(self, model: str, lines: list[str]) -> TokenIndex:
+        key = (model, "lines", hash_lines(lines))
+        index = self._get(key)
+        if index is None:
+            index = TokenIndex([len(self._encode(model, line)) for line in lines])
+            self._put(key, index)
+
+        return index
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.encodes, len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.encodes = 0
+
+
+def hash_text(text: str) -> bytes:
+    return hashlib.blake2b(
+        text.encode("utf-8", "surrogatepass"), digest_size=16
+    ).digest()
+
+
+def hash_lines(lines: list[str]) -> bytes:
+    hasher = hashlib.blake2b(digest_size=16)
+    for line in lines:
+        line = line.encode("utf-8", "surrogatepass")
+        hasher.update(len(line).to_bytes(8, "little"))  # Prevents boundary collisions
+        hasher.update(line)
+
+    return hasher.digest()
+
+
+def bisect_last(lo: int, hi: int, predicate) -> int:
+    # Largest k in [lo, hi] with predicate(k), given predicate(lo) and monotonicity
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if predicate(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return lo
+
+
+def bisect_first(lo: int, hi: int, predicate) -> int:
+    # Smallest k in [lo, hi] with predicate(k), given predicate(hi) and monotonicity
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if predicate(mid):
+            hi = mid
+        else:
+            lo = mid + 1
+
+    return lo
+
+
+# Shared across Truncator instances, since most callers create their own
+_token_cache = TokenCache()
+
+
+######
+# MAIN
+######
 
 
 class Truncator:
     def __init__(self, model: str):
         self.model = model
 
+    @staticmethod
+    def cache_info() -> CacheInfo:
+        return _token_cache.info()
+
+    @staticmethod
+    def cache_clear():
+        _token_cache.clear()
+
+    @traced("tokenize")
+    def encode(self, text: str) -> list[int]:
+        return _token_cache.tokens(self.model, text)
+
+    def decode(self, tokens: list[int]) -> str:
+        from litellm import decode  # Deferred; litellm takes seconds to import
+
+        return decode(model=self.model, tokens=tokens)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encode(text))
+
+    @traced("tokenize")
+    def index_lines(self, lines: Union[str, list[str]]) -> TokenIndex:
+        lines = lines.splitlines() if isinstance(lines, str) else lines
+        return _token_cache.index(self.model, lines)
+
+    @traced("tokenize")
     def truncate_end(
         self, text: str, max_tokens: int, type: Literal["line", "char"] = "char"
     ) -> str:
-        if len(encode(model=self.model, text=text)) <= max_tokens:
+        if self.count_tokens(text) <= max_tokens:
             return text
 
         if type == "line":
             lines = text.splitlines()
-            truncated_lines = []
-            num_tokens = 0
-            for line in lines:
-                line_tokens = len(encode(model=self.model, text=line))
-                if num_tokens + line_tokens > max_tokens:
-                    break
-
-                num_tokens += line_tokens
-                truncated_lines.append(line)
-
-            return "\n".join(truncated_lines) + "\n..."
+            num_lines = self.index_lines(lines).fit(max_tokens)
+            return "\n".join(lines[:num_lines]) + "\n..."
         elif type == "char":
-            tokens = encode(model=self.model, text=text)[:max_tokens]
-            truncated_text = decode(model=self.model, tokens=tokens)
+            tokens = self.encode(text)[:max_tokens]
+            truncated_text = self.decode(tokens)
             return f"{truncated_text} ..."
 
         return text
 
+    @traced("tokenize")
     def truncate_middle(
         self, text: str, max_tokens: int, type: Literal["line", "char"] = "char"
     ) -> str:
-        if len(encode(model=self.model, text=text)) <= max_tokens:
+        if self.count_tokens(text) <= max_tokens:
             return text
 
         if type == "line":
@@ -46,68 +208,95 @@ class Truncator:
             if len(lines) <= 2:
                 return self.truncate_middle(text, max_tokens, type="char")
 
-            token_counts = [len(encode(model=self.model, text=line)) for line in lines]
-            kept_indices = {0, len(lines) - 1}
+            index = self.index_lines(lines)
+            token_counts = index.counts
+            last = len(lines) - 1
             tokens_used = token_counts[0] + token_counts[-1]
 
-            candidate_order = []
-            left, right = 1, len(lines) - 2
-            while left <= right:
-                candidate_order.append(left)
-                if left != right:
-                    candidate_order.append(right)
-                left += 1
-                right -= 1
+            # Candidates alternate inwards from both ends (1, n - 2, 2, n - 3, ...),
+            # so the first k of them are a head and a tail of the middle lines
+            def candidate_tokens(k: int) -> int:
+                return index.sum(1, 1 + (k + 1) // 2) + index.sum(last - k // 2, last)
+
+            num_candidates = len(lines) - 2
+            num_fit = 0
+            if tokens_used <= max_tokens:
+                num_fit = bisect_last(
+                    0,
+                    num_candidates,
+                    lambda k: tokens_used + candidate_tokens(k) <= max_tokens,
+                )
+            tokens_used += candidate_tokens(num_fit)
+
+            head_end = 1 + (num_fit + 1) // 2
+            tail_start = last - num_fit // 2
+            kept_indices = [*range(head_end), *range(tail_start, len(lines))]
 
-            for idx in candidate_order:
+            # Past the first miss, smaller lines further in may still fit
+            for k in range(num_fit, num_candidates):
+                idx = 1 + k // 2 if k % 2 == 0 else last - 1 - k // 2
                 if tokens_used + token_counts[idx] <= max_tokens:
-                    kept_indices.add(idx)
+                    kept_indices.append(idx)
                     tokens_used += token_counts[idx]
 
-            final_lines = []
-            for i, idx in enumerate(sorted(kept_indices)):
-                if i > 0 and idx != sorted(kept_indices)[i - 1] + 1:
+            kept_indices.sort()
+            final_lines = [lines[kept_indices[0]]]
+            for prev_idx, idx in zip(kept_indices, kept_indices[1:]):
+                if idx != prev_idx + 1:
                     final_lines.append("...")
                 final_lines.append(lines[idx])
             return "\n".join(final_lines)
         elif type == "char":
-            tokens = encode(model=self.model, text=text)
+            tokens = self.encode(text)
             keep_tokens = max_tokens - 3  # Reserve 3 tokens for ellipsis
             start_tokens = keep_tokens // 2
             end_tokens = keep_tokens - start_tokens
 
-            start_text = decode(model=self.model, tokens=tokens[:start_tokens])
-            end_text = decode(model=self.model, tokens=tokens[-end_tokens:])
+            start_text = self.decode(tokens[:start_tokens])
+            end_text = self.decode(tokens[-end_tokens:])
 
             return f"{start_text} ... {end_text}"
 
+    @traced("tokenize")
     def truncate_window(
         self, lines: list[str], lineno: int, max_tokens: int
     ) -> tuple[int, int]:
-        if len(encode(model=self.model, text="\n".join(lines))) <= max_tokens:
+        if self.count_tokens("\n".join(lines)) <= max_tokens:
             return 1, len(lines)  # 1-indexed, inclusive
 
-        start_line, end_line = lineno, lineno
-        total_tokens = 0
+        # The window grows in rounds, adding one line before and then one line
+        # after the current one. Instead of encoding line by line, find the last
+        # round that fits by bisecting over cumulative token counts.
+        index = self.index_lines(lines)
+        num_before, num_after = lineno - 1, len(lines) - lineno
+        if max_tokens <= 0:
+            return lineno, lineno
+
+        def window_tokens(rounds: int) -> int:
+            before = index.sum(lineno - 1 - min(rounds, num_before), lineno - 1)
+            after = index.sum(lineno - 1, lineno - 1 + min(rounds, num_after))
+            return before + after
+
+        max_rounds = max(num_before, num_after)
+        rounds = bisect_last(
+            0, max_rounds, lambda r: window_tokens(r) <= max_tokens
+        )
+        total_tokens = window_tokens(rounds)
+        if total_tokens == max_tokens:  # Growing stops as soon as the budget is hit
+            rounds = bisect_first(
+                0, rounds, lambda r: window_tokens(r) >= max_tokens
+            )
+
+        start_line = lineno - min(rounds, num_before)
+        end_line = lineno + min(rounds, num_after)
+        if rounds == max_rounds or total_tokens >= max_tokens:
+            return start_line, end_line
 
-        while (start_line > 1 or end_line < len(lines)) and total_tokens < max_tokens:
-            # Try to add a line before if possible
-            if start_line > 1:
+        # The next round only partially fits
+        next_round = rounds + 1
+        if next_round <= num_before:
+            line_tokens = index.counts[lineno - 1 - next_round]
+            if total_tokens + line_tokens <= max_tokens:
                 start_line -= 1
-                line_tokens = len(encode(model=self.model, text=lines[start_line - 1]))
-                if total_tokens + line_tokens <= max_tokens:
-                    total_tokens += line_tokens
-                else:
-                    start_line += 1
-                    break
-
-            # Try to add a line after if possible
-            if end_line < len(lines):
-                line_tokens = len(encode(model=self.model, text=lines[end_line - 1]))
-                if total_tokens + line_tokens <= max_tokens:
-                    total_tokens += line_tokens
-                    end_line += 1
-                else:
-                    break
 
         return start_line, end_line
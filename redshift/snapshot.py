@@ -0,0 +1,245 @@
+# Standard library
+import ast
+import gzip
+import json
+import time
+import linecache
+
+# Local
+try:
+    from redshift.headless import split_exception, format_exception
+    from redshift.shared.is_internal_frame import is_internal_frame
+    from redshift.shared.serializers import (
+        get_call_args,
+        serialize_vars_dict,
+        CHARS_PER_TOKEN,
+    )
+except ImportError:
+    from .headless import split_exception, format_exception
+    from .shared.is_internal_frame import is_internal_frame
+    from .shared.serializers import (
+        get_call_args,
+        serialize_vars_dict,
+        CHARS_PER_TOKEN,
+    )
+
+
+SNAPSHOT_VERSION = 1
+DEFAULT_MAX_VALUE_TOKENS = 1024  # Per local/global, before the tools truncate it
+SOURCE_WINDOW = 200  # Lines kept above and below each frame's current line
+IGNORED_GLOBALS = ("__pdb_convenience_variables",)
+
+
+#########
+# HELPERS
+#########
+
+
+class SnapshotValue(object):
+    # Stands in for a value that only its repr was captured for, so tools that
+    # eval expressions in a snapshot frame still print it
+    __slots__ = ("value_repr",)
+
+    def __init__(self, value_repr: str):
+        self.value_repr = value_repr
+
+    def __repr__(self) -> str:
+        return self.value_repr
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        raise AttributeError(
+            f"Can't get `{name}`: only the repr of this value was captured in the snapshot"
+        )
+
+
+class SnapshotCode(object):
+    def __init__(self, filename: str, name: str, arg_names: list[str]):
+        self.co_filename = filename
+        self.co_name = name
+
+        # Lists every captured argument, so get_call_args returns all of them
+        self.co_varnames = tuple(arg_names)
+        self.co_argcount = len(arg_names)
+        self.co_kwonlyargcount = 0
+        self.co_flags = 0
+
+
+class SnapshotFrame(object):
+    # Has the frame attributes that redshift and bdb read
+    def __init__(self, record: dict, f_globals: dict):
+        self.f_code = SnapshotCode(record["filename"], record["name"], record["args"])
+        self.f_lineno = record["f_lineno"]
+        self.f_locals = load_vars(record["locals"])
+        self.f_globals = f_globals
+        self.f_back = None
+        self.f_is_internal = record["is_internal"]  # See is_internal_frame
+
+
+def load_value(value_repr: str) -> any:
+    # Plain literals come back as real values, so expressions like `len(x)` work.
+    # Anything truncated or unparseable stays a repr.
+    if "..." not in value_repr:
+        try:
+            return ast.literal_eval(value_repr)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            pass
+
+    return SnapshotValue(value_repr)
+
+
+def load_vars(vars_dict: dict[str, str]) -> dict[str, any]:
+    return {name: load_value(value_repr) for name, value_repr in vars_dict.items()}
+
+
+def serialize_frame_vars(vars_dict: dict, max_chars: int) -> dict[str, str]:
+    vars_dict = {
+        name: value for name, value in vars_dict.items() if name not in IGNORED_GLOBALS
+    }
+    return serialize_vars_dict(vars_dict, max_chars=max_chars)
+
+
+def merge_windows(linenos: list[int], num_lines: int) -> list[tuple[int, int]]:
+    windows = []
+    for lineno in sorted(linenos):
+        first = max(1, lineno - SOURCE_WINDOW)
+        last = min(num_lines, lineno + SOURCE_WINDOW)
+        if windows and first <= windows[-1][1] + 1:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], last))
+        else:
+            windows.append((first, last))
+
+    return windows
+
+
+def capture_sources(stack: list[tuple[any, int]]) -> dict[str, dict]:
+    # Each file is stored once, with only the lines around the frames in it
+    linenos, frames = {}, {}
+    for frame, lineno in stack:
+        filename = frame.f_code.co_filename
+        linenos.setdefault(filename, set()).update((lineno, frame.f_lineno))
+        frames.setdefault(filename, frame)
+
+    sources = {}
+    for filename, file_linenos in linenos.items():
+        lines = linecache.getlines(filename, frames[filename].f_globals)
+        if not lines:
+            continue
+
+        windows = merge_windows(
+            [lineno for lineno in file_linenos if lineno], len(lines)
+        )
+        sources[filename] = {
+            "num_lines": len(lines),
+            "windows": [[first, lines[first - 1 : last]] for first, last in windows],
+        }
+
+    return sources
+
+
+######
+# MAIN
+######
+
+
+def take_snapshot(
+    debugger,
+    exception: str = None,
+    max_value_tokens: int = DEFAULT_MAX_VALUE_TOKENS,
+) -> dict:
+    # Captures the debugger's current stack. Nothing in it refers to the live
+    # program, so the program can exit as soon as the snapshot is written.
+    max_chars = max_value_tokens * CHARS_PER_TOKEN
+
+    frames, globals_, globals_indices = [], [], {}
+    for frame, lineno in debugger.stack:
+        # Frames from the same module share their globals
+        globals_index = globals_indices.get(id(frame.f_globals))
+        if globals_index is None:
+            globals_index = globals_indices[id(frame.f_globals)] = len(globals_)
+            globals_.append(serialize_frame_vars(frame.f_globals, max_chars))
+
+        f_locals = frame.f_locals
+        if frame is debugger.curframe:
+            f_locals = debugger.curframe_locals  # Includes changes made in pdb
+
+        frames.append(
+            {
+                "filename": frame.f_code.co_filename,
+                "name": frame.f_code.co_name,
+                "lineno": lineno,
+                "f_lineno": frame.f_lineno,
+                "exc_lineno": debugger.tb_lineno.get(frame),
+                "is_internal": is_internal_frame(frame),
+                "locals": serialize_frame_vars(f_locals, max_chars),
+                "args": list(get_call_args(frame.f_code, f_locals)),
+                "globals": globals_index,
+            }
+        )
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "created": time.time(),
+        "exception": exception,
+        "curindex": debugger.curindex,
+        "frames": frames,
+        "globals": globals_,
+        "sources": capture_sources(debugger.stack),
+    }
+
+
+def take_post_mortem_snapshot(debugger, t) -> dict:
+    exception, tb = split_exception(t)
+    debugger.setup(None, tb)
+    try:
+        return take_snapshot(debugger, format_exception(exception, tb))
+    finally:
+        debugger.forget()
+
+
+def get_default_snapshot_path() -> str:
+    return time.strftime("redshift-%Y%m%d-%H%M%S.snapshot.gz")
+
+
+def write_snapshot(snapshot: dict, path: str):
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        json.dump(snapshot, file, separators=(",", ":"))
+
+
+def load_snapshot(path: str) -> dict:
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        snapshot = json.load(file)
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {snapshot.get('version')}")
+
+    return snapshot
+
+
+def restore_stack(snapshot: dict) -> tuple[list[tuple[any, int]], dict[any, int]]:
+    # Returns the stack and the exception line of each frame, like pdb's
+    # `stack` and `tb_lineno`
+    globals_ = [load_vars(vars_dict) for vars_dict in snapshot["globals"]]
+
+    stack, tb_lineno = [], {}
+    for record in snapshot["frames"]:
+        frame = SnapshotFrame(record, globals_[record["globals"]])
+        stack.append((frame, record["lineno"]))
+        if record["exc_lineno"] is not None:
+            tb_lineno[frame] = record["exc_lineno"]
+
+    return stack, tb_lineno
+
+
+def install_sources(snapshot: dict):
+    # Serves the captured source through linecache, where redshift and pdb read
+    # it from. Lines outside the captured windows are blank.
+    for filename, source in snapshot["sources"].items():
+        lines = ["\n"] * source["num_lines"]
+        for first, window_lines in source["windows"]:
+            lines[first - 1 : first - 1 + len(window_lines)] = window_lines
+
+        size = sum(len(line) for line in lines)
+        linecache.cache[filename] = (size, None, lines, filename)  # Never checked
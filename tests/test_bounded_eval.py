@@ -0,0 +1,80 @@
+# Standard library
+import time
+import threading
+
+# Third party
+import pytest
+
+# Local
+from redshift.shared.bounded_eval import (
+    BYTES_PER_MB,
+    EvalMemoryError,
+    EvalTimeoutError,
+    run_bounded,
+    wait_for_evaluations,
+)
+
+
+TIMEOUT = 0.5  # Seconds
+MAX_MEMORY = 64 * BYTES_PER_MB
+
+
+#########
+# HELPERS
+#########
+
+
+def loop_forever():
+    while True:
+        pass
+
+
+def allocate_in_background(stop: threading.Event, chunks: list):
+    # Like the indexers: pauses between tasks while an evaluation runs
+    while not stop.is_set() and len(chunks) < 64:
+        wait_for_evaluations()
+        chunks.append(bytearray(8 * BYTES_PER_MB))  # Zeroed, so it's resident
+        time.sleep(0.005)
+
+
+#######
+# TESTS
+#######
+
+
+def test_fast_call_returns_its_value():
+    value = run_bounded(lambda: sum(range(10)), TIMEOUT, MAX_MEMORY)
+    assert value == 45
+
+
+def test_infinite_loop_times_out():
+    start_time = time.monotonic()
+    with pytest.raises(EvalTimeoutError):
+        run_bounded(loop_forever, TIMEOUT, MAX_MEMORY)
+
+    assert time.monotonic() - start_time < TIMEOUT * 10
+
+
+def test_large_allocation_exceeds_memory():
+    with pytest.raises(EvalMemoryError):
+        run_bounded(lambda: bytearray(10**9), TIMEOUT * 20, MAX_MEMORY)
+
+
+def test_exceptions_propagate():
+    with pytest.raises(ZeroDivisionError):
+        run_bounded(lambda: 1 / 0, TIMEOUT, MAX_MEMORY)
+
+
+def test_background_allocations_arent_charged():
+    stop = threading.Event()
+    chunks = []
+    thread = threading.Thread(target=allocate_in_background, args=(stop, chunks))
+    thread.start()
+    try:
+        while not chunks:
+            time.sleep(0.001)
+
+        run_bounded(lambda: time.sleep(TIMEOUT), TIMEOUT * 10, MAX_MEMORY)
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,28 @@
+# Local
+from redshift.config import Config
+
+
+#######
+# TESTS
+#######
+
+
+def test_long_options_cover_the_flags():
+    long_options = Config.get_long_options()
+    for option in ("no-prewarm", "no-stream", "prefetch", "telemetry"):
+        assert option in long_options
+    for option in ("eval-timeout=", "eval-max-memory=", "telemetry-file="):
+        assert option in long_options
+
+
+def test_options_override_the_environment(monkeypatch):
+    monkeypatch.setenv("REDSHIFT_MAX_ITERS", "7")
+    monkeypatch.setenv("REDSHIFT_EVAL_TIMEOUT", "3")
+    config = Config.from_args(
+        ["--no-stream", "--prefetch", "--eval-timeout=1.5", "--telemetry-file=t.jsonl"]
+    )
+    assert config.max_iters == 7
+    assert config.eval_timeout == 1.5
+    assert not config.stream
+    assert config.prefetch
+    assert config.telemetry_file == "t.jsonl"
@@ -0,0 +1,84 @@
+# Standard library
+import time
+import threading
+
+# Local
+from redshift.shared.context_cache import ContextCache
+
+
+TASK_TIME = 1  # Seconds
+
+
+#########
+# HELPERS
+#########
+
+
+def start_slow_prefetch(cache: ContextCache, before: callable = None) -> list[str]:
+    started = threading.Event()
+    calls = []
+
+    def slow_compute():
+        started.set()
+        time.sleep(TASK_TIME)
+        return "stale"
+
+    def task(key):
+        calls.append(key)
+        cache.get((key,), slow_compute if key == "slow" else lambda: key)
+
+    cache.prefetch([lambda: task("slow"), lambda: task("next")], before=before)
+    if before is None:
+        started.wait()
+
+    return calls
+
+
+#######
+# TESTS
+#######
+
+
+def test_clear_waits_for_the_task_in_progress():
+    cache = ContextCache(cancel_timeout=TASK_TIME * 5)
+    calls = start_slow_prefetch(cache)
+
+    start_time = time.monotonic()
+    cache.clear()
+    assert time.monotonic() - start_time >= TASK_TIME / 2
+    assert calls == ["slow"]  # Didn't go on to the next task
+    assert cache.get(("slow",), lambda: "fresh") == "fresh"
+
+
+def test_clear_doesnt_wait_for_before():
+    cache = ContextCache(cancel_timeout=TASK_TIME * 5)
+    calls = start_slow_prefetch(cache, before=lambda: time.sleep(TASK_TIME))
+
+    start_time = time.monotonic()
+    cache.clear()
+    assert time.monotonic() - start_time < TASK_TIME / 2
+    time.sleep(TASK_TIME * 1.5)
+    assert calls == []
+
+
+def test_task_past_the_timeout_is_abandoned():
+    cache = ContextCache(cancel_timeout=TASK_TIME / 10)
+    calls = start_slow_prefetch(cache)
+
+    start_time = time.monotonic()
+    assert not cache.cancel()
+    assert time.monotonic() - start_time < TASK_TIME / 2
+
+    cache.clear()
+    time.sleep(TASK_TIME * 1.5)  # The abandoned task finishes
+    assert cache.get(("slow",), lambda: "fresh") == "fresh"
+    assert calls == ["slow"]
+
+
+def test_wait_lets_the_prefetch_finish():
+    cache = ContextCache()
+    start_slow_prefetch(cache)
+    cache.wait()
+
+    assert cache.get(("slow",), lambda: "fresh") == "stale"
+    assert cache.get(("next",), lambda: "fresh") == "next"
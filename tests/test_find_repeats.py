@@ -0,0 +1,73 @@
+# Local
+from redshift.shared.find_repeats import MAX_PERIOD, MIN_REPEATS, find_repeats
+
+
+#########
+# HELPERS
+#########
+
+
+def cycle(period: int, num_repeats: int) -> list[str]:
+    return [f"f{index}" for index in range(period)] * num_repeats
+
+
+#######
+# TESTS
+#######
+
+
+def test_runs_shorter_than_min_repeats_are_skipped():
+    for period in range(1, MAX_PERIOD + 1):
+        assert find_repeats(cycle(period, MIN_REPEATS - 1)) == []
+        assert find_repeats(cycle(period, MIN_REPEATS)) == [(0, period, MIN_REPEATS)]
+        assert find_repeats(cycle(period, MIN_REPEATS + 1)) == [
+            (0, period, MIN_REPEATS + 1)
+        ]
+
+
+def test_periods_longer_than_max_period_are_skipped():
+    assert find_repeats(cycle(MAX_PERIOD + 1, MIN_REPEATS * 2)) == []
+    keys = cycle(MAX_PERIOD + 1, MIN_REPEATS)
+    assert find_repeats(keys, max_period=MAX_PERIOD + 1) == [
+        (0, MAX_PERIOD + 1, MIN_REPEATS)
+    ]
+
+
+def test_min_repeats_can_be_lowered():
+    assert find_repeats(cycle(3, 2)) == []
+    assert find_repeats(cycle(3, 2), min_repeats=2) == [(0, 3, 2)]
+
+
+def test_partial_cycle_at_the_end_isnt_counted():
+    keys = cycle(3, MIN_REPEATS) + cycle(2, 1)  # Ends in f0, f1
+    assert find_repeats(keys) == [(0, 3, MIN_REPEATS)]
+
+    keys = cycle(3, MIN_REPEATS - 1) + cycle(2, 1)
+    assert find_repeats(keys) == []
+
+
+def test_runs_are_found_after_other_keys():
+    keys = ["main", "run"] + cycle(2, MIN_REPEATS) + ["leaf"]
+    assert find_repeats(keys) == [(2, 2, MIN_REPEATS)]
+
+
+def test_consecutive_runs_are_found_in_order():
+    keys = ["a"] * MIN_REPEATS + ["b", "c"] * (MIN_REPEATS + 1) + ["d"]
+    assert find_repeats(keys) == [
+        (0, 1, MIN_REPEATS),
+        (MIN_REPEATS, 2, MIN_REPEATS + 1),
+    ]
+
+
+def test_period_that_covers_the_most_keys_wins():
+    # "a" repeats too, but only twice per cycle
+    keys = ["a", "a", "b"] * MIN_REPEATS
+    assert find_repeats(keys) == [(0, 3, MIN_REPEATS)]
+
+    # A cycle of one key is also a cycle of two, which covers the same keys
+    assert find_repeats(["a"] * (MIN_REPEATS * 2)) == [(0, 1, MIN_REPEATS * 2)]
+
+
+def test_empty_and_short_inputs():
+    assert find_repeats([]) == []
+    assert find_repeats(["a"]) == []
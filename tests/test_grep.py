@@ -0,0 +1,71 @@
+# Standard library
+import time
+
+# Local
+import redshift.shared.grep as grep_module
+from redshift.shared.grep import compile_query, grep
+
+
+NUM_FILES = 100
+TIMEOUT = 0.3  # Seconds
+SEARCH_DELAY = 0.02  # Seconds per file
+
+
+#########
+# HELPERS
+#########
+
+
+def write_modules(root, num_files: int = NUM_FILES) -> list[str]:
+    filenames = []
+    for index in range(num_files):
+        path = root / f"module_{index}.py"
+        path.write_text(f"def handler_{index}():\n    return max_retries\n")
+        filenames.append(str(path))
+
+    return filenames
+
+
+#######
+# TESTS
+#######
+
+
+def test_finds_every_match(tmp_path):
+    filenames = write_modules(tmp_path, 10)
+    result = grep(compile_query("MAX_RETRIES"), filenames)
+    assert result.matches == []
+    assert result.is_complete
+
+    result = grep(compile_query("max_retries"), filenames, {filenames[3]: 1})
+    assert result.is_complete
+    assert result.num_files == 10
+    assert len(result.matches) == 10
+    assert result.matches[0].filename == filenames[3]  # Highest priority first
+    assert result.matches[0].lineno == 2
+    assert result.matches[0].before == ["def handler_3():"]
+
+
+def test_stops_at_max_results(tmp_path):
+    filenames = write_modules(tmp_path)
+    result = grep(compile_query("max_retries"), filenames, max_results=10)
+    assert len(result.matches) == 10
+    assert not result.is_complete
+    assert result.num_files < NUM_FILES
+
+
+def test_stops_at_the_timeout(tmp_path, monkeypatch):
+    filenames = write_modules(tmp_path)
+    search_file = grep_module.search_file
+
+    def slow_search_file(*args):
+        time.sleep(SEARCH_DELAY)
+        return search_file(*args)
+
+    monkeypatch.setattr(grep_module, "search_file", slow_search_file)
+    start_time = time.monotonic()
+    result = grep(compile_query("max_retries"), filenames, timeout=TIMEOUT)
+    assert time.monotonic() - start_time < TIMEOUT + 1
+    assert not result.is_complete
+    assert 0 < result.num_files < NUM_FILES
+    assert len(result.matches) == result.num_files
@@ -0,0 +1,34 @@
+# Standard library
+import json
+
+# Local
+from redshift.headless import write_report
+
+
+REPORT = {"exception": "ValueError: bad input", "results": []}
+
+
+#######
+# TESTS
+#######
+
+
+def test_report_goes_to_stderr_by_default(capsys):
+    write_report(REPORT)
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert json.loads(captured.err) == REPORT
+
+
+def test_dash_writes_the_report_to_stdout(capsys):
+    write_report(REPORT, "-")
+    captured = capsys.readouterr()
+    assert captured.err == ""
+    assert json.loads(captured.out) == REPORT
+
+
+def test_report_is_written_to_the_output_file(tmp_path, capsys):
+    output = tmp_path / "triage.json"
+    write_report(REPORT, str(output))
+    assert json.loads(output.read_text()) == REPORT
+    assert capsys.readouterr() == ("", "")
@@ -0,0 +1,64 @@
+# Standard library
+import os
+import sys
+import json
+import subprocess
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("litellm", "saplings", "rich")
+MAX_IMPORT_TIME_US = 1_000_000  # Loose, so slow CI machines don't flake
+
+SCRIPT = f"""
+import sys, json
+import redshift
+from redshift import set_trace
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+
+#########
+# HELPERS
+#########
+
+
+def run_with_importtime() -> tuple[list[str], dict[str, int]]:
+    # Modules that were loaded, and the cumulative import time of each top-level
+    # import, in microseconds
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [REPO_ROOT, *filter(None, [env.get("PYTHONPATH")])]
+    )
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=REPO_ROOT,
+        check=True,
+    )
+
+    cumulative_times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        cumulative_times[name.strip()] = int(cumulative.strip())
+
+    return json.loads(process.stdout), cumulative_times
+
+
+#######
+# TESTS
+#######
+
+
+def test_import_skips_agent_dependencies():
+    loaded_modules, _ = run_with_importtime()
+    assert loaded_modules == []
+
+
+def test_import_time():
+    _, cumulative_times = run_with_importtime()
+    assert cumulative_times["redshift"] < MAX_IMPORT_TIME_US
@@ -0,0 +1,122 @@
+# Standard library
+import os
+
+# Local
+from redshift.shared.project_files import (
+    IgnoreRules,
+    is_ignored,
+    iter_files,
+    parse_gitignore,
+    translate_glob,
+)
+
+
+#########
+# HELPERS
+#########
+
+
+def write_files(root, *names: str):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+
+
+def listed(root) -> list[str]:
+    return sorted(
+        os.path.relpath(filename, root).replace(os.sep, "/")
+        for filename in iter_files(str(root))
+    )
+
+
+def ignored(text: str, relpath: str, is_dir: bool = False) -> bool:
+    rules = [IgnoreRules("/repo", parse_gitignore(text))]
+    return is_ignored(f"/repo/{relpath}", is_dir, rules)
+
+
+#######
+# TESTS
+#######
+
+
+def test_translate_glob_keeps_wildcards_in_one_directory():
+    assert translate_glob("*.py") == r"[^/]*\.py"
+    assert translate_glob("file?.txt") == r"file[^/]\.txt"
+    assert translate_glob("[!a-c]x") == r"[^a-c]x"
+    assert translate_glob("a/**/b") == r"a/(?:.*/)?b"
+    assert translate_glob("logs/**") == r"logs/.*"
+    assert translate_glob(r"\*literal") == r"\*literal"
+
+
+def test_parse_gitignore_skips_comments_and_blank_lines():
+    rules = parse_gitignore("# comment\n\n*.log\n!keep.log\nbuild/\n/\n")
+    assert [(negate, dir_only) for _, negate, dir_only in rules] == [
+        (False, False),
+        (True, False),
+        (False, True),
+    ]
+
+
+def test_negation_overrides_an_earlier_rule():
+    text = "*.log\n!keep.log\n"
+    assert ignored(text, "debug.log")
+    assert ignored(text, "sub/debug.log")
+    assert not ignored(text, "keep.log")
+    assert not ignored(text, "sub/keep.log")
+    assert ignored("!keep.log\n*.log\n", "keep.log")  # The last match wins
+
+
+def test_dir_only_rules_skip_files():
+    assert ignored("out/\n", "out", is_dir=True)
+    assert ignored("out/\n", "sub/out", is_dir=True)
+    assert not ignored("out/\n", "out")
+
+
+def test_anchored_rules_only_match_at_the_root():
+    assert ignored("/config.py\n", "config.py")
+    assert not ignored("/config.py\n", "sub/config.py")
+    assert ignored("docs/api\n", "docs/api")  # A slash in the middle anchors too
+    assert not ignored("docs/api\n", "sub/docs/api")
+    assert ignored("config.py\n", "sub/config.py")
+
+
+def test_double_star_matches_any_depth():
+    text = "**/fixtures/*.json\n"
+    assert ignored(text, "fixtures/data.json")
+    assert ignored(text, "a/b/fixtures/data.json")
+    assert not ignored(text, "a/fixtures/nested/data.json")
+    assert not ignored(text, "a/fixtures/data.py")
+
+
+def test_iter_files_applies_nested_gitignores(tmp_path):
+    (tmp_path / ".git").mkdir()
+    write_files(
+        tmp_path,
+        "app.py",
+        "debug.log",
+        "out/result.py",
+        "node_modules/lib.js",
+        ".hidden/secret.py",
+        "pkg/notes.txt",
+        "pkg/module.py",
+        "pkg/important.log",
+        "pkg/sub/other.txt",
+        "other/notes.txt",
+    )
+    (tmp_path / ".gitignore").write_text("*.log\nout/\n")
+    (tmp_path / "pkg" / ".gitignore").write_text("*.txt\n!important.log\n")
+
+    assert listed(tmp_path) == [
+        "app.py",
+        "other/notes.txt",
+        "pkg/important.log",
+        "pkg/module.py",
+    ]
+    # The .gitignores above a subdirectory still apply to it
+    assert listed(tmp_path / "pkg") == ["important.log", "module.py"]
+
+
+def test_iter_files_stops_at_max_files(tmp_path):
+    write_files(tmp_path, *(f"module_{index}.py" for index in range(10)))
+    assert len(list(iter_files(str(tmp_path), max_files=3))) == 3
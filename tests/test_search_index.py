@@ -0,0 +1,87 @@
+# Standard library
+import os
+
+# Third party
+import pytest
+
+# Local
+from redshift.shared.search_index import MAX_DEAD_SHARE, SearchIndex
+
+
+NUM_FILES = 10
+NUM_EDITS = 5
+
+
+#########
+# HELPERS
+#########
+
+
+def write_module(path, index: int, version: int):
+    path.write_text(
+        f"def compute_retry_backoff_{index}_v{version}(attempt):\n"
+        "    return 2 ** attempt\n"
+        "\n"
+        f"class ConfigParser{index}V{version}:\n"
+        "    def parse_config_file(self, filename):\n"
+        "        return open(filename).read()\n"
+    )
+    os.utime(path, ns=(version * 10**9, version * 10**9))  # Not the same mtime
+
+
+def update(search_index: SearchIndex):
+    search_index.update()
+    assert search_index.wait(timeout=30)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    root = tmp_path / "project"
+    root.mkdir()
+    (root / "pyproject.toml").write_text("")
+    return root
+
+
+#######
+# TESTS
+#######
+
+
+def test_changed_files_are_compacted(project, tmp_path):
+    search_index = SearchIndex(str(project), cache_dir=str(tmp_path / "search"))
+    for version in range(1, NUM_EDITS + 1):
+        for index in range(NUM_FILES):
+            write_module(project / f"module_{index}.py", index, version)
+
+        update(search_index)
+
+    num_documents = search_index._num_documents
+    num_dead = len(search_index._documents) - num_documents
+    assert num_dead <= MAX_DEAD_SHARE * len(search_index._documents)
+
+    hits = search_index.search(f"compute_retry_backoff_3_v{NUM_EDITS}", 1)
+    assert hits[0].document.filename == str(project / "module_3.py")
+    assert hits[0].document.name == f"compute_retry_backoff_3_v{NUM_EDITS}"
+
+    hits = search_index.search("parse config file", NUM_FILES * 10)
+    methods = [hit.document.name for hit in hits if "." in hit.document.name]
+    assert len(methods) == NUM_FILES
+    assert all(f"V{NUM_EDITS}.parse_config_file" in name for name in methods)
+
+
+def test_deleted_files_are_compacted(project, tmp_path):
+    search_index = SearchIndex(str(project), cache_dir=str(tmp_path / "search"))
+    for index in range(NUM_FILES):
+        write_module(project / f"module_{index}.py", index, 1)
+
+    update(search_index)
+    for index in range(NUM_FILES - 1):
+        os.remove(project / f"module_{index}.py")
+
+    update(search_index)
+    assert len(search_index._documents) == search_index._num_documents
+    hits = search_index.search("retry backoff", NUM_FILES)
+    assert {hit.document.filename for hit in hits} == {
+        str(project / f"module_{NUM_FILES - 1}.py")
+    }
@@ -0,0 +1,117 @@
+# Standard library
+import enum
+import builtins
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+
+# Third party
+import pytest
+
+# Local
+from redshift.shared.serializers import serialize_val, serialize_vars_dict
+
+
+MAX_CHARS = 400
+NUM_ELEMENTS = 100_000
+
+Point = namedtuple("Point", ["x", "y"])
+
+
+#########
+# HELPERS
+#########
+
+
+class CountingRepr(object):
+    num_calls = 0
+
+    def __repr__(self) -> str:
+        CountingRepr.num_calls += 1
+        return "x"
+
+
+class ListSubclass(list):
+    pass
+
+
+class Color(str, enum.Enum):  # Like StrEnum, which needs Python 3.11
+    RED = "red"
+
+
+class StrSubclass(str):
+    pass
+
+
+class BytesSubclass(bytes):
+    pass
+
+
+class Wrapper(object):
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"Wrapper({self.value!r})"
+
+
+@pytest.fixture(autouse=True)
+def reset_counter():
+    CountingRepr.num_calls = 0
+
+
+#######
+# TESTS
+#######
+
+
+@pytest.mark.parametrize(
+    "make_container",
+    [
+        lambda elements: OrderedDict(enumerate(elements)),
+        lambda elements: defaultdict(list, enumerate(elements)),
+        lambda elements: Counter(dict(enumerate(elements))),
+        ListSubclass,
+        Wrapper,
+    ],
+)
+def test_subclasses_are_budgeted(make_container):
+    container = make_container([CountingRepr() for _ in range(NUM_ELEMENTS)])
+    serialized = serialize_val(container, max_chars=MAX_CHARS)
+    assert len(serialized) <= 2 * MAX_CHARS
+    assert CountingRepr.num_calls <= MAX_CHARS
+
+
+def test_subclasses_keep_their_type_name():
+    ordered_dict = serialize_val(OrderedDict(a=1), max_chars=MAX_CHARS)
+    assert ordered_dict == "OrderedDict({'a': 1})"
+    assert serialize_val(ListSubclass([1]), max_chars=MAX_CHARS) == "ListSubclass([1])"
+    assert serialize_val(Point(1, [2]), max_chars=MAX_CHARS) == "Point(x=1, y=[2])"
+
+
+def test_string_subclasses_are_truncated_like_strings():
+    assert serialize_val(Color.RED, max_chars=MAX_CHARS) == "'red'"
+    assert serialize_val([StrSubclass("a")], max_chars=MAX_CHARS) == "['a']"
+
+    serialized = serialize_val(StrSubclass("x" * NUM_ELEMENTS), max_chars=MAX_CHARS)
+    assert serialized.startswith("'xxx") and serialized.endswith("xxx'")
+    assert "..." in serialized and len(serialized) <= MAX_CHARS
+
+    serialized = serialize_val(BytesSubclass(b"x" * NUM_ELEMENTS), max_chars=MAX_CHARS)
+    assert serialized.startswith("b'xxx") and serialized.endswith("xxx'")
+    assert "..." in serialized and len(serialized) <= MAX_CHARS
+
+
+def test_small_objects_use_their_repr():
+    assert serialize_val(Wrapper(1), max_chars=MAX_CHARS) == "Wrapper(1)"
+
+
+def test_only_custom_builtins_are_serialized():
+    module_globals = {"__builtins__": builtins, "x": 1}
+    assert serialize_vars_dict(module_globals) == {"x": "1"}
+
+    custom_builtins = {**vars(builtins), "print": Wrapper(1)}
+    module_globals = {"__builtins__": custom_builtins, "x": 1}
+    assert serialize_vars_dict(module_globals, max_chars=MAX_CHARS) == {
+        "__builtins__": "{'print': Wrapper(1)}",
+        "x": "1",
+    }
+    assert module_globals["__builtins__"] is custom_builtins
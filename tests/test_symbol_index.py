@@ -0,0 +1,175 @@
+# Standard library
+import os
+
+# Third party
+import pytest
+
+# Local
+import redshift.shared.symbol_index as symbol_index_module
+from redshift.shared.symbol_index import SymbolIndex, iter_project_files
+
+
+MODULE_SOURCE = """\
+import functools
+
+
+@functools.cache
+def compute(value):
+    def helper():
+        return value
+
+    return helper()
+
+
+class Bar:
+    limit = 10
+
+    def baz(self):
+        return 1
+        # Still part of baz
+
+
+def unrelated():
+    pass
+"""
+
+
+#########
+# HELPERS
+#########
+
+
+def set_mtime(path, seconds: int):
+    os.utime(path, ns=(seconds * 10**9, seconds * 10**9))
+
+
+def build_index(root, cache_dir) -> SymbolIndex:
+    symbol_index = SymbolIndex(cache_dir=str(cache_dir))
+    symbol_index.update_project(str(root))
+    assert symbol_index.wait(timeout=30)
+    return symbol_index
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "__init__.py").write_text("")
+    (root / "pkg" / "module.py").write_text(MODULE_SOURCE)
+    set_mtime(root / "pkg" / "module.py", 1)
+    return root
+
+
+@pytest.fixture
+def parsed_sources(monkeypatch) -> list[bytes]:
+    sources = []
+    parse_symbols = symbol_index_module.parse_symbols
+
+    def counting_parse_symbols(source: bytes):
+        sources.append(source)
+        return parse_symbols(source)
+
+    monkeypatch.setattr(symbol_index_module, "parse_symbols", counting_parse_symbols)
+    return sources
+
+
+#######
+# TESTS
+#######
+
+
+def test_find_matches_name_suffixes(project, tmp_path):
+    symbol_index = build_index(project, tmp_path / "cache")
+    filename = str(project / "pkg" / "module.py")
+
+    symbols = symbol_index.find("Bar.baz")
+    assert [(s.name, s.qualname, s.kind) for s in symbols] == [
+        ("pkg.module.Bar.baz", "Bar.baz", "function")
+    ]
+    assert symbols[0].filename == filename
+    assert symbol_index.find("pkg.module.Bar.baz") == symbols
+    assert symbol_index.find("module.Bar.baz") == symbols
+    assert symbol_index.find("odule.Bar.baz") == []
+
+    # Names are looked up without <locals>
+    helpers = symbol_index.find("compute.<locals>.helper")
+    assert [s.qualname for s in helpers] == ["compute.<locals>.helper"]
+    assert symbol_index.find("compute.helper") == helpers
+
+    assert [s.kind for s in symbol_index.find("Bar.limit")] == ["variable"]
+    assert symbol_index.find("missing") == []
+
+
+def test_get_range_includes_decorators_and_comments(project, tmp_path):
+    symbol_index = build_index(project, tmp_path / "cache")
+    filename = str(project / "pkg" / "module.py")
+
+    assert symbol_index.get_range(filename, "compute") == (4, 9)
+    assert symbol_index.get_range(filename, "compute.<locals>.helper") == (6, 7)
+    assert symbol_index.get_range(filename, "Bar.baz") == (15, 17)
+    assert symbol_index.get_range(filename, "Bar.baz", lineno=15) == (15, 17)
+    assert symbol_index.get_range(filename, "Bar.baz", lineno=16) is None
+    assert symbol_index.get_range(filename, "Bar.limit") is None  # Not a definition
+    assert symbol_index.get_range(filename, "missing") is None
+    assert symbol_index.get_range(str(project / "other.py"), "compute") is None
+
+
+def test_get_range_of_a_changed_file_is_none(project, tmp_path):
+    symbol_index = build_index(project, tmp_path / "cache")
+    path = project / "pkg" / "module.py"
+
+    path.write_text("\n\n" + MODULE_SOURCE)  # Lines moved, so the range is stale
+    assert symbol_index.get_range(str(path), "Bar.baz") is None
+
+    symbol_index.update([str(path)])
+    assert symbol_index.wait(timeout=30)
+    assert symbol_index.get_range(str(path), "Bar.baz") == (17, 19)
+
+
+def test_unchanged_files_are_loaded_from_the_cache(project, tmp_path, parsed_sources):
+    build_index(project, tmp_path / "cache")
+    assert len(parsed_sources) == 2  # __init__.py and module.py
+
+    symbol_index = build_index(project, tmp_path / "cache")
+    assert len(parsed_sources) == 2
+    assert len(symbol_index.find("Bar.baz")) == 1
+
+
+def test_cache_is_invalidated_by_mtime(project, tmp_path, parsed_sources):
+    build_index(project, tmp_path / "cache")
+    path = project / "pkg" / "module.py"
+
+    # Same size, so only the mtime tells it apart
+    path.write_text(MODULE_SOURCE.replace("def baz", "def qux"))
+    set_mtime(path, 2)
+    symbol_index = build_index(project, tmp_path / "cache")
+    assert len(parsed_sources) == 3
+    assert symbol_index.find("Bar.baz") == []
+    assert len(symbol_index.find("Bar.qux")) == 1
+
+
+def test_cache_is_invalidated_by_size(project, tmp_path, parsed_sources):
+    build_index(project, tmp_path / "cache")
+    path = project / "pkg" / "module.py"
+
+    # Same mtime, so only the size tells it apart
+    path.write_text(MODULE_SOURCE.replace("def baz", "def bazz"))
+    set_mtime(path, 1)
+    symbol_index = build_index(project, tmp_path / "cache")
+    assert len(parsed_sources) == 3
+    assert symbol_index.find("Bar.baz") == []
+    assert len(symbol_index.find("Bar.bazz")) == 1
+
+
+def test_project_files_skip_ignored_files(project):
+    (project / ".gitignore").write_text("generated/\n*_pb2.py\n")
+    for name in ("generated/models.py", "pkg/api_pb2.py", "build/lib.py"):
+        (project / name).parent.mkdir(exist_ok=True)
+        (project / name).write_text("")
+    (project / "README.md").write_text("")
+
+    assert sorted(iter_project_files(str(project))) == [
+        str(project / "pkg" / "__init__.py"),
+        str(project / "pkg" / "module.py"),
+    ]
+    assert len(list(iter_project_files(str(project), max_files=1))) == 1
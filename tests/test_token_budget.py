@@ -0,0 +1,57 @@
+# Local
+from redshift.shared.token_budget import (
+    Allocation,
+    Section,
+    plan_budget,
+    water_fill,
+)
+
+
+#######
+# TESTS
+#######
+
+
+def test_saturated_budget_serves_every_need():
+    assert water_fill([100, 20, 300], 1000) == [100, 20, 300]
+    assert water_fill([100, 20, 300], 420) == [100, 20, 300]
+    assert water_fill([100, 20, 300], 1000, [5.0, 1.0, 0.1]) == [100, 20, 300]
+
+
+def test_unsaturated_budget_is_split_evenly():
+    assert water_fill([100, 100, 100], 150) == [50, 50, 50]
+    assert water_fill([100, 100, 100], 100) == [33, 33, 33]  # Rounded down
+
+
+def test_small_needs_leave_the_rest_to_the_others():
+    assert water_fill([10, 500, 1000], 400) == [10, 195, 195]
+    assert water_fill([1000, 10, 500], 400) == [195, 10, 195]
+
+
+def test_shares_follow_the_weights():
+    assert water_fill([1000, 1000], 300, [2.0, 1.0]) == [200, 100]
+    # The heavier item needs less than its share, so the other gets the rest
+    assert water_fill([50, 1000], 300, [2.0, 1.0]) == [50, 250]
+
+
+def test_zero_or_negative_budget_allocates_nothing():
+    assert water_fill([100, 20, 300], 0) == [0, 0, 0]
+    assert water_fill([100, 20, 300], -50) == [0, 0, 0]
+    assert water_fill([0, 0], 0) == [0, 0]
+    assert water_fill([], 100) == []
+
+
+def test_allocations_never_exceed_the_budget():
+    needs = [7, 13, 29, 101, 997]
+    for budget in range(0, sum(needs) + 10, 17):
+        allocations = water_fill(needs, budget, [1.0, 2.0, 3.0, 1.5, 0.5])
+        assert sum(allocations) <= budget
+        assert all(0 <= tokens <= need for tokens, need in zip(allocations, needs))
+
+
+def test_plan_budget_keys_allocations_by_name():
+    sections = [Section("frame:0", 500, 2.0), Section("code:a.py", 50, 1.0)]
+    assert plan_budget(sections, 300) == {
+        "frame:0": Allocation("frame:0", 500, 250),
+        "code:a.py": Allocation("code:a.py", 50, 50),
+    }
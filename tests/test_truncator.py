@@ -0,0 +1,219 @@
+# Standard library
+import re
+import random
+
+# Third party
+import pytest
+from hypothesis import HealthCheck, assume, example, given, settings
+from hypothesis import strategies as st
+
+# Local
+from redshift.shared import truncator as truncator_module
+from redshift.shared.truncator import Truncator
+
+
+MAX_EXAMPLES = 500
+MAX_LINES = 30
+MAX_LINE_WORDS = 13
+NUM_FILE_LINES = 5000
+NUM_REPEATS = 10  # E.g. tool calls in one `ask` that truncate the same file
+WORDS = ["def", "x", "=", "return", "(", ")", "foo_bar", "'text'", "#", "1"]
+
+
+#########
+# HELPERS
+#########
+
+
+def fake_encode(model: str, text: str) -> list[int]:
+    # One token per word or symbol, so empty lines are zero tokens
+    return [hash(token) for token in re.findall(r"\w+|[^\w\s]", text)]
+
+
+def count_tokens(text: str) -> int:
+    return len(fake_encode("", text))
+
+
+lines_strategy = st.lists(
+    st.lists(st.sampled_from(WORDS), max_size=MAX_LINE_WORDS).map(" ".join),
+    max_size=MAX_LINES,
+)
+
+
+@st.composite
+def lines_and_budgets(draw, min_lines: int = 0) -> tuple[list[str], int]:
+    # Budgets from below zero to more than the lines need
+    lines = draw(lines_strategy.filter(lambda lines: len(lines) >= min_lines))
+    num_tokens = count_tokens("\n".join(lines))
+    max_tokens = draw(st.one_of(st.integers(-5, 0), st.integers(-5, num_tokens + 5)))
+    return lines, max_tokens
+
+
+property_settings = settings(
+    max_examples=MAX_EXAMPLES,
+    deadline=None,
+    # The fixture only patches the tokenizer, which is the same for every example
+    suppress_health_check=[HealthCheck.function_scoped_fixture],
+)
+
+
+# Line-by-line implementations that the cached ones replaced
+
+
+def reference_truncate_end(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    truncated_lines = []
+    num_tokens = 0
+    for line in text.splitlines():
+        line_tokens = count_tokens(line)
+        if num_tokens + line_tokens > max_tokens:
+            break
+
+        num_tokens += line_tokens
+        truncated_lines.append(line)
+
+    return "\n".join(truncated_lines) + "\n..."
+
+
+def reference_truncate_middle(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    lines = text.splitlines()
+    token_counts = [count_tokens(line) for line in lines]
+    kept_indices = {0, len(lines) - 1}
+    tokens_used = token_counts[0] + token_counts[-1]
+
+    candidate_order = []
+    left, right = 1, len(lines) - 2
+    while left <= right:
+        candidate_order.append(left)
+        if left != right:
+            candidate_order.append(right)
+        left += 1
+        right -= 1
+
+    for idx in candidate_order:
+        if tokens_used + token_counts[idx] <= max_tokens:
+            kept_indices.add(idx)
+            tokens_used += token_counts[idx]
+
+    final_lines = []
+    for i, idx in enumerate(sorted(kept_indices)):
+        if i > 0 and idx != sorted(kept_indices)[i - 1] + 1:
+            final_lines.append("...")
+        final_lines.append(lines[idx])
+    return "\n".join(final_lines)
+
+
+def reference_truncate_window(
+    lines: list[str], lineno: int, max_tokens: int
+) -> tuple[int, int]:
+    if count_tokens("\n".join(lines)) <= max_tokens:
+        return 1, len(lines)
+
+    start_line, end_line = lineno, lineno
+    total_tokens = 0
+
+    while (start_line > 1 or end_line < len(lines)) and total_tokens < max_tokens:
+        if start_line > 1:
+            start_line -= 1
+            line_tokens = count_tokens(lines[start_line - 1])
+            if total_tokens + line_tokens <= max_tokens:
+                total_tokens += line_tokens
+            else:
+                start_line += 1
+                break
+
+        if end_line < len(lines):
+            line_tokens = count_tokens(lines[end_line - 1])
+            if total_tokens + line_tokens <= max_tokens:
+                total_tokens += line_tokens
+                end_line += 1
+            else:
+                break
+
+    return start_line, end_line
+
+
+@pytest.fixture
+def truncator(monkeypatch) -> Truncator:
+    monkeypatch.setattr(truncator_module._token_cache, "_encode", fake_encode)
+    Truncator.cache_clear()
+    yield Truncator("fake-model")
+    Truncator.cache_clear()
+
+
+#######
+# TESTS
+#######
+
+
+@property_settings
+@given(lines_and_budgets())
+@example((["a", "b", "c"], 0))
+@example((["a", "b", "c"], -5))
+def test_truncate_end_matches_reference(truncator, lines_and_budget):
+    lines, max_tokens = lines_and_budget
+    text = "\n".join(lines)
+    expected = reference_truncate_end(text, max_tokens)
+    assert truncator.truncate_end(text, max_tokens, type="line") == expected
+
+
+@property_settings
+@given(lines_and_budgets(min_lines=3))
+@example((["a", "b", "c"], 0))
+@example((["a", "b", "c"], -5))
+def test_truncate_middle_matches_reference(truncator, lines_and_budget):
+    lines, max_tokens = lines_and_budget
+    text = "\n".join(lines)
+    assume(len(text.splitlines()) > 2)  # Otherwise falls back to char truncation
+    expected = reference_truncate_middle(text, max_tokens)
+    assert truncator.truncate_middle(text, max_tokens, type="line") == expected
+
+
+@property_settings
+@given(lines_and_budgets(min_lines=1), st.integers(0, MAX_LINES))
+@example((["a", "b", "c"], 0), 1)
+@example((["a", "b", "c"], -5), 1)
+def test_truncate_window_matches_reference(truncator, lines_and_budget, offset):
+    lines, max_tokens = lines_and_budget
+    lineno = offset % len(lines) + 1
+    expected = reference_truncate_window(lines, lineno, max_tokens)
+    assert truncator.truncate_window(lines, lineno, max_tokens) == expected
+
+
+def test_truncate_end_negative_budget(truncator):
+    assert truncator.truncate_end("a\nb\nc", -5, type="line") == "\n..."
+
+
+def test_repeated_truncations_tokenize_once(monkeypatch):
+    monkeypatch.setenv("LITELLM_LOCAL_MODEL_COST_MAP", "True")  # No network
+    litellm = pytest.importorskip("litellm")
+    encoded_texts = []
+
+    def counting_encode(model: str, text: str) -> list[int]:
+        encoded_texts.append(text)
+        return fake_encode(model, text)
+
+    monkeypatch.setattr(litellm, "encode", counting_encode)
+    Truncator.cache_clear()
+    rng = random.Random(3)
+    lines = [
+        f"line_{i} = " + " ".join(rng.choices(WORDS, k=5))
+        for i in range(NUM_FILE_LINES)
+    ]
+    text = "\n".join(lines)
+    max_tokens = count_tokens(text) // 10
+    truncator = Truncator("fake-model")
+    for _ in range(NUM_REPEATS):
+        truncator.truncate_window(lines, NUM_FILE_LINES // 2, max_tokens)
+        truncator.truncate_end(text, max_tokens, type="line")
+        truncator.truncate_middle(text, max_tokens, type="line")
+
+    # The line-by-line versions encoded the text and then up to every line, for
+    # each call (~150k calls here)
+    assert len(encoded_texts) == NUM_FILE_LINES + 1  # Each line, and the text
+    Truncator.cache_clear()